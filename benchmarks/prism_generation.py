@@ -0,0 +1,92 @@
+"""
+Error Propagation Library V6.
+Benchmark of the PRISM model generation, the time per element stays constant if the
+generation scales linearly with the number of elements. After an edit of one element only
+its fragments are generated again.
+Usage: python3 benchmarks/prism_generation.py [number of elements ...]
+"""
+
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import epl_logger
+import epl_model
+import epl_prism
+
+class QuietLogger(epl_logger.Logger):
+    """@brief Logger that keeps the messages of the model construction in the log only"""
+
+    def message(self, message):
+        """@brief Messaging without console output"""
+        entry = ['OK', message]
+        self.log.append(entry)
+        return entry
+
+def build_model(n_elements):
+    """@brief creates a chain of elements with loops back, every element writes its own data
+    from the data of its predecessor, some elements have own cf and ep commands"""
+    model = epl_model.Model(QuietLogger())
+    el_names = ["E" + str(i) for i in range(n_elements)]
+    for el_name in el_names:
+        model.add_element(el_name)
+    model.set_initial_element(el_names[0])
+    for i, el_name in enumerate(el_names):
+        if i + 1 < n_elements:
+            model.add_control_flow(el_name, el_names[i + 1])
+        if i % 7 == 3:
+            model.add_control_flow(el_name, el_names[i // 2])
+        d_name = "d" + str(i)
+        if i % 3:
+            model.add_data(d_name, ['ok', 'error', 'state' + str(i)])
+        else:
+            model.add_data(d_name, list(range(i % 4 + 2)))
+        model.add_data_flow(el_name, d_name)
+        if i:
+            model.add_data_flow("d" + str(i - 1), el_name)
+    for i in range(0, n_elements, 10):
+        model.elements[el_names[i]]['ep_prism_commands'] = \
+            ["true -> 0.5:(d" + str(i) + "'=d" + str(i) + ") + 0.5:true;"]
+    for i in range(5, n_elements, 10):
+        model.elements[el_names[i]]['cf_prism_commands'] = \
+            ["cf=" + el_names[i] + " -> (cf'=" + el_names[(i + 1) % n_elements] + ");"]
+    model.add_failure("Failure", "d0=1")
+    return model
+
+def measure(model, repeats=3, edit=None):
+    """@brief returns [best time of the generation, length of the model text],
+    generation from scratch or after edit(model) with the memorized fragments"""
+    best = None
+    for _ in range(repeats):
+        if edit:
+            edit(model)
+        else:
+            model.fragments.clear()
+        start = time.perf_counter()
+        stream = io.StringIO()
+        epl_prism.PRISM.write_prism_model(model, stream, time_reward=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return [best, len(stream.getvalue())]
+
+def main():
+    """@brief prints the generation time per element for growing models"""
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 5000, 10000, 20000, 50000]
+    print("elements\tseconds\tus/element\tafter edit\tcharacters")
+    for n_elements in sizes:
+        model = build_model(n_elements)
+        seconds, length = measure(model)
+        el_name = "E" + str(n_elements // 2)
+        # a what-if step: one element gets other ep commands
+        edit = lambda model, el_name=el_name: model.update_element_prism_commands(el_name, \
+            ep_prism_commands=["true -> 0.9:true + 0.1:(d" + el_name[1:] + "'=error);"])
+        edit_seconds = measure(model, edit=edit)[0]
+        print(str(n_elements) + "\t" + "{:.3f}".format(seconds) + "\t" + \
+            "{:.1f}".format(seconds / n_elements * 1e6) + "\t" + \
+            "{:.3f}".format(edit_seconds) + "\t" + str(length))
+
+if __name__ == '__main__':
+    main()
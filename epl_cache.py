@@ -0,0 +1,111 @@
+"""
+Error Propagation Library V6.
+Content-addressed on-disk cache of PRISM results.
+"""
+
+import os
+import json
+import errno
+import hashlib
+
+class Cache(object):
+    """@brief Cache class, stores parsed results in json files named by the hash of the inputs"""
+
+    def __init__(self, cache_dir, max_size=256*1024*1024):
+        """@brief Constructor, max_size is the size limit of the cache directory in bytes"""
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts):
+        """@brief computes the cache key of the given inputs"""
+        sha = hashlib.sha256()
+        for part in parts:
+            data = str(part).encode('utf-8')
+            # length prefix, so that ("ab", "c") and ("a", "bc") differ
+            sha.update(str(len(data)).encode('utf-8') + b':' + data)
+        return sha.hexdigest()
+
+    def __get_path(self, key):
+        """@brief path of the cache entry"""
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def get(self, key):
+        """@brief returns the stored value or None"""
+        path = self.__get_path(key)
+        try:
+            with open(path, 'r') as entry_file:
+                value = json.load(entry_file)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        # the modification time is the last usage time for the LRU eviction
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """@brief stores a json serializable value and evicts the least recently used entries"""
+        path = self.__get_path(key)
+        # write and rename, so that concurrent runs never read a partial entry
+        temp_path = path + "." + str(os.getpid()) + ".tmp"
+        with open(temp_path, 'w') as entry_file:
+            json.dump(value, entry_file)
+        os.replace(temp_path, path)
+        self.evict()
+
+    def __get_entries(self):
+        """@brief returns [modification time, size, path] of all entries"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append([stat.st_mtime, stat.st_size, path])
+        return entries
+
+    def evict(self):
+        """@brief removes least recently used entries until the cache fits into max_size"""
+        entries = self.__get_entries()
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError as exception:
+                if exception.errno != errno.ENOENT:
+                    raise
+            size -= entry_size
+
+    def clear(self):
+        """@brief removes all entries and resets statistics"""
+        for _, _, path in self.__get_entries():
+            try:
+                os.remove(path)
+            except OSError as exception:
+                if exception.errno != errno.ENOENT:
+                    raise
+        self.hits = 0
+        self.misses = 0
+        return True
+
+    def statistics(self):
+        """@brief returns hit/miss statistics and the current size of the cache"""
+        entries = self.__get_entries()
+        requests = self.hits + self.misses
+        return {'hits': self.hits, \
+            'misses': self.misses, \
+            'hit_rate': self.hits / requests if requests else 0.0, \
+            'entries': len(entries), \
+            'size': sum(entry[1] for entry in entries)}
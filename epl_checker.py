@@ -3,7 +3,7 @@ Error Propagation Library V6
 Checking DEPM
 """
 
-import re
+import epl_parser
 
 class Checker(object):
     """@brief Checking class"""
@@ -22,6 +22,22 @@ class Checker(object):
         self.data_status = {}
         self.failure_status = {}
 
+    @staticmethod
+    def __get_values(model, d_names):
+        """@brief returns names of values of the data"""
+        return {str(value) for d_name in d_names for value in model.data[d_name]['values']}
+
+    @staticmethod
+    def __get_cf_targets(command):
+        """@brief returns names assigned to cf by the updates of a command, None if not a name"""
+        targets = set()
+        for _, assignments in command['updates']:
+            if 'cf' in assignments:
+                if assignments['cf'][0] != 'var':
+                    return None
+                targets.add(assignments['cf'][1])
+        return targets
+
     def __check_cf_prism_commands(self, model, element_name):
         """@brief checking correctness of the cf_prism_commands"""
         # element existence check
@@ -32,46 +48,33 @@ class Checker(object):
         cf_commands = the_element['cf_prism_commands']
         if cf_commands:
             findcfoutg = {cfout:False for cfout in the_element['cf_outputs']}
+            allowed = {'cf', element_name, 'stop'} | set(the_element['df_inputs']) | \
+                Checker.__get_values(model, the_element['df_inputs'])
             for command in cf_commands:
-                cfapart = re.split("[^A-Za-z0-9_]", command)
-                cwords = ['max', 'min', 'log', 'mod', 'pow', 'floor', 'stop']
-                cfapart = [part for part in cfapart if part == "cf'" or not part in cwords \
-                    and not part == '' and bool(re.fullmatch('[A-Za-z_][A-Za-z0-9_]*', part))]
-                k = 0
-                e_nfound = False
-                cfapartb = {cfout:False for cfout in cfapart}
-                while k < len(cfapart):
-                    if cfapart[k] == 'cf' and not e_nfound:
-                        e_nfound = True
-                        cfapartb[cfapart[k]] = True
-                        if cfapart[k+1] == element_name:
-                            cfapartb[cfapart[k+1]] = True
-                        else:
-                            self.elements_status[element_name] = \
-                                model.logger.error('Element ' + element_name + \
-                               ' has wrong element_name in cf_prism_commands')
-                            return False
-                    elif cfapart[k] == 'cf' and e_nfound:
-                        cfapartb[cfapart[k]] = True
-                        for output in findcfoutg.keys():
-                            if cfapart[k+1] == output:
-                                cfapartb[cfapart[k+1]] = True
-                                findcfoutg[cfapart[k+1]] = True
-                    else:
-                        for df_input in the_element['df_inputs']:
-                            if cfapart[k] == df_input:
-                                cfapartb[cfapart[k]] = True
-                    for df_input in the_element['df_inputs']:
-                        for value in model.data[df_input]['values']:
-                            if cfapart[k] == value:
-                                cfapartb[cfapart[k]] = True
-                    k += 1
-                for cfab in cfapartb.values():
-                    if not cfab:
-                        self.elements_status[element_name] = \
-                            model.logger.error('Element ' + element_name + \
-                            ' has error in cf_prism_commands')
-                        return False
+                try:
+                    references = epl_parser.Parser.get_references(command)
+                    cf_targets = Checker.__get_cf_targets(\
+                        epl_parser.Parser.parse_prism_command(command))
+                except epl_parser.ParseError:
+                    self.elements_status[element_name] = \
+                        model.logger.error('Element ' + element_name + \
+                        ' has error in cf_prism_commands')
+                    return False
+                # the guard compares cf to the element
+                if not {'cf', element_name} <= references['guard']:
+                    self.elements_status[element_name] = \
+                        model.logger.error('Element ' + element_name + \
+                        ' has wrong element_name in cf_prism_commands')
+                    return False
+                if cf_targets is None or references['targets'] - {'cf'} or \
+                    cf_targets - set(findcfoutg.keys()) - {'stop'} or \
+                    (references['guard'] | references['updates']) - allowed - cf_targets:
+                    self.elements_status[element_name] = \
+                        model.logger.error('Element ' + element_name + \
+                        ' has error in cf_prism_commands')
+                    return False
+                for output in cf_targets & set(findcfoutg.keys()):
+                    findcfoutg[output] = True
             for fcg in findcfoutg.values():
                 if not fcg:
                     self.elements_status[element_name] = \
@@ -91,37 +94,19 @@ class Checker(object):
         ep_commands = the_element['ep_prism_commands']
         globb = {b:True for b in ep_commands}
         if ep_commands:
+            d_ins = set(the_element['df_inputs'])
+            d_ins_outs = set(the_element['df_outputs'] + the_element['df_inputs'])
+            # the guard reads the inputs only, the updates read and write inputs and outputs
+            left_allowed = d_ins | Checker.__get_values(model, d_ins)
+            right_allowed = d_ins_outs | Checker.__get_values(model, d_ins_outs)
             for command in ep_commands:
-                cwords = ['max', 'min', 'log', 'mod', 'pow', 'floor']
-                leftsplited = re.split("[^A-Za-z0-9_]", re.split("->", command)[0])
-                leftsplited = [split for split in leftsplited if not split in cwords \
-                    and not split == '' and not bool(re.fullmatch('[0-9]*e', split)) \
-                    and not bool(re.fullmatch('[0-9]*', split))]
-                lsplitb = {split:False for split in leftsplited}
-                for split in leftsplited:
-                    for df_input in the_element['df_inputs']:
-                        for value in model.data[df_input]['values']:
-                            if split == value:
-                                lsplitb[split] = True
-                        if split == df_input:
-                            lsplitb[split] = True
-                    if split == 'true':
-                        lsplitb[split] = True
-                rightsplited = re.split("[^A-Za-z0-9_]", re.split("->", command)[1])
-                rightsplited = [split for split in rightsplited if not split in cwords \
-                    and not split == '' and not bool(re.fullmatch('[0-9]*e', split)) \
-                    and not bool(re.fullmatch('[0-9]*', split))]
-                rsplitb = {split:False for split in rightsplited}
-                for split in rightsplited:
-                    for d_name in set(the_element['df_outputs'] + the_element['df_inputs']):
-                        for value in model.data[d_name]['values']:
-                            if split == value:
-                                rsplitb[split] = True
-                        if split == d_name:
-                            rsplitb[split] = True
-                    if split == 'true':
-                        rsplitb[split] = True
-                if False in rsplitb.values() or False in lsplitb.values():
+                try:
+                    references = epl_parser.Parser.get_references(command)
+                except epl_parser.ParseError:
+                    globb[command] = False
+                    continue
+                if references['guard'] - left_allowed or \
+                    (references['updates'] | references['targets']) - right_allowed:
                     globb[command] = False
         if False in globb.values():
             self.elements_status[element_name] = \
@@ -207,30 +192,17 @@ class Checker(object):
             model.logger.error("No failure \"" + failure_name + "\"")
             return False
         # check failure expression
-        expression = model.failures[failure_name]
-        ok_flag = False
-        cwords = ['max', 'min', 'log', 'mod', 'pow', 'floor', 'true', 'cf']
-        for split in re.split("[^A-Za-z0-9_]", expression):
-            for data in model.data:
-                for value in model.data[data]['values']:
-                    if str(value) in split:
-                        ok_flag = True
-                if data in split:
-                    ok_flag = True
-            for element in model.elements:
-                if element in split:
-                    ok_flag = True
-            if bool(re.fullmatch('[0-9]*', split)):
-                ok_flag = True
-            if bool(re.fullmatch('[0-9]*e', split)):
-                ok_flag = True
-            elif split in cwords:
-                ok_flag = True
-            if not ok_flag:
-                self.failure_status[failure_name] = model.logger.error(\
-                    "Bad expression of failure \"" + failure_name + "\"")
-                return False
-            ok_flag = False
+        allowed = {'cf', 'stop'} | set(model.data.keys()) | set(model.elements.keys()) | \
+            Checker.__get_values(model, model.data.keys())
+        try:
+            names = epl_parser.Parser.get_names(\
+                epl_parser.Parser.parse_prism_expression(model.failures[failure_name]))
+        except epl_parser.ParseError:
+            names = None
+        if names is None or names - allowed:
+            self.failure_status[failure_name] = model.logger.error(\
+                "Bad expression of failure \"" + failure_name + "\"")
+            return False
         # if OK
         self.failure_status[failure_name] = model.logger.message(\
             "Failure \"" + failure_name + "\" is OK")
@@ -4,7 +4,7 @@ Drawing with GraphViz.
 """
 
 import pygraphviz as pgv
-import re
+import epl_parser
 
 class Drawing(object):
     """@brief Drawing class """
@@ -145,11 +145,12 @@ class Drawing(object):
             height=0.3*self.zoom, \
             penwidth=1*self.zoom, \
             width=0.5*self.zoom)
-        varaibles = re.split(\
-            '[\n \t ; ( ) , + - * / = ! & | < > ? != => <= >= <=>]', \
-            model.failures[name])
+        try:
+            varaibles = epl_parser.Parser.get_names(\
+                epl_parser.Parser.parse_prism_expression(model.failures[name]))
+        except epl_parser.ParseError:
+            varaibles = set()
         for data in model.data.keys():
-        #TODO normal check
             if data in varaibles:
                 if data in graph.nodes():
                     graph.add_edge(data, name, \
@@ -0,0 +1,126 @@
+"""
+Error Propagation Library V6.
+Encoding of data values and default commands of the generated PRISM models.
+"""
+
+class Encoding(object):
+    """@brief Encoding class, shared by the PRISM interface and the in-process computations"""
+
+    @staticmethod
+    def get_maximum_value(model):
+        """@brief returns the upper bound of the range of data variables"""
+        str_values, int_values = Encoding.__separate_int_and_str_values(model)
+        len_i = len(int_values)
+        len_s = len(str_values)
+        if len_i > 0:
+            max_i = max(int_values)
+        else:
+            max_i = 1
+        return max(max_i, len_s + len_i - 1)
+
+    @staticmethod
+    def __separate_int_and_str_values(model):
+        """@brief returns [sorted string values, sorted int values] of all data"""
+        str_values = set()
+        int_values = set()
+        for data in model.data.values():
+            for value in data['values']:
+                if isinstance(value, str):
+                    str_values.add(value)
+                elif isinstance(value, int):
+                    int_values.add(value)
+        return [sorted(str_values), sorted(int_values)]
+
+    @staticmethod
+    def encode_string_values(model, minimal=True):
+        """@brief returns {code:string value}, if minimal the string values of a data get unused
+        codes next to each other, so that the range of every data is small, otherwise the
+        sorted string values of all data get unused codes in reverse order"""
+        str_values, int_values = Encoding.__separate_int_and_str_values(model)
+        int_values = set(int_values)
+        res = {}
+        if not minimal:
+            i = 0
+            while str_values:
+                if i not in int_values:
+                    res[i] = str_values.pop()
+                i += 1
+            return res
+        encoded = set()
+        i = 0
+        for data in model.data.values():
+            for value in data['values']:
+                if isinstance(value, str) and value not in encoded:
+                    while i in int_values:
+                        i += 1
+                    res[i] = value
+                    encoded.add(value)
+                    i += 1
+        return res
+
+    @staticmethod
+    def get_data_ranges(model, minimal=True, values=None):
+        """@brief returns {data name:[lower bound, upper bound]} of the codes of the values of
+        every data, [0, get_maximum_value(model)] for all data if not minimal,
+        values = encode_string_values(model) if already known"""
+        if not minimal:
+            max_value = Encoding.get_maximum_value(model)
+            return {d_name:[0, max_value] for d_name in model.data}
+        if values is None:
+            values = Encoding.encode_string_values(model)
+        codes = {value:code for code, value in values.items()}
+        ranges = {}
+        for d_name, d_value in model.data.items():
+            encoded = [codes.get(value, value) \
+                for value in d_value['values'] + [d_value['initial_value']]]
+            ranges[d_name] = [min(encoded), max(encoded)]
+        return ranges
+
+    @staticmethod
+    def generate_default_cf_commands(model, el_name):
+        """@brief creates default prism cf commands"""
+        el_value = model.elements[el_name]
+        if not el_value['cf_outputs']:
+            return "cf=" + el_name + " -> (cf'=stop);"
+        probability = str(1/len(el_value['cf_outputs']))
+        return "cf=" + el_name + " -> " + " + ".join(probability + ":(cf'=" + cf_output + ")" \
+            for cf_output in el_value['cf_outputs']) + ";"
+
+    @staticmethod
+    def get_default_values(model):
+        """@brief returns [{data name:OK value}, {data name:not OK value}] as PRISM text,
+        OK = initial value, not OK = first value that is not the initial value"""
+        ok_values = {}
+        error_values = {}
+        for d_name, d_value in model.data.items():
+            ok_value = d_value['initial_value']
+            ok_values[d_name] = str(ok_value)
+            error_values[d_name] = str(next((val for val in d_value['values'] \
+                if val != ok_value), ok_value))
+        return [ok_values, error_values]
+
+    @staticmethod
+    def generate_default_ep_commands(model, el_name, default_values=None):
+        """@brief creates default prism ep commands, default_values = get_default_values(model)
+        if already known"""
+        commands = []
+        el_value = model.elements[el_name]
+        if el_value['df_outputs']:
+            if default_values is None:
+                default_values = Encoding.get_default_values(model)
+            ok_values, error_values = default_values
+            if not el_value['df_inputs']:
+                commands.append("(true) -> 1:" + " & ".join("(" + df_output + "'=" + \
+                    ok_values[df_output] + ")" for df_output in el_value['df_outputs']) + ";")
+            else:
+                # if all inputs OK than all outputs OK
+                commands.append(" & ".join("(" + df_input + "=" + ok_values[df_input] + ")" \
+                    for df_input in el_value['df_inputs']) + " -> " + \
+                    " & ".join("(" + df_output + "'=" + ok_values[df_output] + ")" \
+                    for df_output in el_value['df_outputs']) + ";")
+                # if one input is not OK than all outputs are not OK
+                commands.append(" | ".join("(" + df_input + "!=" + ok_values[df_input] + ")" \
+                    for df_input in el_value['df_inputs']) + " -> " + \
+                    " & ".join("(" + df_output + "'=" + error_values[df_output] + ")" \
+                    for df_output in el_value['df_outputs']) + ";")
+        return commands
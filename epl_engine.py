@@ -0,0 +1,506 @@
+"""
+Error Propagation Library V6.
+In-process computations on EPL models without PRISM.
+"""
+
+import itertools
+
+import numpy as np
+# scipy is imported where it is used, PRISM runs of epl_prism do not need it
+
+import epl_parser
+import epl_encoding
+import epl_solver
+
+class EngineError(Exception):
+    """@brief error in an in-process computation, e.g. a value out of the variable range"""
+    pass
+
+class DTMC(object):
+    """@brief DTMC class, explicit state space of a generated PRISM model,
+    states are rows of the values of variables in the order of the PRISM model"""
+
+    def __init__(self, variables, states, matrix, initial, labels, rewards):
+        """@brief Constructor, states = sorted array of states, initial = indexes of the
+        initial states, labels = {failure name:bool array over states},
+        rewards = {reward name:array over states}"""
+        self.variables = variables
+        self.states = states
+        self.matrix = matrix
+        self.initial = initial
+        self.labels = labels
+        self.rewards = rewards
+        # {state as tuple:index}, built by the first get_state_index
+        self.__indexes = None
+
+    def get_state_index(self, state):
+        """@brief returns the index of a state or None"""
+        if self.__indexes is None:
+            self.__indexes = {tuple(row):i for i, row in enumerate(self.states.tolist())}
+        return self.__indexes.get(tuple(int(value) for value in state))
+
+    def get_state_lines(self):
+        """@brief states in the format of PRISM -exportstates"""
+        return ["(" + ",".join(self.variables) + ")"] + [str(i) + ":(" + \
+            ",".join(str(value) for value in state) + ")" \
+            for i, state in enumerate(self.states.tolist())]
+
+    def get_initial_distribution(self):
+        """@brief uniform distribution over the initial states as PRISM"""
+        distribution = np.zeros(len(self.states))
+        np.add.at(distribution, self.initial, 1.0 / len(self.initial))
+        return distribution
+
+class ReachabilityTable(object):
+    """@brief ReachabilityTable class, probability and expected time to reach a failure from
+    every state of a DTMC, answers init_values of the model by lookup"""
+
+    def __init__(self, model, dtmc, probs, times):
+        """@brief Constructor, probs and times are arrays over the states of the dtmc"""
+        self.dtmc = dtmc
+        self.probs = probs
+        self.times = times
+        self.consts = Engine.get_constants(model)
+        self.initial_element = model.initial_element
+        self.initial_values = {d_name:d_value['initial_value'] \
+            for d_name, d_value in model.data.items()}
+
+    def get_index(self, init_values=None):
+        """@brief returns the index of the initial state of init_values"""
+        init_values = init_values or {}
+        state = [self.consts[self.initial_element]] + [Engine.encode_value(\
+            init_values.get(d_name, self.initial_values[d_name]), self.consts) \
+            for d_name in self.dtmc.variables[1:]]
+        index = self.dtmc.get_state_index(state)
+        if index is None:
+            raise EngineError("Initial state " + str(init_values) + " is not in the table")
+        return index
+
+    def lookup(self, init_values=None):
+        """@brief returns [P=? [ F f ], R{"time"}=? [ F f ]] of the model with init_values,
+        the results of PRISM.compute_P_single and compute_MTTF"""
+        index = self.get_index(init_values)
+        return [float(self.probs[index]), float(self.times[index])]
+
+class Engine(object):
+    """@brief Engine class, uses the same encoding of data values as the generated PRISM models,
+    commands are evaluated for whole arrays of states"""
+
+    @staticmethod
+    def get_constants(model, minimal_ranges=True):
+        """@brief returns {name:value} of the constants of the generated PRISM model"""
+        consts = {value:code for code, value in \
+            epl_encoding.Encoding.encode_string_values(model, minimal_ranges).items()}
+        for i, el_name in enumerate(model.elements.keys()):
+            consts[el_name] = i
+        consts['stop'] = len(model.elements)
+        return consts
+
+    @staticmethod
+    def encode_value(value, consts):
+        """@brief returns the integer code of a data value"""
+        if isinstance(value, str):
+            return consts[value]
+        return value
+
+    @staticmethod
+    def get_ep_commands(model, el_name):
+        """@brief returns ep commands of the element, default ones if no commands are defined"""
+        commands = model.elements[el_name]['ep_prism_commands']
+        if not commands:
+            commands = epl_encoding.Encoding.generate_default_ep_commands(model, el_name)
+        return list(commands)
+
+    @staticmethod
+    def get_cf_commands(model, el_name):
+        """@brief returns cf commands of the element, default ones if no commands are defined"""
+        commands = model.elements[el_name]['cf_prism_commands']
+        if not commands:
+            commands = [epl_encoding.Encoding.generate_default_cf_commands(model, el_name)]
+        return list(commands)
+
+    @staticmethod
+    def compile_ep_commands(model, el_name):
+        """@brief compiles ep commands of the element, default ones if no commands are defined"""
+        return [epl_parser.Parser.compile_prism_command(command) \
+            for command in Engine.get_ep_commands(model, el_name)]
+
+    @staticmethod
+    def compile_cf_commands(model, el_name):
+        """@brief compiles cf commands of the element, default ones if no commands are defined"""
+        return [epl_parser.Parser.compile_prism_command(command) \
+            for command in Engine.get_cf_commands(model, el_name)]
+
+    @staticmethod
+    def get_env(consts, variables, states):
+        """@brief environment of the compiled commands with a column array per variable"""
+        env = dict(consts)
+        env.update((name, states[:, i]) for i, name in enumerate(variables))
+        return env
+
+    @staticmethod
+    def evaluate(function, env, size, dtype=None):
+        """@brief evaluates a compiled expression to an array of the given size"""
+        return np.broadcast_to(np.asarray(function(env), dtype=dtype), (size,))
+
+    @staticmethod
+    def __get_choices(actions, env, size):
+        """@brief returns [[mask of states, [enabled commands]], ...] of all choices,
+        a synchronized choice consists of a command of every module"""
+        choices = []
+        for first_commands, second_commands in actions:
+            first_enabled = [[Engine.evaluate(command['guard'], env, size, bool), command] \
+                for command in first_commands]
+            first_enabled = [[mask, command] for mask, command in first_enabled if mask.any()]
+            if not first_enabled:
+                continue
+            if second_commands is None:
+                choices += [[mask, [command]] for mask, command in first_enabled]
+                continue
+            for second_command in second_commands:
+                second_mask = Engine.evaluate(second_command['guard'], env, size, bool)
+                for first_mask, first_command in first_enabled:
+                    mask = first_mask & second_mask
+                    if mask.any():
+                        choices.append([mask, [first_command, second_command]])
+        return choices
+
+    @staticmethod
+    def get_successors(actions, variables, max_values, consts, frontier, min_values=None):
+        """@brief returns [source indexes, successor states, probabilities] of the frontier
+        states with the PRISM semantics of dtmc: several enabled choices are chosen
+        uniformly, no enabled choice is a self loop, min_values = lower bounds, 0 by default"""
+        min_values = min_values or {}
+        size = len(frontier)
+        env = Engine.get_env(consts, variables, frontier)
+        choices = Engine.__get_choices(actions, env, size)
+        counts = np.zeros(size)
+        for mask, _ in choices:
+            counts += mask
+        columns = {name:i for i, name in enumerate(variables)}
+        sources, successors, probs = [], [], []
+        for mask, commands in choices:
+            indexes = np.nonzero(mask)[0]
+            sub_env = Engine.get_env(consts, variables, frontier[indexes])
+            # every module updates its variables by one of its updates
+            combinations = [[1.0, {}]]
+            for command in commands:
+                combinations = [[prob * Engine.evaluate(probability, sub_env, len(indexes), \
+                    float), dict(assignments, **updates)] \
+                    for prob, assignments in combinations \
+                    for probability, updates in command['updates']]
+            for prob, assignments in combinations:
+                successor = frontier[indexes].copy()
+                for name, value in assignments.items():
+                    if name not in columns:
+                        raise EngineError("Unknown variable \"" + name + "\"")
+                    values = Engine.evaluate(value, sub_env, len(indexes))
+                    if np.any(values != np.floor(values)) or \
+                        np.any(values < min_values.get(name, 0)) or \
+                        np.any(values > max_values[name]):
+                        raise EngineError("Value of \"" + name + "\" is out of range [" + \
+                            str(min_values.get(name, 0)) + ".." + str(max_values[name]) + "]")
+                    successor[:, columns[name]] = values
+                prob = prob / counts[indexes]
+                positive = prob > 0
+                sources.append(indexes[positive])
+                successors.append(successor[positive])
+                probs.append(prob[positive])
+        deadlocks = np.nonzero(counts == 0)[0]
+        sources.append(deadlocks)
+        successors.append(frontier[deadlocks])
+        probs.append(np.ones(len(deadlocks)))
+        return [np.concatenate(sources), np.concatenate(successors), np.concatenate(probs)]
+
+    @staticmethod
+    def explore(variables, max_values, actions, initial_states, consts, min_values=None):
+        """@brief breadth first exploration of the reachable states, a whole frontier at once,
+        actions = [[commands, synchronized commands of a second module or None]],
+        min_values = lower bounds of the variables, 0 by default,
+        returns [sorted states, sparse stochastic matrix, indexes of initial_states]"""
+        import scipy.sparse
+        min_values = min_values or {}
+        # states are keys in a mixed radix system, their order is the lexicographic order
+        offsets = np.array([min_values.get(name, 0) for name in variables], dtype=np.int64)
+        radices = [max_values[name] - min_values.get(name, 0) + 1 for name in variables]
+        size = 1
+        for radix in radices:
+            size *= radix
+        dtype = np.int64 if size < 2**62 else object
+        weights = np.ones(len(variables), dtype=dtype)
+        for i in range(len(variables) - 2, -1, -1):
+            weights[i] = weights[i + 1] * radices[i + 1]
+        get_keys = lambda states: (states - offsets).astype(dtype) @ weights
+        # visited states, a flag per key if the key space is small enough
+        if size <= 2**26:
+            visited = np.zeros(size, dtype=bool)
+        else:
+            visited = set()
+        def mark_new(keys):
+            """@brief returns the mask of not visited keys and marks them as visited"""
+            if isinstance(visited, set):
+                new = np.array([key not in visited for key in keys.tolist()], dtype=bool)
+                visited.update(keys[new].tolist())
+            else:
+                new = ~visited[keys]
+                visited[keys[new]] = True
+            return new
+        initial_states = np.array(initial_states, dtype=np.int64).reshape(-1, len(variables))
+        initial_keys = get_keys(initial_states)
+        first = np.unique(initial_keys, return_index=True)[1]
+        mark_new(initial_keys[first])
+        frontier = initial_states[first]
+        all_states = [frontier]
+        sources, successors, probs = [], [], []
+        while len(frontier):
+            source, successor, prob = Engine.get_successors(actions, variables, \
+                max_values, consts, frontier, min_values)
+            successor_keys = get_keys(successor)
+            sources.append(get_keys(frontier)[source])
+            successors.append(successor_keys)
+            probs.append(prob)
+            new_keys, first = np.unique(successor_keys, return_index=True)
+            frontier = successor[first[mark_new(new_keys)]]
+            all_states.append(frontier)
+        states = np.concatenate(all_states)
+        keys = get_keys(states)
+        order = np.argsort(keys, kind='stable')
+        states = states[order]
+        keys = keys[order]
+        matrix = scipy.sparse.csr_matrix((np.concatenate(probs), \
+            (np.searchsorted(keys, np.concatenate(sources)), \
+            np.searchsorted(keys, np.concatenate(successors)))), shape=(len(states), len(states)))
+        return [states, matrix, np.searchsorted(keys, initial_keys).tolist()]
+
+    @staticmethod
+    def get_semantics(model, ep_module=True, init_values=None, init_combinations=None, \
+        minimal_ranges=True):
+        """@brief returns {'variables', 'min_values', 'max_values', 'actions', 'initial_states',
+        'consts'} of the model generated by PRISM.generate_prism_model, commands of the actions
+        are not compiled, so that the semantics can be sent to other processes"""
+        consts = Engine.get_constants(model, minimal_ranges)
+        variables = ['cf']
+        min_values = {'cf':0}
+        max_values = {'cf':len(model.elements)}
+        if ep_module:
+            variables += list(model.data.keys())
+            for d_name, [low, high] in epl_encoding.Encoding.get_data_ranges(model, \
+                minimal_ranges).items():
+                min_values[d_name] = low
+                max_values[d_name] = high
+        # the cf and ep commands of an element synchronize on the action of the element
+        actions = []
+        for el_name, el_value in model.elements.items():
+            if ep_module and el_value['sub_model']:
+                model.logger.warning('Sub-model of element \"' + el_name + \
+                    '\" is ignored in the DTMC.')
+            if ep_module and el_value['repetitions'] > 1:
+                model.logger.warning('Repetitions of element \"' + el_name + \
+                    '\" are ignored in the DTMC.')
+            ep_commands = None
+            if ep_module and el_value['df_outputs']:
+                ep_commands = Engine.get_ep_commands(model, el_name)
+            actions.append([Engine.get_cf_commands(model, el_name), ep_commands])
+        if not ep_module or not init_combinations:
+            init_combinations = [init_values or {}]
+        initial_states = []
+        for combination in init_combinations:
+            state = [consts[model.initial_element]]
+            for d_name in variables[1:]:
+                state.append(Engine.encode_value(combination.get(d_name, \
+                    model.data[d_name]['initial_value']), consts))
+            initial_states.append(state)
+        return {'variables':variables, 'min_values':min_values, 'max_values':max_values, \
+            'actions':actions, 'initial_states':initial_states, 'consts':consts}
+
+    @staticmethod
+    def compile_actions(actions):
+        """@brief compiles the commands of the actions of get_semantics"""
+        return [[[epl_parser.Parser.compile_prism_command(command) for command in commands] \
+            if commands is not None else None for commands in action] for action in actions]
+
+    @staticmethod
+    def build_dtmc(model, time_reward=False, ep_module=True, init_values=None, \
+        init_combinations=None, minimal_ranges=True):
+        """@brief builds the reachable state space of the model generated by
+        PRISM.generate_prism_model with the same arguments, labels of all failures"""
+        semantics = Engine.get_semantics(model, ep_module, init_values, init_combinations, \
+            minimal_ranges)
+        variables = semantics['variables']
+        consts = semantics['consts']
+        states, matrix, initial = Engine.explore(variables, semantics['max_values'], \
+            Engine.compile_actions(semantics['actions']), semantics['initial_states'], consts, \
+            semantics['min_values'])
+        env = Engine.get_env(consts, variables, states)
+        labels = {}
+        if ep_module:
+            for f_name, f_value in model.failures.items():
+                formula = epl_parser.Parser.compile(\
+                    epl_parser.Parser.parse_prism_expression(f_value))
+                labels[f_name] = Engine.evaluate(formula, env, len(states), bool).copy()
+        rewards = {}
+        if time_reward:
+            # cf=stop has no time
+            times = np.array([el_value['time'] for el_value in model.elements.values()] + [0.0], \
+                dtype=float)
+            rewards['time'] = times[states[:, 0]]
+        return DTMC(variables, states, matrix, initial, labels, rewards)
+
+    @staticmethod
+    def check_data_ranges(model):
+        """@brief builds the DTMC with the minimal ranges of the data and with the range of all
+        values and the former encoding of string values, returns {'equal', 'states', 'bits',
+        'global_bits'}: equal = the same states after decoding, transitions and failure labels,
+        bits = bits of a state vector, i.e. the boolean variables of the MTBDD, with the minimal
+        and with the global ranges"""
+        ranges = [epl_encoding.Encoding.get_data_ranges(model, minimal) \
+            for minimal in [True, False]]
+        bits = [len(model.elements).bit_length() + sum((high - low).bit_length() \
+            for low, high in data_ranges.values()) for data_ranges in ranges]
+        dtmc = Engine.build_dtmc(model, minimal_ranges=False)
+        try:
+            minimal_dtmc = Engine.build_dtmc(model)
+            # the codes of string values differ, states are matched by their decoded values
+            decoded = [Engine.decode_states(model, states, minimal) \
+                for states, minimal in [[minimal_dtmc.states, True], [dtmc.states, False]]]
+            indexes = {state:i for i, state in enumerate(decoded[1])}
+            order = [indexes.get(state) for state in decoded[0]]
+            equal = len(indexes) == len(order) and None not in order
+            if equal:
+                equal = [order[i] for i in minimal_dtmc.initial] == dtmc.initial and \
+                    abs(minimal_dtmc.matrix - dtmc.matrix[order][:, order]).max() == 0 and \
+                    all(np.array_equal(minimal_dtmc.labels[f_name], \
+                    dtmc.labels[f_name][order]) for f_name in dtmc.labels)
+        except EngineError as exception:
+            model.logger.warning('Minimal ranges of data: ' + str(exception))
+            equal = False
+        return {'equal':bool(equal), 'states':len(dtmc.states), 'bits':bits[0], \
+            'global_bits':bits[1]}
+
+    @staticmethod
+    def decode_states(model, states, minimal_ranges=True):
+        """@brief returns the states of a DTMC of build_dtmc as tuples of the element name
+        and the data values"""
+        elements = list(model.elements.keys()) + ['stop']
+        values = epl_encoding.Encoding.encode_string_values(model, minimal_ranges)
+        return [tuple([elements[state[0]]] + [values.get(value, value) \
+            for value in state[1:]]) for state in states.tolist()]
+
+    @staticmethod
+    def build_local_matrix(model, el_name, d_names, initial_states):
+        """@brief explores the states reachable by the ep commands of the element from
+        initial_states, returns [sorted states, stochastic matrix, indexes of initial_states]"""
+        ranges = epl_encoding.Encoding.get_data_ranges(model)
+        return Engine.explore(d_names, {d_name:ranges[d_name][1] for d_name in d_names}, \
+            [[Engine.compile_ep_commands(model, el_name), None]], initial_states, \
+            Engine.get_constants(model), {d_name:ranges[d_name][0] for d_name in d_names})
+
+    @staticmethod
+    def matrix_power(matrix, n):
+        """@brief computes matrix^n by repeated squaring, O(log n) matrix products"""
+        result = None
+        while n > 0:
+            if n & 1:
+                result = matrix if result is None else result @ matrix
+            n >>= 1
+            if n > 0:
+                matrix = matrix @ matrix
+        if result is None:
+            return np.identity(matrix.shape[0])
+        return result
+
+    @staticmethod
+    def compute_repetitions(model, el_name, combinations):
+        """@brief computes the distributions after the repetitions of the element for all
+        combinations of input values,
+        returns [probs, state_lines] in the format of PRISM -exporttr"""
+        import scipy.sparse
+        el_value = model.elements[el_name]
+        d_ins_outs = set(el_value['df_inputs'] + el_value['df_outputs'])
+        d_names = [d_name for d_name in model.data if d_name in d_ins_outs]
+        consts = Engine.get_constants(model)
+        initial_states = [[Engine.encode_value(init_values.get(d_name, \
+            model.data[d_name]['initial_value']), consts) for d_name in d_names] \
+            for init_values in combinations]
+        states, matrix, initial = Engine.build_local_matrix(model, el_name, d_names, \
+            initial_states)
+        # dense products are faster for the small local state spaces
+        if len(states) <= 2048:
+            matrix = matrix.toarray()
+        power = Engine.matrix_power(matrix, el_value['repetitions'])
+        distributions = power[initial]
+        if scipy.sparse.issparse(distributions):
+            distributions = distributions.toarray()
+        return Engine.get_results(d_names, states, distributions)
+
+    @staticmethod
+    def compute_steady_states(model, combinations, solver):
+        """@brief computes steady state probabilities of the model for all combinations of
+        input values with an epl_solver.Solver, returns [probs, state_lines] as PRISM -exportss"""
+        dtmc = Engine.build_dtmc(model, init_combinations=combinations)
+        initial = np.zeros((len(dtmc.initial), len(dtmc.states)))
+        initial[np.arange(len(dtmc.initial)), dtmc.initial] = 1.0
+        return Engine.get_results(dtmc.variables, dtmc.states, \
+            solver.steady_state(dtmc.matrix, initial))
+
+    @staticmethod
+    def compute_time_series(model, f_name, steps):
+        """@brief computes in a single forward pass at every step of the sorted steps:
+        'P' = probability of the failure, 'N_failures' = number of failures,
+        'downtime' and 'time', the same properties as PRISM.compute_P/N_failures/downtime"""
+        dtmc = Engine.build_dtmc(model, time_reward=True)
+        failure = dtmc.labels[f_name]
+        return epl_solver.Solver.time_series(dtmc.matrix, dtmc.get_initial_distribution(), \
+            steps, targets=failure, rewards={'N_failures':failure.astype(float), \
+            'downtime':failure * dtmc.rewards['time'], 'time':dtmc.rewards['time']})
+
+    @staticmethod
+    def compute_execution_time(model):
+        """@brief computes R{"time"}=? [ C ] of the control flow as PRISM.compute_execution_time
+        by a dense linear solve, cf commands that reference data raise a ParseError"""
+        dtmc = Engine.build_dtmc(model, time_reward=True, ep_module=False)
+        reward = dtmc.rewards['time']
+        in_bscc = np.zeros(len(dtmc.states), dtype=bool)
+        endless = np.zeros(len(dtmc.states), dtype=bool)
+        for bscc in epl_solver.Solver.get_bsccs(dtmc.matrix)[1]:
+            in_bscc[bscc] = True
+            endless[bscc] = reward[bscc].any()
+        # the time is infinite if a loop of elements with time is reached
+        infinite = epl_solver.Solver.get_backward_reachable(dtmc.matrix, endless)
+        initial = dtmc.get_initial_distribution()
+        if initial[infinite].any():
+            return float('inf')
+        transient = np.nonzero(~in_bscc & ~infinite)[0]
+        times = np.zeros(len(dtmc.states))
+        times[transient] = np.linalg.solve(np.identity(len(transient)) - \
+            dtmc.matrix[transient][:, transient].toarray(), reward[transient])
+        return float(initial @ times)
+
+    @staticmethod
+    def compute_reachability(model, f_name, solver, init_combinations=None):
+        """@brief computes the probability and the expected time to reach the failure from all
+        states reachable from init_combinations with an epl_solver.Solver, one solve for all
+        initial states, None = all combinations of data values, returns a ReachabilityTable"""
+        if init_combinations is None:
+            d_names = list(model.data.keys())
+            init_combinations = [dict(zip(d_names, init_values_vector)) \
+                for init_values_vector in itertools.product(\
+                *[model.data[d_name]['values'] for d_name in d_names])]
+        dtmc = Engine.build_dtmc(model, time_reward=True, init_combinations=init_combinations)
+        failure = dtmc.labels[f_name]
+        return ReachabilityTable(model, dtmc, solver.reachability(dtmc.matrix, failure), \
+            solver.expected_reward(dtmc.matrix, failure, dtmc.rewards['time']))
+
+    @staticmethod
+    def get_results(variables, states, distributions):
+        """@brief returns [probs, state_lines] of every distribution in the format of PRISM
+        -exportss/-exporttr, only for the states with positive probability"""
+        header = "(" + ",".join(variables) + ")"
+        results = []
+        for distribution in distributions:
+            reachable = np.nonzero(distribution > 0)[0]
+            state_lines = [header] + [str(i) + ":(" + ",".join(str(value) \
+                for value in state) + ")" \
+                for i, state in zip(reachable, states[reachable].tolist())]
+            results.append([distribution[reachable].tolist(), state_lines])
+        return results
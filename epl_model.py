@@ -4,6 +4,12 @@ Model class.
 """
 
 import re
+import copy
+import hashlib
+import itertools
+
+# global counter, so that versions are never repeated, also between models
+_VERSIONS = itertools.count(1)
 
 class Model(object):
     """@brief Model class"""
@@ -15,6 +21,19 @@ class Model(object):
         self.data = {}     # key = data name
         self.failures = {} # key = failure name
         self.initial_element = None
+        # version of the last change of the model or its sub models
+        self.version = next(_VERSIONS)
+        # key = element, data, or failure name, value = version of its last change
+        self.versions = {}
+        # [host model, host element name] for sub models
+        self.host = None
+        # memo of computed sub models and repetitions,
+        # key = (element name, 'sub_model' or 'repetitions')
+        self.abstractions = {}
+        # memo of generated PRISM fragments of elements and data,
+        # value = (key of the content the text is generated from, text),
+        # key = (element or data name, 'cf', 'ep' or 'declaration')
+        self.fragments = {}
         self.logger.message("Model created")
 
     def check_name_correct(self, name):
@@ -56,14 +75,44 @@ class Model(object):
         """@brief checks that name is correct and unique"""
         return self.check_name_correct(name) and self.check_name_unique(name)
 
+    def touch(self, *names):
+        """@brief marks elements, data, or failures as changed, the change is
+        propagated to the host elements, call it after direct changes of the model dicts"""
+        version = next(_VERSIONS)
+        for name in names:
+            self.versions[name] = version
+        self.version = version
+        if self.host:
+            self.host[0].touch(self.host[1])
+
+    def get_version(self, *names):
+        """@brief returns versions of the given elements, data, or failures"""
+        versions = self.versions
+        return tuple([versions.get(name, 0) for name in names])
+
     def clear(self):
         """@brief clears model"""
         self.elements.clear()
         self.data.clear()
         self.failures.clear()
         self.initial_element = None
+        self.abstractions.clear()
+        self.fragments.clear()
+        self.versions.clear()
+        self.touch()
         self.logger.message("Model cleared")
 
+    def copy(self):
+        """@brief returns a copy of the model that shares the logger and the sub models,
+        the memorized fragments are not changed and need no deep copy"""
+        memo = {id(self.logger): self.logger, id(self.fragments): dict(self.fragments)}
+        if self.host:
+            memo[id(self.host[0])] = self.host[0]
+        for el_value in self.elements.values():
+            if el_value['sub_model']:
+                memo[id(el_value['sub_model'])] = el_value['sub_model']
+        return copy.deepcopy(self, memo)
+
     def set_initial_element(self, name):
         """@brief sets initial element"""
         # name check
@@ -72,6 +121,7 @@ class Model(object):
             return False
         # set initial element
         self.initial_element = name
+        self.touch(name)
         self.logger.message("Initial element is set to " + name)
         return True
 
@@ -107,6 +157,9 @@ class Model(object):
             'df_outputs': [], \
             'cf_prism_commands': [], \
             'ep_prism_commands': []}
+        if sub_model:
+            sub_model.host = [self, name]
+        self.touch(name)
         self.logger.message("Element \"" + name + "\" added")
         return True
 
@@ -125,6 +178,7 @@ class Model(object):
             return False
         # update repetitions
         self.elements[name]['repetitions'] = repetitions
+        self.touch(name)
         self.logger.message("Repetitions of element \"" + name + "\" set to " + str(repetitions))
         return True
 
@@ -140,6 +194,7 @@ class Model(object):
             return False
         # update time
         self.elements[name]['time'] = time
+        self.touch(name)
         self.logger.message("Time of element \"" + name + "\" set to " + str(time))
         return True
 
@@ -171,6 +226,7 @@ class Model(object):
         # remove if initial
         if self.initial_element == name:
             self.initial_element = None
+        self.touch(name)
         self.logger.message("Element \"" + name + "\" removed")
         return True
 
@@ -221,6 +277,7 @@ class Model(object):
             'df_outputs': [], \
             'values': values, \
             'initial_value': initial_value}
+        self.touch(name)
         self.logger.message("Data \"" + name + "\" added: values = " \
             + str(values) + ", initial_value = " + str(initial_value))
         return True
@@ -244,6 +301,7 @@ class Model(object):
         # update values
         self.data[name]['values'] = values
         self.data[name]['initial_value'] = initial_value
+        self.touch(name)
         self.logger.message("Data \"" + name + "\" values updated: values = " \
             + str(values) + ", initial_value = " + str(initial_value))
         return True
@@ -264,6 +322,7 @@ class Model(object):
             self.remove_data_flow(name, df_output)
         # remove the data
         del self.data[name]
+        self.touch(name)
         self.logger.message("Data \"" + name + "\" removed")
         return True
 
@@ -285,6 +344,7 @@ class Model(object):
         # add control flow
         self.elements[from_name]['cf_outputs'].append(to_name)
         self.elements[to_name]['cf_inputs'].append(from_name)
+        self.touch(from_name, to_name)
         self.logger.message("Control flow arc added: \"" + \
             from_name + "\" -> \"" + to_name + "\"")
         return True
@@ -306,6 +366,7 @@ class Model(object):
             return False
         self.elements[from_name]['cf_outputs'].remove(to_name)
         self.elements[to_name]['cf_inputs'].remove(from_name)
+        self.touch(from_name, to_name)
         self.logger.message("Control flow arc \"" + from_name + \
                 "\" -> \"" + to_name + "\" removed")
         return True
@@ -352,6 +413,7 @@ class Model(object):
             # add
             self.elements[to_name]['df_inputs'].append(from_name)
             self.data[from_name]['df_outputs'].append(to_name)
+        self.touch(from_name, to_name)
         self.logger.message("Data flow arc added: \"" + \
             from_name + "\" -> \"" + to_name + "\"")
         return True
@@ -379,6 +441,7 @@ class Model(object):
                 return False
             self.data[from_name]['df_outputs'].remove(to_name)
             self.elements[to_name]['df_inputs'].remove(from_name)
+        self.touch(from_name, to_name)
         self.logger.message("Data flow arc \"" + from_name + \
                 "\" -> \"" + to_name + "\" removed")
         return True
@@ -389,6 +452,7 @@ class Model(object):
         if not self.check_name(name):
             return False
         self.failures[name] = expression
+        self.touch(name)
         self.logger.message("Failure added: " + name + " = '" + expression + "'")
         return True
 
@@ -400,6 +464,7 @@ class Model(object):
             return False
         # update
         self.failures[name] = expression
+        self.touch(name)
         self.logger.message("Failure updated: " + name + " = '" + expression + "'")
         return True
 
@@ -411,6 +476,7 @@ class Model(object):
             return False
         # remove
         del self.failures[name]
+        self.touch(name)
         self.logger.message("Failure removed: " + name)
         return True
 
@@ -436,6 +502,8 @@ class Model(object):
         self.elements[el_name]['sub_model'] = sub_model
         self.elements[el_name]['ep_prism_commands'] = []
         self.elements[el_name]['time'] = 1
+        sub_model.host = [self, el_name]
+        self.touch(el_name)
         return True
 
     def remove_sub_model(self, el_name):
@@ -448,5 +516,106 @@ class Model(object):
             self.logger.error("Element \"" + el_name + "\" has no sub model")
             return False
         # remove submodel
+        self.elements[el_name]['sub_model'].host = None
         self.elements[el_name]['sub_model'] = None
+        self.touch(el_name)
+        return True
+
+    def update_element_sub_model(self, el_name, sub_model):
+        """@brief sets sub model of an element"""
+        # check existence
+        if not el_name in self.elements:
+            self.logger.error("No element \"" + el_name + "\"")
+            return False
+        if not isinstance(sub_model, Model):
+            self.logger.error("Sub model \"" + el_name + \
+                "\" is not an instance of class epl_model.Model")
+            return False
+        # set submodel
+        self.elements[el_name]['sub_model'] = sub_model
+        sub_model.host = [self, el_name]
+        self.touch(el_name)
+        return True
+
+    def update_element_prism_commands(self, el_name, cf_prism_commands=None, \
+        ep_prism_commands=None):
+        """@brief updates cf and/or ep prism commands of an element"""
+        # check existence
+        if not el_name in self.elements:
+            self.logger.error("No element \"" + el_name + "\"")
+            return False
+        # update
+        if cf_prism_commands is not None:
+            self.elements[el_name]['cf_prism_commands'] = list(cf_prism_commands)
+        if ep_prism_commands is not None:
+            self.elements[el_name]['ep_prism_commands'] = list(ep_prism_commands)
+        self.touch(el_name)
         return True
+
+    @staticmethod
+    def rename_in_prism_text(text, renaming):
+        """@brief renames identifiers in a PRISM command or formula, renaming = {old:new}"""
+        return re.sub('(?<![A-Za-z0-9_.])[A-Za-z_][A-Za-z0-9_]*', \
+            lambda match: renaming.get(match.group(0), match.group(0)), text)
+
+    def __get_canonical_order(self, inputs, outputs):
+        """@brief orders elements and data independently of their names"""
+        # elements in the order of control flow from the initial element
+        el_order = []
+        queue = [self.initial_element] if self.initial_element in self.elements else []
+        while queue:
+            el_name = queue.pop(0)
+            if el_name not in el_order:
+                el_order.append(el_name)
+                queue += self.elements[el_name]['cf_outputs']
+        el_order += [el_name for el_name in self.elements if el_name not in el_order]
+        # interface data first, then data in the order of their usage by the elements
+        d_order = [d_name for d_name in inputs + outputs if d_name in self.data]
+        for el_name in el_order:
+            el_value = self.elements[el_name]
+            for d_name in itertools.chain(el_value['df_inputs'], el_value['df_outputs'], \
+                re.findall('[A-Za-z_][A-Za-z0-9_]*', \
+                " ".join(el_value['cf_prism_commands'] + el_value['ep_prism_commands']))):
+                if d_name in self.data and d_name not in d_order:
+                    d_order.append(d_name)
+        d_order += [d_name for d_name in self.data if d_name not in d_order]
+        return [el_order, d_order]
+
+    def get_canonical_form(self, inputs=None, outputs=None):
+        """@brief returns [text, renaming] of the model that is invariant under
+        consistent renaming of elements and data, inputs and outputs are the interface
+        data of the host element, renaming = {name:canonical name}"""
+        inputs = inputs if inputs else []
+        outputs = outputs if outputs else []
+        el_order, d_order = self.__get_canonical_order(inputs, outputs)
+        # '#' cannot be a part of a name, so canonical names never clash with values
+        renaming = {el_name:"#e" + str(i) for i, el_name in enumerate(el_order)}
+        renaming.update({d_name:"#d" + str(i) for i, d_name in enumerate(d_order)})
+        lines = ["inputs " + str([renaming.get(d_name, d_name) for d_name in inputs]), \
+            "outputs " + str([renaming.get(d_name, d_name) for d_name in outputs]), \
+            "initial " + str(renaming.get(self.initial_element))]
+        for el_name in el_order:
+            el_value = self.elements[el_name]
+            lines.append("element " + renaming[el_name] + \
+                " time " + repr(el_value['time']) + \
+                " repetitions " + str(el_value['repetitions']))
+            for key in ['cf_outputs', 'df_inputs', 'df_outputs']:
+                lines.append("\t" + key + " " + str([renaming[name] for name in el_value[key]]))
+            for key in ['cf_prism_commands', 'ep_prism_commands']:
+                for command in el_value[key]:
+                    lines.append("\t" + key + " " + Model.rename_in_prism_text(command, renaming))
+            if el_value['sub_model']:
+                lines.append("\tsub_model " + el_value['sub_model'].get_structural_hash(\
+                    el_value['df_inputs'], el_value['df_outputs']))
+        for d_name in d_order:
+            d_value = self.data[d_name]
+            lines.append("data " + renaming[d_name] + " values " + repr(d_value['values']) + \
+                " initial_value " + repr(d_value['initial_value']))
+        lines += sorted("failure " + Model.rename_in_prism_text(f_value, renaming) \
+            for f_value in self.failures.values())
+        return ["\n".join(lines), renaming]
+
+    def get_structural_hash(self, inputs=None, outputs=None):
+        """@brief hash of the canonical form, equal for models that differ only in names"""
+        text = self.get_canonical_form(inputs, outputs)[0]
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
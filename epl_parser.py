@@ -0,0 +1,433 @@
+"""
+Error Propagation Library V6.
+Parser of the PRISM commands and expressions used in EPL models.
+"""
+
+import re
+import math
+import functools
+
+import numpy as np
+
+class ParseError(Exception):
+    """@brief error in a PRISM command or expression"""
+    pass
+
+class Parser(object):
+    """@brief recursive descent parser of the PRISM subset used by EPL:
+    commands "guard -> p1:update1 + p2:update2;" and expressions,
+    the abstract syntax tree consists of tuples:
+    ('num', value), ('bool', value), ('var', name), ('not', e), ('neg', e),
+    ('bin', operator, e1, e2), ('ite', condition, e1, e2), ('call', function, (e1, ...)),
+    a command is a dict {'guard':e, 'updates':[[probability e, {variable:e}], ...]},
+    parsed commands and expressions are cached and shared, they must not be changed"""
+
+    token_regexp = re.compile(r"\s*(?:(\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)" \
+        r"|([A-Za-z_][A-Za-z0-9_]*'?)|(->|<=>|=>|<=|>=|!=|[-+*/()&|!=<>?:;,]))")
+    functions = ['min', 'max', 'floor', 'ceil', 'pow', 'mod', 'log']
+
+    def __init__(self, text):
+        """@brief Constructor, tokenizes the text"""
+        self.text = text
+        self.tokens = Parser.tokenize(text)
+        self.pos = 0
+
+    @staticmethod
+    def tokenize(text):
+        """@brief splits text to [kind, value] tokens, kind is 'num', 'id', or 'op'"""
+        tokens = []
+        pos = 0
+        text = text.rstrip()
+        while pos < len(text):
+            match = Parser.token_regexp.match(text, pos)
+            if not match or match.end() == pos:
+                raise ParseError("Unexpected symbol \"" + text[pos:].strip()[:10] + \
+                    "\" in \"" + text + "\"")
+            number, identifier, operator = match.groups()
+            if number is not None:
+                tokens.append(['num', number])
+            elif identifier is not None:
+                tokens.append(['id', identifier])
+            else:
+                tokens.append(['op', operator])
+            pos = match.end()
+        return tokens
+
+    def __peek(self):
+        """@brief returns the current token value or None"""
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos][1]
+        return None
+
+    def __next(self):
+        """@brief returns the current token and moves to the next one"""
+        if self.pos >= len(self.tokens):
+            raise ParseError("Unexpected end of \"" + self.text + "\"")
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def __expect(self, value):
+        """@brief skips the expected token"""
+        token = self.__next()
+        if token[1] != value:
+            raise ParseError("Expected \"" + value + "\" but found \"" + token[1] + \
+                "\" in \"" + self.text + "\"")
+
+    def __at_end(self):
+        """@brief checks that all tokens are parsed"""
+        if self.pos < len(self.tokens):
+            raise ParseError("Unexpected \"" + self.tokens[self.pos][1] + \
+                "\" in \"" + self.text + "\"")
+
+    def __parse_binary(self, operators, parse_operand):
+        """@brief parses left associative binary operators"""
+        left = parse_operand()
+        while self.__peek() in operators:
+            operator = self.__next()[1]
+            left = ('bin', operator, left, parse_operand())
+        return left
+
+    def parse_expression(self):
+        """@brief expression = implication ['?' expression ':' expression]"""
+        condition = self.__parse_iff()
+        if self.__peek() == '?':
+            self.__next()
+            then_value = self.parse_expression()
+            self.__expect(':')
+            return ('ite', condition, then_value, self.parse_expression())
+        return condition
+
+    def __parse_iff(self):
+        """@brief iff = implies {'<=>' implies}"""
+        return self.__parse_binary(['<=>'], self.__parse_implies)
+
+    def __parse_implies(self):
+        """@brief implies = or {'=>' or}"""
+        return self.__parse_binary(['=>'], self.__parse_or)
+
+    def __parse_or(self):
+        """@brief or = and {'|' and}"""
+        return self.__parse_binary(['|'], self.__parse_and)
+
+    def __parse_and(self):
+        """@brief and = not {'&' not}"""
+        return self.__parse_binary(['&'], self.__parse_not)
+
+    def __parse_not(self):
+        """@brief not = '!' not | relation"""
+        if self.__peek() == '!':
+            self.__next()
+            return ('not', self.__parse_not())
+        return self.__parse_relation()
+
+    def __parse_relation(self):
+        """@brief relation = sum [relational operator sum]"""
+        return self.__parse_binary(['=', '!=', '<', '<=', '>', '>='], self.__parse_sum)
+
+    def __parse_sum(self):
+        """@brief sum = product {('+' | '-') product}"""
+        return self.__parse_binary(['+', '-'], self.__parse_product)
+
+    def __parse_product(self):
+        """@brief product = unary {('*' | '/') unary}"""
+        return self.__parse_binary(['*', '/'], self.__parse_unary)
+
+    def __parse_unary(self):
+        """@brief unary = '-' unary | primary"""
+        if self.__peek() == '-':
+            self.__next()
+            return ('neg', self.__parse_unary())
+        return self.__parse_primary()
+
+    def __parse_primary(self):
+        """@brief primary = number | true | false | name | function(args) | (expression)"""
+        kind, value = self.__next()
+        if kind == 'num':
+            if re.fullmatch('[0-9]+', value):
+                return ('num', int(value))
+            return ('num', float(value))
+        if kind == 'id':
+            if value == 'true':
+                return ('bool', True)
+            if value == 'false':
+                return ('bool', False)
+            if value.endswith("'"):
+                raise ParseError("Unexpected primed variable \"" + value + \
+                    "\" in \"" + self.text + "\"")
+            if value in Parser.functions and self.__peek() == '(':
+                self.__next()
+                args = [self.parse_expression()]
+                while self.__peek() == ',':
+                    self.__next()
+                    args.append(self.parse_expression())
+                self.__expect(')')
+                return ('call', value, tuple(args))
+            return ('var', value)
+        if value == '(':
+            expression = self.parse_expression()
+            self.__expect(')')
+            return expression
+        raise ParseError("Unexpected \"" + value + "\" in \"" + self.text + "\"")
+
+    def __parse_assignments(self):
+        """@brief assignments = 'true' | assignment {'&' assignment},
+        assignment = '(' name' '=' expression ')'"""
+        assignments = {}
+        if self.__peek() == 'true':
+            self.__next()
+            return assignments
+        while True:
+            self.__expect('(')
+            kind, target = self.__next()
+            if kind != 'id' or not target.endswith("'"):
+                raise ParseError("Expected a primed variable but found \"" + target + \
+                    "\" in \"" + self.text + "\"")
+            self.__expect('=')
+            assignments[target[:-1]] = self.parse_expression()
+            self.__expect(')')
+            if self.__peek() != '&':
+                return assignments
+            self.__next()
+
+    def __starts_assignments(self):
+        """@brief checks if assignments start at the current position"""
+        if self.__peek() == 'true':
+            return True
+        return self.__peek() == '(' and self.pos + 1 < len(self.tokens) and \
+            self.tokens[self.pos + 1][1].endswith("'")
+
+    def parse_command(self):
+        """@brief command = guard '->' update {'+' update} ';',
+        update = [probability ':'] assignments"""
+        guard = self.parse_expression()
+        self.__expect('->')
+        updates = []
+        while True:
+            if self.__starts_assignments():
+                probability = ('num', 1)
+            else:
+                probability = self.parse_expression()
+                self.__expect(':')
+            updates.append([probability, self.__parse_assignments()])
+            if self.__peek() != '+':
+                break
+            self.__next()
+        self.__parse_end()
+        return {'guard':guard, 'updates':updates}
+
+    def parse_formula(self):
+        """@brief formula = expression [';'], e.g. failure formula"""
+        expression = self.parse_expression()
+        self.__parse_end()
+        return expression
+
+    def __parse_end(self):
+        """@brief skips the optional ';' and checks that all tokens are parsed"""
+        if self.__peek() == ';':
+            self.__next()
+        self.__at_end()
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def parse_prism_command(cls, text):
+        """@brief parses a cf or ep command without the action label"""
+        return cls(text).parse_command()
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def parse_prism_expression(cls, text):
+        """@brief parses an expression, e.g. failure formula"""
+        return cls(text).parse_formula()
+
+    @staticmethod
+    def get_names(expression, names=None):
+        """@brief returns the set of names (variables, values, constants) in an expression"""
+        if names is None:
+            names = set()
+        kind = expression[0]
+        if kind == 'var':
+            names.add(expression[1])
+        elif kind in ('not', 'neg'):
+            Parser.get_names(expression[1], names)
+        elif kind == 'ite':
+            for operand in expression[1:]:
+                Parser.get_names(operand, names)
+        elif kind == 'bin':
+            Parser.get_names(expression[2], names)
+            Parser.get_names(expression[3], names)
+        elif kind == 'call':
+            for arg in expression[2]:
+                Parser.get_names(arg, names)
+        return names
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def get_references(text):
+        """@brief returns names referenced by a command:
+        {'guard':names in the guard, 'updates':names in probabilities and updated values,
+        'targets':updated variables}"""
+        command = Parser.parse_prism_command(text)
+        updates = set()
+        targets = set()
+        for probability, assignments in command['updates']:
+            Parser.get_names(probability, updates)
+            for target, value in assignments.items():
+                targets.add(target)
+                Parser.get_names(value, updates)
+        return {'guard':frozenset(Parser.get_names(command['guard'])), \
+            'updates':frozenset(updates), 'targets':frozenset(targets)}
+
+    @staticmethod
+    def to_text(expression, precedence=0):
+        """@brief prints an expression, brackets only where needed"""
+        kind = expression[0]
+        if kind in ('num', 'var'):
+            return str(expression[1])
+        if kind == 'bool':
+            return 'true' if expression[1] else 'false'
+        if kind == 'call':
+            return expression[1] + "(" + \
+                ", ".join(Parser.to_text(arg) for arg in expression[2]) + ")"
+        if kind == 'neg':
+            text = "-" + Parser.to_text(expression[1], _PRECEDENCES['neg'])
+            own = _PRECEDENCES['neg']
+        elif kind == 'not':
+            text = "!" + Parser.to_text(expression[1], _PRECEDENCES['!'])
+            own = _PRECEDENCES['!']
+        elif kind == 'ite':
+            own = 0
+            text = Parser.to_text(expression[1], 1) + " ? " + \
+                Parser.to_text(expression[2]) + " : " + Parser.to_text(expression[3])
+        else:
+            operator = expression[1]
+            own = _PRECEDENCES[operator]
+            separator = " " + operator + " " if own < _PRECEDENCES['='] else operator
+            # left associative operators, the right operand needs brackets on the same level
+            text = Parser.to_text(expression[2], own) + separator + \
+                Parser.to_text(expression[3], own + 1)
+        if own < precedence:
+            return "(" + text + ")"
+        return text
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def compile(expression):
+        """@brief compiles an expression to a function of env = {name:value}, the values of
+        variables can be numpy arrays, then the expression is evaluated for all elements at once"""
+        kind = expression[0]
+        if kind in ('num', 'bool'):
+            value = expression[1]
+            return lambda env: value
+        if kind == 'var':
+            name = expression[1]
+            def variable(env):
+                try:
+                    return env[name]
+                except KeyError:
+                    raise ParseError("Unknown name \"" + name + "\"")
+            return variable
+        if kind == 'not':
+            operand = Parser.compile(expression[1])
+            return lambda env: np.logical_not(operand(env))
+        if kind == 'neg':
+            operand = Parser.compile(expression[1])
+            return lambda env: np.negative(operand(env))
+        if kind == 'ite':
+            condition, then_value, else_value = [Parser.compile(operand) \
+                for operand in expression[1:]]
+            return lambda env: np.where(condition(env), then_value(env), else_value(env))
+        if kind == 'call':
+            function = _VECTOR_FUNCTIONS[expression[1]]
+            args = [Parser.compile(arg) for arg in expression[2]]
+            return lambda env: function(*[arg(env) for arg in args])
+        function = _VECTOR_OPERATORS[expression[1]]
+        left = Parser.compile(expression[2])
+        right = Parser.compile(expression[3])
+        return lambda env: function(left(env), right(env))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def compile_prism_command(text):
+        """@brief parses and compiles a command:
+        {'guard':function, 'updates':[[probability function, {variable:function}], ...]}"""
+        command = Parser.parse_prism_command(text)
+        return {'guard':Parser.compile(command['guard']), \
+            'updates':[[Parser.compile(probability), \
+            {target:Parser.compile(value) for target, value in assignments.items()}] \
+            for probability, assignments in command['updates']]}
+
+    @staticmethod
+    def command_to_text(command):
+        """@brief prints a command in the format of the EPL commands"""
+        updates = []
+        for probability, assignments in command['updates']:
+            if assignments:
+                update = " & ".join("(" + target + "'=" + Parser.to_text(value) + ")" \
+                    for target, value in assignments.items())
+            else:
+                update = "true"
+            if probability != ('num', 1) or len(command['updates']) > 1:
+                update = Parser.to_text(probability, _PRECEDENCES['+'] + 1) + ":" + update
+            updates.append(update)
+        return Parser.to_text(command['guard']) + " -> " + " + ".join(updates) + ";"
+
+def evaluate(expression, env):
+    """@brief evaluates an expression, env = {name:value} for variables and constants"""
+    kind = expression[0]
+    if kind in ('num', 'bool'):
+        return expression[1]
+    if kind == 'var':
+        try:
+            return env[expression[1]]
+        except KeyError:
+            raise ParseError("Unknown name \"" + expression[1] + "\"")
+    if kind == 'not':
+        return not evaluate(expression[1], env)
+    if kind == 'neg':
+        return -evaluate(expression[1], env)
+    if kind == 'ite':
+        if evaluate(expression[1], env):
+            return evaluate(expression[2], env)
+        return evaluate(expression[3], env)
+    if kind == 'call':
+        args = [evaluate(arg, env) for arg in expression[2]]
+        return _FUNCTIONS[expression[1]](*args)
+    operator = expression[1]
+    left = evaluate(expression[2], env)
+    # short cut evaluation of the logical operators
+    if operator == '&':
+        return bool(left) and bool(evaluate(expression[3], env))
+    if operator == '|':
+        return bool(left) or bool(evaluate(expression[3], env))
+    if operator == '=>':
+        return (not left) or bool(evaluate(expression[3], env))
+    return _OPERATORS[operator](left, evaluate(expression[3], env))
+
+_PRECEDENCES = {'<=>': 1, '=>': 2, '|': 3, '&': 4, '!': 5, \
+    '=': 6, '!=': 6, '<': 6, '<=': 6, '>': 6, '>=': 6, \
+    '+': 7, '-': 7, '*': 8, '/': 8, 'neg': 9}
+
+_OPERATORS = {'<=>': lambda a, b: bool(a) == bool(b), \
+    '=': lambda a, b: a == b, '!=': lambda a, b: a != b, \
+    '<': lambda a, b: a < b, '<=': lambda a, b: a <= b, \
+    '>': lambda a, b: a > b, '>=': lambda a, b: a >= b, \
+    '+': lambda a, b: a + b, '-': lambda a, b: a - b, \
+    '*': lambda a, b: a * b, '/': lambda a, b: a / b}
+
+_VECTOR_OPERATORS = {'&': np.logical_and, '|': np.logical_or, \
+    '=>': lambda a, b: np.logical_or(np.logical_not(a), b), \
+    '<=>': lambda a, b: np.equal(np.asarray(a, dtype=bool), np.asarray(b, dtype=bool)), \
+    '=': np.equal, '!=': np.not_equal, '<': np.less, '<=': np.less_equal, \
+    '>': np.greater, '>=': np.greater_equal, '+': np.add, '-': np.subtract, \
+    '*': np.multiply, '/': np.true_divide}
+
+_VECTOR_FUNCTIONS = {'min': lambda *args: functools.reduce(np.minimum, args), \
+    'max': lambda *args: functools.reduce(np.maximum, args), \
+    'floor': np.floor, 'ceil': np.ceil, 'pow': np.power, 'mod': np.mod, \
+    'log': lambda a, b: np.log(a) / np.log(b)}
+
+_FUNCTIONS = {'min': min, 'max': max, \
+    'floor': lambda a: int(math.floor(a)), 'ceil': lambda a: int(math.ceil(a)), \
+    'pow': lambda a, b: a ** b, 'mod': lambda a, b: a % b, \
+    'log': lambda a, b: math.log(a, b)}
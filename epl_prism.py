@@ -3,187 +3,203 @@ Error Propagation Library V6.
 PRISM interface.
 """
 
+import io
 import os
+import math
 import errno
+import hashlib
+import shutil
+import functools
 import itertools
+import tempfile
 import subprocess
+import concurrent.futures
 
-# keep this sequence of imports
-import matplotlib
-matplotlib.use('qt4agg')
-import matplotlib.pyplot as plt
+import epl_model
+import epl_parser
+import epl_encoding
+import epl_engine
+import epl_solver
+import epl_simulation
+import epl_reduction
 
 class PRISM(object):
     """@brief PRISM class """
 
-    def __init__(self, no_output=False, timeout=180):
+    # constant variable that tags the initial states of a single run over all input combinations
+    init_id = "epl_init_id"
+
+    # encoding of data values and default commands, see epl_encoding
+    get_maximum_value = staticmethod(epl_encoding.Encoding.get_maximum_value)
+    encode_string_values = staticmethod(epl_encoding.Encoding.encode_string_values)
+    get_data_ranges = staticmethod(epl_encoding.Encoding.get_data_ranges)
+    generate_default_cf_commands = staticmethod(epl_encoding.Encoding.generate_default_cf_commands)
+    get_default_values = staticmethod(epl_encoding.Encoding.get_default_values)
+    generate_default_ep_commands = staticmethod(epl_encoding.Encoding.generate_default_ep_commands)
+
+    def __init__(self, no_output=False, timeout=180, temp_dir=None, cache=None, \
+        single_run=False, engine="prism", pool=None):
         """@brief Constructor"""
         # Update these settings for your system !
         #self.prism_dir = "/Please/change/this/to/your/path/to/prism/bin"
         self.prism_dir = "/Users/andrey/ErrorPro6/prism-4.4-osx64/bin"
         self.prism_executable = "./prism"
+        # every PRISM run gets its own working directory inside temp_dir,
+        # None = system default, a RAM-backed location like "/dev/shm" is recommended
+        self.temp_dir = temp_dir
         self.prism_model_file = "temp.pm"
         self.prism_properties_file = "temp.prop"
         self.prism_results_file = "temp.csv"
         self.prism_states_file = "states.txt"
         self.prism_ss_tr_file = "ss_tr.txt"
+        # options that change the computed results, part of the cache keys
+        self.prism_options = ["-maxiters", "100000"]
         self.no_output = no_output
         self.timeout = timeout
+        # epl_cache.Cache of PRISM results, None = no caching
+        self.cache = cache
+        # compute all input combinations of a compound or repeated element in one PRISM run
+        self.single_run = single_run
+        # "prism", "python" = in-process computation of sub models and repetitions,
+        # or "simulation" = estimates of P_single, MTTF and P by the simulator
+        self.engine = engine
+        # solver of the in-process steady states, e.g. epl_solver.Solver(tolerance=1e-8)
+        self.solver = epl_solver.Solver()
+        # simulator of the "simulation" engine, e.g. epl_simulation.Simulator(width=0.001, jobs=4)
+        self.simulator = epl_simulation.Simulator()
+        # epl_prism_pool.PrismPool of running PRISM workers, None = a PRISM process per run
+        self.pool = pool
+        # execution time of the control flow by an in-process solve if the cf commands
+        # do not reference data, PRISM otherwise
+        self.fast_execution_time = True
+        # remove data that cannot influence the computed failures from the generated models,
+        # the removed data are logged
+        self.reduction = False
+        # reset data to their initial values where the control flow does not need them any more,
+        # the reset data are logged
+        self.dead_data_reset = False
+        self.__prism_version = None
 
     @staticmethod
-    def __generate_elements_consts(model):
-        """@brief generates consts for data values"""
-        res = "//Element consts\n"
+    def __write_elements_consts(model, write):
+        """@brief writes consts for elements"""
+        write("//Element consts\n")
         has_final_elements = False
-        for i, el_name in enumerate(model.elements.keys()):
-            res += "const int " + el_name + "=" + str(i) + ";\n"
-            if not model.elements[el_name]['cf_outputs']:
+        for i, (el_name, el_value) in enumerate(model.elements.items()):
+            write("const int " + el_name + "=" + str(i) + ";\n")
+            if not el_value['cf_outputs']:
                 has_final_elements = True
         if has_final_elements:
-            res += "const int stop=" + str(len(model.elements)) + ";\n"
-        return res
+            write("const int stop=" + str(len(model.elements)) + ";\n")
 
     @staticmethod
-    def __get_maximum_value(model):
-        """@brief generates consts for data values"""
-        str_values, int_values = PRISM.__separate_int_and_str_values(model)
-        len_i = len(int_values)
-        len_s = len(str_values)
-        if len_i > 0:
-            max_i = max(int_values)
-        else:
-            max_i = 1
-        return max(max_i, len_s + len_i - 1)
+    def __write_data_values_consts(values, write):
+        """@brief writes consts for data values in prism format,
+        values = encode_string_values(model)"""
+        write("//Data values consts\n")
+        for key, value in values.items():
+            write("const int " + value + "=" + str(key) + ";\n")
 
     @staticmethod
-    def __separate_int_and_str_values(model):
-        """@brief generates consts for data values"""
-        str_values = []
-        int_values = []
-        for data in model.data.values():
-            for value in data['values']:
-                if isinstance(value, str):
-                    if value not in str_values:
-                        str_values.append(value)
-                elif isinstance(value, int):
-                    if value not in int_values:
-                        int_values.append(value)
-        str_values.sort()
-        int_values.sort()
-        return [str_values, int_values]
+    def __write_cf_module(model, write, init_combinations=None):
+        """@brief writes cf prism module"""
+        write("//Control flow commands\n")
+        write("module control_flow\n")
+        if init_combinations:
+            write("\tcf:[0.." + str(len(model.elements)) + "];\n")
+        else:
+            write("\tcf:[0.." + str(len(model.elements)) + "] init " + model.initial_element + \
+                ";\n")
+        for el_name in model.elements:
+            el_value = model.elements[el_name]
+            write(PRISM.__get_fragment(model, (el_name, 'cf'), PRISM.__get_content_key(\
+                el_value['df_inputs'], el_value['cf_outputs'], el_value['cf_prism_commands']), \
+                PRISM.__generate_cf_fragment, model, el_name))
+        write("endmodule\n")
 
     @staticmethod
-    def encode_string_values(model):
-        """@brief generates consts for data values"""
-        str_values, int_values = PRISM.__separate_int_and_str_values(model)
-        res = {}
-        i = 0
-        while str_values:
-            if i not in int_values:
-                res[i] = str_values.pop()
-            i += 1
-        return res
+    def __generate_cf_fragment(model, el_name):
+        """@brief creates the commands of an element in the cf prism module"""
+        el_value = model.elements[el_name]
+        res = ["\t//Element " + el_name]
+        if el_value['df_inputs']:
+            res.append(", df inputs " + str(el_value['df_inputs']))
+        res.append(", cf transitions " + str(el_value['cf_outputs']) + "\n")
+        if el_value['cf_prism_commands']:
+            for cfc in el_value['cf_prism_commands']:
+                res.append("\t[" + el_name + "] " + cfc + "\t// <-- \n")
+        else:
+            res.append("\t[" + el_name + "] " + \
+                PRISM.generate_default_cf_commands(model, el_name) + "\n")
+        return "".join(res)
 
     @staticmethod
-    def __generate_data_values_consts(model):
-        """@brief generates consts for data values in prism format"""
-        values = PRISM.encode_string_values(model)
-        res = "//Data values consts\n"
-        for key, value in values.items():
-            res += "const int " + value + \
-                    "=" + str(key) + ";\n"
-        return res
+    def __get_fragment(model, key, content, generate, *args):
+        """@brief returns the prism text of a part of the model memorized in model.fragments
+        as (content, text), generate(*args) creates it again if the content it is generated from
+        has changed, so direct changes of the model dicts are seen as well"""
+        memo = model.fragments.get(key)
+        if memo and memo[0] == content:
+            return memo[1]
+        text = generate(*args)
+        model.fragments[key] = (content, text)
+        return text
 
     @staticmethod
-    def generate_default_cf_commands(model, el_name):
-        """@brief creates default prism cf commands"""
-        res = "cf=" + el_name + " -> "
-        el_value = model.elements[el_name]
-        if not el_value['cf_outputs']:
-            res += "(cf'=stop);"
-        else:
-            for cf_output in el_value['cf_outputs']:
-                res += str(1/len(el_value['cf_outputs'])) + \
-                ":(cf'=" + cf_output + ") + "
-            res = res[:-3] + ";"
-        return res
+    def __get_content_key(*parts):
+        """@brief returns a hash of the parts of the model a fragment is generated from"""
+        return hashlib.sha1(repr(parts).encode()).hexdigest()
 
     @staticmethod
-    def __generate_cf_module(model):
-        """@brief creates cf prism module"""
-        res = "//Control flow commands\n"
-        res += "module control_flow\n"
-        res += "\tcf:[0.." + str(len(model.elements)) +"] init " + model.initial_element + ";\n"
-        for el_name, el_value in model.elements.items():
-            res += "\t//Element " + el_name
-            if el_value['df_inputs']:
-                res += ", df inputs " + str(el_value['df_inputs'])
-            res += ", cf transitions " + str(el_value['cf_outputs']) + "\n"
-            if el_value['cf_prism_commands']:
-                for cfc in el_value['cf_prism_commands']:
-                    res += "\t[" + el_name + "] " + cfc + "\t// <-- \n"
+    def __write_data_declarations(model, d_names, ranges, write, init_values=None, \
+        init_combinations=None):
+        """@brief writes declarations of data variables, ranges of get_data_ranges"""
+        for d_name in d_names:
+            if init_combinations:
+                init = None
+            elif init_values and d_name in init_values:
+                init = init_values[d_name]
             else:
-                res += "\t[" + el_name + "] "
-                res += PRISM.generate_default_cf_commands(model, el_name)
-                res += "\n"
-        res += "endmodule\n"
-        return res
+                init = model.data[d_name]['initial_value']
+            write(PRISM.__get_fragment(model, (d_name, 'declaration'), \
+                (ranges[d_name][0], ranges[d_name][1], init), \
+                PRISM.__generate_data_declaration, d_name, ranges[d_name], init))
+        if init_combinations:
+            write("\t" + PRISM.init_id + " : [0 .. " + str(len(init_combinations) - 1) + "];\n")
 
     @staticmethod
-    def generate_default_ep_commands(model, el_name):
-        """@brief creates default prism ep commands"""
-        commands = []
-        el_value = model.elements[el_name]
-        if el_value['df_outputs']:
-            if not el_value['df_inputs']:
-                res = "(true) -> 1:"
-                for df_output in el_value['df_outputs']:
-                    ok_value = str(model.data[df_output]['initial_value'])
-                    res += "(" + df_output + "'=" + ok_value + ") & "
-                res = res[:-3] + ";"
-                commands.append(res)
-            else:
-                # if all inputs OK than all outputs OK
-                # OK = initial value
-                res = ""
-                for df_input in el_value['df_inputs']:
-                    ok_value = str(model.data[df_input]['initial_value'])
-                    res += "(" + df_input + "=" + ok_value + ") & "
-                res = res[:-3]
-                res += " -> "
-                for df_output in el_value['df_outputs']:
-                    ok_value = str(model.data[df_output]['initial_value'])
-                    res += "(" + df_output + "'=" + ok_value + ") & "
-                res = res[:-3] + ";"
-                commands.append(res)
-                # if one input is not OK than all outputs are not OK
-                # not OK = first value that do not equal to the inital value
-                res = ""
-                for df_input in el_value['df_inputs']:
-                    ok_value = model.data[df_input]['initial_value']
-                    res += "(" + df_input + "!=" + str(ok_value) + ") | "
-                res = res[:-3]
-                res += " -> "
-                for df_output in el_value['df_outputs']:
-                    ok_value = model.data[df_output]['initial_value']
-                    err_value = next((val for val in model.data[df_output]['values'] \
-                        if val != ok_value), ok_value)
-                    res += "(" + df_output + "'=" + str(err_value) + ") & "
-                res = res[:-3] + ";"
-                commands.append(res)
-        return commands
+    def __generate_data_declaration(d_name, d_range, init):
+        """@brief creates the declaration of a data variable, init = None without init"""
+        res = "\t" + d_name + " : [" + str(d_range[0]) + " .. " + str(d_range[1]) + "]"
+        if init is None:
+            return res + ";\n"
+        return res + " init " + str(init) + ";\n"
 
     @staticmethod
-    def __generate_ep_module(model, init_values=None):
-        """@brief creates cf prism module"""
-        res = "//Error propagation commands\n"
-        res += "module error_propagation\n"
-        for d_name, d_value in model.data.items():
-            res += "\t" + d_name + " : [0 .. " + str(PRISM.__get_maximum_value(model)) + "] init "
-            if init_values and d_name in init_values:
-                res += str(init_values[d_name]) + ";\n"
-            else:
-                res += str(d_value['initial_value']) + ";\n"
+    def __write_init_block(model, d_names, init_combinations, write, cf_module=True):
+        """@brief writes init block with an initial state for every combination of input values,
+        the states are tagged by the constant variable init_id"""
+        write("//Initial states of all input combinations\n")
+        write("init\n")
+        for i, init_values in enumerate(init_combinations):
+            state = ["cf=" + model.initial_element] if cf_module else []
+            state.append(PRISM.init_id + "=" + str(i))
+            for d_name in d_names:
+                state.append(d_name + "=" + \
+                    str(init_values.get(d_name, model.data[d_name]['initial_value'])))
+            write((" |\n\t" if i else "\t") + " & ".join(state))
+        write("\n")
+        write("endinit\n")
+
+    @staticmethod
+    def __write_ep_module(model, ranges, write, init_values=None, init_combinations=None):
+        """@brief writes ep prism module"""
+        write("//Error propagation commands\n")
+        write("module error_propagation\n")
+        PRISM.__write_data_declarations(model, model.data.keys(), ranges, write, \
+            init_values=init_values, init_combinations=init_combinations)
+        # default values are only needed by changed elements with default commands
+        default_values = []
         for el_name, el_value in model.elements.items():
             if el_value['sub_model']:
                 model.logger.warning('Sub-model of element \"' + el_name + \
@@ -192,28 +208,41 @@ class PRISM(object):
                 model.logger.warning('Repetitions of element \"' + el_name + \
                     '\" are ignored in the PRISM model.')
             if el_value['df_outputs']:
-                res += "\t//Element " + el_name
-                if el_value['df_inputs']:
-                    res += ", df inputs " + str(el_value['df_inputs'])
-                res += ", df outputs " + str(el_value['df_outputs']) + "\n"
-                if el_value['ep_prism_commands']:
-                    for epc in el_value['ep_prism_commands']:
-                        res += "\t[" + el_name + "] " + epc + "\t// <-- \n"
-                else:
-                    for command in PRISM.generate_default_ep_commands(model, el_name):
-                        res += "\t[" + el_name + "] " + command + "\n"
-        res += "endmodule\n"
-        return res
+                # default commands depend on the values of the data of the element
+                write(PRISM.__get_fragment(model, (el_name, 'ep'), PRISM.__get_content_key(\
+                    el_value['df_inputs'], el_value['df_outputs'], el_value['ep_prism_commands'], \
+                    [[model.data[d_name]['values'], model.data[d_name]['initial_value']] \
+                    for d_name in el_value['df_inputs'] + el_value['df_outputs']]), \
+                    PRISM.__generate_ep_fragment, model, el_name, default_values))
+        write("endmodule\n")
 
     @staticmethod
-    def __generate_time_reward(model):
-        """@brief creates rewards for failures and time"""
-        res = "//Time reward\n"
-        res += "rewards \"time\"\n"
+    def __generate_ep_fragment(model, el_name, default_values):
+        """@brief creates the commands of an element in the ep prism module,
+        default_values = get_default_values(model) or an empty list that is filled if needed"""
+        el_value = model.elements[el_name]
+        res = ["\t//Element " + el_name]
+        if el_value['df_inputs']:
+            res.append(", df inputs " + str(el_value['df_inputs']))
+        res.append(", df outputs " + str(el_value['df_outputs']) + "\n")
+        if el_value['ep_prism_commands']:
+            for epc in el_value['ep_prism_commands']:
+                res.append("\t[" + el_name + "] " + epc + "\t// <-- \n")
+        else:
+            if not default_values:
+                default_values.extend(PRISM.get_default_values(model))
+            for command in PRISM.generate_default_ep_commands(model, el_name, default_values):
+                res.append("\t[" + el_name + "] " + command + "\n")
+        return "".join(res)
+
+    @staticmethod
+    def __write_time_reward(model, write):
+        """@brief writes the time reward"""
+        write("//Time reward\n")
+        write("rewards \"time\"\n")
         for el_name, el_value in model.elements.items():
-            res += "\tcf=" + el_name + ":" + str(el_value['time'])+ ";\n"
-        res += "endrewards\n"
-        return res
+            write("\tcf=" + el_name + ":" + str(el_value['time']) + ";\n")
+        write("endrewards\n")
 
     @staticmethod
     def __generate_failure_formulas(model):
@@ -224,48 +253,80 @@ class PRISM(object):
         return res
 
     @staticmethod
-    def generate_prism_model(model, time_reward=False, ep_module=True, init_values=None):
-        """@brief creates prism model"""
-        res = "//Generated by ErrorPro\n"
-        res += "dtmc\n"
-        res += PRISM.__generate_elements_consts(model)
+    def write_prism_model(model, stream, time_reward=False, ep_module=True, init_values=None, \
+        init_combinations=None, minimal_ranges=True):
+        """@brief writes the prism model of generate_prism_model to a file object or buffer
+        in a single pass over the model"""
+        write = stream.write
+        write("//Generated by ErrorPro\n")
+        write("dtmc\n")
+        PRISM.__write_elements_consts(model, write)
         if ep_module:
-            res += PRISM.__generate_data_values_consts(model)
-        res += PRISM.__generate_cf_module(model)
+            values = PRISM.encode_string_values(model, minimal_ranges)
+            PRISM.__write_data_values_consts(values, write)
+        else:
+            init_combinations = None
+        PRISM.__write_cf_module(model, write, init_combinations=init_combinations)
         if ep_module:
-            res += PRISM.__generate_ep_module(model, init_values=init_values)
+            PRISM.__write_ep_module(model, PRISM.get_data_ranges(model, minimal_ranges, values), \
+                write, init_values=init_values, init_combinations=init_combinations)
+        if init_combinations:
+            PRISM.__write_init_block(model, model.data.keys(), init_combinations, write)
         if time_reward:
-            res += PRISM.__generate_time_reward(model)
-        return res
+            PRISM.__write_time_reward(model, write)
 
     @staticmethod
-    def generate_prism_model_for_repetitions(model, el_name, init_values=None):
-        """@brief creates prism model"""
-        res = "//Generated by ErrorPro\n"
-        res += "dtmc\n"
-        res += PRISM.__generate_data_values_consts(model)
-        res += "//Error propagation commands\n"
-        res += "module error_propagation\n"
-        d_ins = model.elements[el_name]['df_inputs']
-        d_outs = model.elements[el_name]['df_outputs']
-        d_ins_outs = set(d_ins + d_outs)
-        el_data = {d_name:d_value for d_name, d_value in model.data.items() if d_name in d_ins_outs}
-        for d_name, d_value in el_data.items():
-            res += "\t" + d_name + " : [0 .. " + str(PRISM.__get_maximum_value(model)) + "] init "
-            if init_values and d_name in init_values:
-                res += str(init_values[d_name]) + ";\n"
-            else:
-                res += str(d_value['initial_value']) + ";\n"
+    def generate_prism_model(model, time_reward=False, ep_module=True, init_values=None, \
+        init_combinations=None, minimal_ranges=True):
+        """@brief creates prism model, init_combinations = list of init_values
+        for a single model with all of them as initial states, minimal_ranges = every data
+        is declared with the range of its own values, otherwise with the range of all values
+        and the string values are encoded as in encode_string_values(model, False)"""
+        stream = io.StringIO()
+        PRISM.write_prism_model(model, stream, time_reward=time_reward, ep_module=ep_module, \
+            init_values=init_values, init_combinations=init_combinations, \
+            minimal_ranges=minimal_ranges)
+        return stream.getvalue()
+
+    @staticmethod
+    def write_prism_model_for_repetitions(model, el_name, stream, init_values=None, \
+        init_combinations=None, minimal_ranges=True):
+        """@brief writes the prism model of generate_prism_model_for_repetitions
+        to a file object or buffer"""
+        write = stream.write
+        write("//Generated by ErrorPro\n")
+        write("dtmc\n")
+        values = PRISM.encode_string_values(model, minimal_ranges)
+        PRISM.__write_data_values_consts(values, write)
+        write("//Error propagation commands\n")
+        write("module error_propagation\n")
         el_value = model.elements[el_name]
+        d_ins_outs = set(el_value['df_inputs'] + el_value['df_outputs'])
+        el_data = [d_name for d_name in model.data if d_name in d_ins_outs]
+        PRISM.__write_data_declarations(model, el_data, \
+            PRISM.get_data_ranges(model, minimal_ranges, values), write, \
+            init_values=init_values, init_combinations=init_combinations)
         if el_value['df_outputs']:
             if el_value['ep_prism_commands']:
                 for epc in el_value['ep_prism_commands']:
-                    res += "\t[] " + epc + "\t// <-- \n"
+                    write("\t[] " + epc + "\t// <-- \n")
             else:
                 for command in PRISM.generate_default_ep_commands(model, el_name):
-                    res += "\t[] " + command + "\n"
-        res += "endmodule\n"
-        return res
+                    write("\t[] " + command + "\n")
+        write("endmodule\n")
+        if init_combinations:
+            PRISM.__write_init_block(model, el_data, init_combinations, write, cf_module=False)
+
+    @staticmethod
+    def generate_prism_model_for_repetitions(model, el_name, init_values=None, \
+        init_combinations=None, minimal_ranges=True):
+        """@brief creates prism model, init_combinations = list of init_values
+        for a single model with all of them as initial states, minimal_ranges as in
+        generate_prism_model"""
+        stream = io.StringIO()
+        PRISM.write_prism_model_for_repetitions(model, el_name, stream, init_values=init_values, \
+            init_combinations=init_combinations, minimal_ranges=minimal_ranges)
+        return stream.getvalue()
 
     @staticmethod
     def silent_remove(filename):
@@ -276,13 +337,37 @@ class PRISM(object):
             if exception.errno != errno.ENOENT: # errno.ENOENT = no such file or directory
                 raise # re-raise exception if a different error occurred
 
-    def delete_temp_files(self):
-        """@brief removes temporary PRISM files"""
-        PRISM.silent_remove(self.prism_model_file)
-        PRISM.silent_remove(self.prism_properties_file)
-        PRISM.silent_remove(self.prism_results_file)
-        PRISM.silent_remove(self.prism_ss_tr_file)
-        PRISM.silent_remove(self.prism_states_file)
+    def make_run_dir(self):
+        """@brief creates a unique working directory for a single PRISM run"""
+        return tempfile.mkdtemp(prefix="errorpro_", dir=self.temp_dir)
+
+    @staticmethod
+    def delete_temp_files(run_dir):
+        """@brief removes the working directory of a PRISM run with all temporary files"""
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+    def get_prism_version(self):
+        """@brief returns the version string of PRISM, used in the cache keys"""
+        if self.__prism_version is None:
+            try:
+                self.__prism_version = subprocess.check_output(\
+                    [os.path.join(self.prism_dir, self.prism_executable), "-version"], \
+                    stderr=subprocess.STDOUT, timeout=self.timeout).decode('utf-8').strip()
+            except (OSError, subprocess.SubprocessError):
+                self.__prism_version = "unknown"
+        return self.__prism_version
+
+    def __get_cache_key(self, *parts):
+        """@brief cache key of a PRISM run"""
+        return self.cache.make_key(self.get_prism_version(), self.prism_options, *parts)
+
+    def __call_prism(self, call_list, run_dir):
+        """@brief calls the PRISM executable inside of the run directory"""
+        call_list = [os.path.join(self.prism_dir, self.prism_executable)] + call_list
+        if self.no_output:
+            subprocess.call(call_list, cwd=run_dir, stdout=subprocess.PIPE)
+        else:
+            subprocess.call(call_list, cwd=run_dir)
 
     @staticmethod
     def save(prism_model, file_name="model.pm"):
@@ -293,39 +378,64 @@ class PRISM(object):
 
     def run_prism(self, prism_model, properties, step_range=None):
         """@brief call PRISM model checker"""
-        old_dir = os.getcwd()
-        os.chdir(self.prism_dir)
-        #save prism model
-        self.delete_temp_files()
-        self.save(prism_model, file_name=self.prism_model_file)
-        model_file = open(self.prism_properties_file, 'w')
-        model_file.write(properties)
-        model_file.close()
-        if not step_range:
-            call_list = [self.prism_executable, \
-            self.prism_model_file, \
-            self.prism_properties_file, \
-            "-exportresults", self.prism_results_file, \
-            "-maxiters", '100000', \
-            "-timeout", str(self.timeout)]
-        else:
-            call_list = [self.prism_executable, \
-            self.prism_model_file, \
-            self.prism_properties_file, \
-            "-exportresults", str(self.prism_results_file+":csv,matrix"),\
-            "-const", "step="+step_range, \
-            "-maxiters", '100000', \
-            "-timeout", str(self.timeout)]
-        if self.no_output:
-            subprocess.call(call_list, stdout=subprocess.PIPE)
-        else:
-            subprocess.call(call_list)
-        res_file = open(self.prism_results_file, 'r')
-        results = [line.rstrip('\n') for line in res_file]
-        res_file.close()
-        os.chdir(old_dir)
+        if self.cache:
+            key = self.__get_cache_key("results", prism_model, properties, step_range)
+            results = self.cache.get(key)
+            if results is not None:
+                return results
+        run_dir = self.make_run_dir()
+        model_file = os.path.join(run_dir, self.prism_model_file)
+        properties_file = os.path.join(run_dir, self.prism_properties_file)
+        results_file = os.path.join(run_dir, self.prism_results_file)
+        try:
+            #save prism model
+            self.save(prism_model, file_name=model_file)
+            self.save(properties, file_name=properties_file)
+            if self.pool and not step_range:
+                # step ranges are not supported by the workers
+                self.pool.run({'cmd':'check', 'model':model_file, \
+                    'properties':properties_file, 'results':results_file, \
+                    'options':self.prism_options}, timeout=self.timeout)
+            else:
+                if not step_range:
+                    call_list = [model_file, \
+                    properties_file, \
+                    "-exportresults", results_file, \
+                    "-timeout", str(self.timeout)] + self.prism_options
+                else:
+                    call_list = [model_file, \
+                    properties_file, \
+                    "-exportresults", str(results_file+":csv,matrix"),\
+                    "-const", "step="+step_range, \
+                    "-timeout", str(self.timeout)] + self.prism_options
+                self.__call_prism(call_list, run_dir)
+            res_file = open(results_file, 'r')
+            results = [line.rstrip('\n') for line in res_file]
+            res_file.close()
+        finally:
+            self.delete_temp_files(run_dir)
+        if self.cache and PRISM.__is_numeric(PRISM.__get_result_values(results, step_range)):
+            self.cache.put(key, results)
         return results
 
+    @staticmethod
+    def __get_result_values(results, step_range=None):
+        """@brief returns the values of an exported results file, with a step_range the values
+        of the rows of the csv matrix format that start with a number"""
+        if not step_range:
+            return PRISM.parse_results(results)
+        rows = [line.split(',') for line in results]
+        return [value for row in rows if PRISM.__is_numeric(row[:1]) for value in row]
+
+    @staticmethod
+    def __is_numeric(values):
+        """@brief checks that there are values and all of them are numbers, errors of PRISM
+        are not cached"""
+        try:
+            return bool(values) and not any(math.isnan(float(value)) for value in values)
+        except (TypeError, ValueError):
+            return False
+
     def __check_prism_result(self, res, logger):
         """@brief checks that PRISM returns a number but not an error string"""
         try:
@@ -335,18 +445,58 @@ class PRISM(object):
             logger.error("Bad PRISM result: " + str(res))
             return 0
 
+    def __reduce(self, model, f_names):
+        """@brief returns the cone of influence of the failures if reduction is on,
+        with reset dead data if dead_data_reset is on"""
+        if self.reduction:
+            try:
+                model = epl_reduction.Reduction.reduce(model, f_names)
+            except epl_parser.ParseError as exception:
+                model.logger.warning('Cone of influence is not computed: ' + str(exception))
+        if self.dead_data_reset:
+            try:
+                live = set()
+                for f_name in f_names:
+                    live |= epl_parser.Parser.get_names(\
+                        epl_parser.Parser.parse_prism_expression(model.failures[f_name]))
+                model = epl_reduction.Reduction.reset_dead_data(model, live & set(model.data))
+            except epl_parser.ParseError as exception:
+                model.logger.warning('Dead data are not reset: ' + str(exception))
+        return model
+
     def compute_execution_time(self, model):
         """@brief computes MTTF"""
         model.logger.message('Computing execution time ... ')
+        if self.fast_execution_time:
+            try:
+                return epl_engine.Engine.compute_execution_time(model)
+            except (epl_parser.ParseError, epl_engine.EngineError, ImportError) as exception:
+                # ImportError: scipy of the in-process computation is not installed
+                model.logger.message('Execution time is computed with PRISM: ' + str(exception))
         prism_model = self.generate_prism_model(model, time_reward=True, ep_module=False)
         properties = "R{\"time\"}=? [ C ]"
         prism_res = self.run_prism(prism_model, properties)
         res = self.__check_prism_result(prism_res[1], model.logger)
         return res
 
+    def __log_estimate(self, model, name, estimate):
+        """@brief reports the confidence interval of a simulated estimate"""
+        model.logger.message(name + ' = ' + str(estimate['value']) + ', ' + \
+            str(self.simulator.confidence) + ' confidence interval [' + \
+            str(estimate['lower']) + ', ' + str(estimate['upper']) + '], ' + \
+            str(estimate['samples']) + ' samples')
+        return estimate['value']
+
     def compute_P_single(self, model, f_name, show_plot=True):
         """@brief computes MTTF"""
+        model = self.__reduce(model, [f_name])
+        if self.engine == "simulation":
+            return self.__log_estimate(model, 'P', \
+                self.simulator.estimate_P_single(model, f_name))
         model.logger.message('Computing P for ' + f_name + ' ... ')
+        reachability = self.__compute_reachability(model, f_name)
+        if reachability:
+            return reachability[0]
         prism_model = self.generate_prism_model(model, time_reward=False)
         prism_model += "//Failure formulas\n"
         f_value = model.failures[f_name]
@@ -358,7 +508,14 @@ class PRISM(object):
 
     def compute_MTTF(self, model, f_name, show_plot=True):
         """@brief computes MTTF"""
+        model = self.__reduce(model, [f_name])
+        if self.engine == "simulation":
+            return self.__log_estimate(model, 'MTTF', \
+                self.simulator.estimate_MTTF(model, f_name))
         model.logger.message('Computing MTTF for ' + f_name + ' ... ')
+        reachability = self.__compute_reachability(model, f_name)
+        if reachability:
+            return reachability[1]
         prism_model = self.generate_prism_model(model, time_reward=True)
         prism_model += "//Failure formulas\n"
         f_value = model.failures[f_name]
@@ -368,25 +525,80 @@ class PRISM(object):
         res = self.__check_prism_result(prism_res[1], model.logger)
         return res
 
+    def __compute_reachability(self, model, f_name):
+        """@brief computes [P, MTTF] from the initial state in-process if engine is "python",
+        None otherwise"""
+        if self.engine != "python":
+            return None
+        try:
+            return epl_engine.Engine.compute_reachability(model, f_name, self.solver, \
+                init_combinations=[{}]).lookup()
+        except (epl_parser.ParseError, epl_engine.EngineError, \
+            epl_solver.SolverError) as exception:
+            model.logger.warning('P and MTTF of \"' + f_name + \
+                '\" are computed with PRISM: ' + str(exception))
+            return None
+
+    def compute_reachability_table(self, model, f_name, init_combinations=None):
+        """@brief computes P and MTTF of the failure in-process for all init_values at once,
+        returns an epl_engine.ReachabilityTable, table.lookup(init_values) = [P, MTTF]"""
+        model = self.__reduce(model, [f_name])
+        model.logger.message('Computing P and MTTF for ' + f_name + ' from all initial states ... ')
+        return epl_engine.Engine.compute_reachability(model, f_name, self.solver, \
+            init_combinations=init_combinations)
+
+    @staticmethod
+    def parse_step_range(step_range):
+        """@brief returns the steps of a PRISM range "start:step:end", "start:end", or "step" """
+        bounds = [int(bound) for bound in step_range.split(':')]
+        if len(bounds) == 1:
+            return bounds
+        if len(bounds) == 2:
+            bounds.insert(1, 1)
+        return list(range(bounds[0], bounds[2] + 1, bounds[1]))
+
+    def __compute_time_series(self, model, f_name, step_range):
+        """@brief computes a time series in-process if engine is "python", None otherwise"""
+        if self.engine != "python":
+            return None
+        try:
+            steps = PRISM.parse_step_range(step_range)
+            series = epl_engine.Engine.compute_time_series(model, f_name, steps)
+        except (ValueError, epl_parser.ParseError, epl_engine.EngineError) as exception:
+            model.logger.warning('Time series of \"' + f_name + \
+                '\" is computed with PRISM: ' + str(exception))
+            return None
+        series['steps'] = [float(step) for step in steps]
+        return series
+
     def compute_P(self, model, f_name, show_plot=True, step_range="0:10:100"):
         """@brief computes probability over time"""
+        model = self.__reduce(model, [f_name])
         model.logger.message('Computing P for ' + f_name + ' ... ')
-        prism_model = self.generate_prism_model(model, time_reward=True)
-        prism_model += "//Failure formulas\n"
         f_value = model.failures[f_name]
-        prism_model += "formula " + f_name + " = " + f_value + ";\n"
-        prism_model += "//Step number for properties\n"
-        prism_model += "const int step;\n"
-        properties = "P=? [ F<=step " + f_name + "]\n" + "R{\"time\"}=? [  C<=step ]"
-        prism_res = self.run_prism(prism_model, properties, step_range=step_range)
-        steps = [self.__check_prism_result(step, model.logger) \
-            for step in prism_res[2].split(',')]
-        times = [self.__check_prism_result(time, model.logger) \
-            for time in prism_res[8].split(',')]
-        probs = [self.__check_prism_result(prob, model.logger) \
-            for prob in prism_res[3].split(',')]
+        if self.engine == "simulation":
+            series = self.simulator.estimate_P(model, f_name, PRISM.parse_step_range(step_range))
+        else:
+            series = self.__compute_time_series(model, f_name, step_range)
+        if series:
+            steps, times, probs = series['steps'], series['time'], series['P']
+        else:
+            prism_model = self.generate_prism_model(model, time_reward=True)
+            prism_model += "//Failure formulas\n"
+            prism_model += "formula " + f_name + " = " + f_value + ";\n"
+            prism_model += "//Step number for properties\n"
+            prism_model += "const int step;\n"
+            properties = "P=? [ F<=step " + f_name + "]\n" + "R{\"time\"}=? [  C<=step ]"
+            prism_res = self.run_prism(prism_model, properties, step_range=step_range)
+            steps = [self.__check_prism_result(step, model.logger) \
+                for step in prism_res[2].split(',')]
+            times = [self.__check_prism_result(time, model.logger) \
+                for time in prism_res[8].split(',')]
+            probs = [self.__check_prism_result(prob, model.logger) \
+                for prob in prism_res[3].split(',')]
         res = {'steps':steps, 'time':times, 'P':probs}
         if show_plot:
+            plt = _get_pyplot()
             plt.figure()
             plt.plot(times, probs, "bo-")
             plt.xlabel('Time (s)')
@@ -398,27 +610,33 @@ class PRISM(object):
 
     def compute_N_failures(self, model, f_name, show_plot=True, step_range="0:10:100"):
         """@brief computes probability over time"""
+        model = self.__reduce(model, [f_name])
         model.logger.message('Computing N for ' + f_name + ' ... ')
-        prism_model = self.generate_prism_model(model, time_reward=True)
-        prism_model += "//Failure formulas\n"
         f_value = model.failures[f_name]
-        prism_model += "formula " + f_name + " = " + f_value + ";\n"
-        prism_model += "//Failure reward\n"
-        prism_model += "rewards \"Failure\"\n"
-        prism_model += "\t" + f_name + ":1;\n"
-        prism_model += "endrewards\n"
-        prism_model += "//Step number for properties\n"
-        prism_model += "const int step;\n"
-        properties = "R{\"Failure\"}=? [ C<=step ]\n" + "R{\"time\"}=? [  C<=step ]"
-        prism_res = self.run_prism(prism_model, properties, step_range=step_range)
-        steps = [self.__check_prism_result(step, model.logger) \
-            for step in prism_res[2].split(',')]
-        times = [self.__check_prism_result(time, model.logger) \
-            for time in prism_res[8].split(',')]
-        n_failures = [self.__check_prism_result(n_failure, model.logger) \
-            for n_failure in prism_res[3].split(',')]
+        series = self.__compute_time_series(model, f_name, step_range)
+        if series:
+            steps, times, n_failures = series['steps'], series['time'], series['N_failures']
+        else:
+            prism_model = self.generate_prism_model(model, time_reward=True)
+            prism_model += "//Failure formulas\n"
+            prism_model += "formula " + f_name + " = " + f_value + ";\n"
+            prism_model += "//Failure reward\n"
+            prism_model += "rewards \"Failure\"\n"
+            prism_model += "\t" + f_name + ":1;\n"
+            prism_model += "endrewards\n"
+            prism_model += "//Step number for properties\n"
+            prism_model += "const int step;\n"
+            properties = "R{\"Failure\"}=? [ C<=step ]\n" + "R{\"time\"}=? [  C<=step ]"
+            prism_res = self.run_prism(prism_model, properties, step_range=step_range)
+            steps = [self.__check_prism_result(step, model.logger) \
+                for step in prism_res[2].split(',')]
+            times = [self.__check_prism_result(time, model.logger) \
+                for time in prism_res[8].split(',')]
+            n_failures = [self.__check_prism_result(n_failure, model.logger) \
+                for n_failure in prism_res[3].split(',')]
         res = {'steps':steps, 'time':times, 'P':n_failures}
         if show_plot:
+            plt = _get_pyplot()
             plt.figure()
             plt.plot(times, n_failures, "bo-")
             plt.xlabel('Time (s)')
@@ -430,28 +648,35 @@ class PRISM(object):
 
     def compute_downtime(self, model, f_name, show_plot=True, step_range="0:10:100"):
         """@brief computes downtime"""
+        model = self.__reduce(model, [f_name])
         model.logger.message('Computing downtime for ' + f_name + ' ... ')
-        prism_model = self.generate_prism_model(model, time_reward=True)
-        prism_model += "//Failure formulas\n"
         f_value = model.failures[f_name]
-        prism_model += "formula " + f_name + " = " + f_value + ";\n"
-        prism_model += "//Down time rewards\n"
-        prism_model += "rewards \"downtime\"\n"
-        for el_name, el_value in model.elements.items():
-            prism_model += "\t" + f_name +" & cf=" + el_name + ":" + str(el_value['time'])+ ";\n"
-        prism_model += "endrewards\n"
-        prism_model += "//Step number for properties\n"
-        prism_model += "const int step;\n"
-        properties = "R{\"downtime\"}=? [ C<=step ]\n" + "R{\"time\"}=? [ C<=step ]"
-        prism_res = self.run_prism(prism_model, properties, step_range=step_range)
-        steps = [self.__check_prism_result(step, model.logger) \
-            for step in prism_res[2].split(',')]
-        times = [self.__check_prism_result(time, model.logger) \
-            for time in prism_res[8].split(',')]
-        dtimes = [self.__check_prism_result(dtime, model.logger) \
-            for dtime in prism_res[3].split(',')]
+        series = self.__compute_time_series(model, f_name, step_range)
+        if series:
+            steps, times, dtimes = series['steps'], series['time'], series['downtime']
+        else:
+            prism_model = self.generate_prism_model(model, time_reward=True)
+            prism_model += "//Failure formulas\n"
+            prism_model += "formula " + f_name + " = " + f_value + ";\n"
+            prism_model += "//Down time rewards\n"
+            prism_model += "rewards \"downtime\"\n"
+            for el_name, el_value in model.elements.items():
+                prism_model += "\t" + f_name +" & cf=" + el_name + ":" + \
+                    str(el_value['time']) + ";\n"
+            prism_model += "endrewards\n"
+            prism_model += "//Step number for properties\n"
+            prism_model += "const int step;\n"
+            properties = "R{\"downtime\"}=? [ C<=step ]\n" + "R{\"time\"}=? [ C<=step ]"
+            prism_res = self.run_prism(prism_model, properties, step_range=step_range)
+            steps = [self.__check_prism_result(step, model.logger) \
+                for step in prism_res[2].split(',')]
+            times = [self.__check_prism_result(time, model.logger) \
+                for time in prism_res[8].split(',')]
+            dtimes = [self.__check_prism_result(dtime, model.logger) \
+                for dtime in prism_res[3].split(',')]
         res = {'steps':steps, 'time':times, 'downtime':dtimes}
         if show_plot:
+            plt = _get_pyplot()
             plt.figure()
             plt.plot(times, dtimes, "bo-")
             plt.xlabel('Time (s)')
@@ -461,42 +686,103 @@ class PRISM(object):
             plt.show()
         return res
 
-    def __run_prism_ss_tr(self, prism_model, tr=None, logger=None):
-        """@brief Computes steady states"""
-        old_dir = os.getcwd()
-        os.chdir(self.prism_dir)
-        #save prism model
-        self.delete_temp_files()
-        self.save(prism_model, file_name=self.prism_model_file)
-        if tr:
-            call_list = [self.prism_executable, \
-            self.prism_model_file, \
-            "-tr", str(tr), \
-            "-exporttr", self.prism_ss_tr_file, \
-            "-exportstates", self.prism_states_file, \
-            "-maxiters", '100000', \
-            "-timeout", str(self.timeout)]
-        else:
-            call_list = [self.prism_executable, \
-            self.prism_model_file, \
-            "-ss", "-exportss", self.prism_ss_tr_file, \
-            "-exportstates", self.prism_states_file, \
-            "-maxiters", '100000', \
-            "-timeout", str(self.timeout)]
-        if self.no_output:
-            subprocess.call(call_list, stdout=subprocess.PIPE)
-        else:
-            subprocess.call(call_list)
-        #read probabilities
-        ss_tr_file = open(self.prism_ss_tr_file, 'r')
-        # the nex line is beacuse of different outputs for ss and tr states of PRISM
-        probs = [float(line.rstrip('\n').split('=')[-1]) for line in ss_tr_file]
-        ss_tr_file.close()
-        #read states
-        states_file = open(self.prism_states_file)
-        state_lines = [line.rstrip('\n') for line in states_file]
-        states_file.close()
-        os.chdir(old_dir)
+    # properties of the batch evaluation, %s = failure name, step = bound of the transient ones
+    failure_properties = {'P':"P=? [ F %s ]", \
+        'MTTF':"R{\"time\"}=? [ F %s ]", \
+        'P_steps':"P=? [ F<=step %s ]", \
+        'N_failures':"R{\"%s_failures\"}=? [ C<=step ]", \
+        'downtime':"R{\"%s_downtime\"}=? [ C<=step ]"}
+
+    @staticmethod
+    def __generate_failure_rewards(model, f_names):
+        """@brief creates rewards for the number of failures and downtime of every failure"""
+        res = "//Failure and downtime rewards\n"
+        for f_name in f_names:
+            res += "rewards \"" + f_name + "_failures\"\n"
+            res += "\t" + f_name + ":1;\n"
+            res += "endrewards\n"
+            res += "rewards \"" + f_name + "_downtime\"\n"
+            for el_name, el_value in model.elements.items():
+                res += "\t" + f_name +" & cf=" + el_name + ":" + str(el_value['time'])+ ";\n"
+            res += "endrewards\n"
+        return res
+
+    @staticmethod
+    def parse_results(results):
+        """@brief returns the results of all properties of an exported PRISM results file"""
+        return [results[i + 1] for i, line in enumerate(results[:-1]) if line == "Result"]
+
+    def compute_failures(self, model, f_names=None, metrics=('P', 'MTTF'), steps=100):
+        """@brief computes metrics of all failures (f_names=None) in a single PRISM run,
+        metrics from failure_properties, returns {failure name:{metric:value}}"""
+        if f_names is None:
+            f_names = list(model.failures.keys())
+        model = self.__reduce(model, f_names)
+        model.logger.message('Computing ' + ", ".join(metrics) + ' for ' + \
+            str(len(f_names)) + ' failures ... ')
+        prism_model = self.generate_prism_model(model, time_reward=True)
+        prism_model += PRISM.__generate_failure_formulas(model)
+        if 'N_failures' in metrics or 'downtime' in metrics:
+            prism_model += PRISM.__generate_failure_rewards(model, f_names)
+        if 'P_steps' in metrics or 'N_failures' in metrics or 'downtime' in metrics:
+            prism_model += "//Step number for properties\n"
+            prism_model += "const int step=" + str(steps) + ";\n"
+        properties = [PRISM.failure_properties[metric] % f_name \
+            for f_name in f_names for metric in metrics]
+        prism_res = PRISM.parse_results(self.run_prism(prism_model, "\n".join(properties)))
+        if len(prism_res) != len(properties):
+            model.logger.error("Bad PRISM results: " + str(len(prism_res)) + " of " + \
+                str(len(properties)) + " properties")
+            prism_res += ["None"] * (len(properties) - len(prism_res))
+        res = {}
+        for i, f_name in enumerate(f_names):
+            res[f_name] = {metric:self.__check_prism_result(prism_res[i * len(metrics) + j], \
+                model.logger) for j, metric in enumerate(metrics)}
+        return res
+
+    def run_prism_ss_tr(self, prism_model, tr=None):
+        """@brief call PRISM for steady states (tr=None)
+        or transient probabilities after tr steps"""
+        run_dir = self.make_run_dir()
+        model_file = os.path.join(run_dir, self.prism_model_file)
+        ss_tr_file_name = os.path.join(run_dir, self.prism_ss_tr_file)
+        states_file_name = os.path.join(run_dir, self.prism_states_file)
+        try:
+            #save prism model
+            self.save(prism_model, file_name=model_file)
+            if self.pool:
+                self.pool.run({'cmd':'ss_tr', 'model':model_file, 'tr':tr, \
+                    'ss_tr':ss_tr_file_name, 'states':states_file_name, \
+                    'options':self.prism_options}, timeout=self.timeout)
+            else:
+                if tr:
+                    call_list = [model_file, \
+                    "-tr", str(tr), \
+                    "-exporttr", ss_tr_file_name, \
+                    "-exportstates", states_file_name, \
+                    "-timeout", str(self.timeout)] + self.prism_options
+                else:
+                    call_list = [model_file, \
+                    "-ss", "-exportss", ss_tr_file_name, \
+                    "-exportstates", states_file_name, \
+                    "-timeout", str(self.timeout)] + self.prism_options
+                self.__call_prism(call_list, run_dir)
+            #read probabilities
+            ss_tr_file = open(ss_tr_file_name, 'r')
+            # the nex line is beacuse of different outputs for ss and tr states of PRISM
+            probs = [float(line.rstrip('\n').split('=')[-1]) for line in ss_tr_file]
+            ss_tr_file.close()
+            #read states
+            states_file = open(states_file_name)
+            state_lines = [line.rstrip('\n') for line in states_file]
+            states_file.close()
+        finally:
+            self.delete_temp_files(run_dir)
+        return [probs, state_lines]
+
+    @staticmethod
+    def __correct_probabilities(probs, logger=None):
+        """@brief corrects computed probabilities that do not sum up to 1"""
         probs_sum = sum(probs)
         if probs_sum < 1.0:
             non_zero_probs = [prob for prob in probs if prob > 0]
@@ -508,164 +794,291 @@ class PRISM(object):
                 if value > 0:
                     probs[index] = probs[index] + 1.0 - probs_sum
                     break
-        return [probs, state_lines]
+        return probs
 
-    def __generate_ep_prism_command_repetitions(self, model, el_name, init_values):
-        """@brief Computes steady states"""
-        ep_prism_command = ""
-        the_element = model.elements[el_name]
-        if the_element['df_outputs']:
-            if the_element['df_inputs']:
-                for df_input, value in init_values.items():
-                    model.data[df_input]['init'] = value
-                    ep_prism_command += "(" + df_input + "=" + str(value) + ") & "
-                ep_prism_command = ep_prism_command[:-3] + " -> "
-            else:
-                ep_prism_command += "(true) -> "
-
-            prism_model = PRISM.generate_prism_model_for_repetitions(model, \
-                el_name, init_values=init_values)
-            [tr_probs, state_lines] = self.__run_prism_ss_tr(prism_model, \
-                tr=the_element['repetitions'], logger=model.logger)
-            #get vector of data names
-            d_names = state_lines[0][1:-1].split(',')
-            #get steady states with >0 probabilities
-            states = [state.split(':')[1][1:-1].split(',') \
-                for i, state in enumerate(state_lines) if i > 0]
-            #aggregate for the df outputs only
-            reduced_states = [[s_val for (d_name, s_val) in\
-                zip(d_names, state) if d_name in the_element['df_outputs']]\
-                for state in states]
-            #reduce data names vector for the df outputs only
-            reduced_d_names = [d_name for d_name in d_names if d_name in the_element['df_outputs']]
-            if not reduced_d_names:
-                model.logger.error(\
-                    "Something went wrong! reduced_d_names empty in __generate_ep_prism_command_repetitions")
-            tr_states = {}
-            for (i, r_state) in enumerate(reduced_states):
-                if tr_probs[i] > 0:
-                    if ",".join(r_state) in tr_states:
-                        tr_states[",".join(r_state)] += tr_probs[i]
-                    else:
-                        tr_states[",".join(r_state)] = tr_probs[i]
-            values_names = PRISM.encode_string_values(model)
-            for state, prob in tr_states.items():
-                if not state.split(','):
-                    model.logger.error("\
-                        Something went wrong! state empty in __generate_ep_prism_command_repetitions")
-                ep_prism_command += str(prob) + ":"
-                for (d_name, s_val) in zip(reduced_d_names, state.split(',')):
-                    if int(s_val) in values_names:
-                        val = values_names[int(s_val)]
-                    else:
-                        val = s_val
-                    ep_prism_command += "(" + d_name + "'=" + val + ") & "
-                ep_prism_command = ep_prism_command[:-3] + " + "
-            ep_prism_command = ep_prism_command[:-3] + ";"
-        return ep_prism_command
-
-    def __generate_ep_prism_command_sub_model(self, model, host_element, init_values):
-        """@brief Computes steady states"""
-        ep_prism_command = ""
-        if host_element['df_outputs']:
-            if host_element['df_inputs']:
-                for df_input, value in init_values.items():
-                    model.data[df_input]['init'] = value
-                    ep_prism_command += "(" + df_input + "=" + str(value) + ") & "
-                ep_prism_command = ep_prism_command[:-3] + " -> "
-            else:
-                ep_prism_command += "(true) -> "
-            prism_model = PRISM.generate_prism_model(model, init_values=init_values)
-            [ss_probs, state_lines] = self.__run_prism_ss_tr(prism_model, logger=model.logger)
-            #get vector of data names
-            d_names = state_lines[0][1:-1].split(',')
-            #get steady states with >0 probabilities
-            states = [state.split(':')[1][1:-1].split(',') \
-                for i, state in enumerate(state_lines) if i > 0]
-            #aggregate for the df outputs only
-            reduced_states = [[s_val for (d_name, s_val) in\
-                zip(d_names, state) if d_name in host_element['df_outputs']]\
-                for state in states]
-            #reduce data names vector for the df outputs only
-            reduced_d_names = [d_name for d_name in d_names if d_name in host_element['df_outputs']]
-            steady_states = {}
-            for (i, r_state) in enumerate(reduced_states):
-                if ss_probs[i] > 0:
-                    if ",".join(r_state) in steady_states:
-                        steady_states[",".join(r_state)] += ss_probs[i]
-                    else:
-                        steady_states[",".join(r_state)] = ss_probs[i]
-            values_names = PRISM.encode_string_values(model)
-            for state, prob in steady_states.items():
-                ep_prism_command += str(prob) + ":"
-                for (d_name, s_val) in zip(reduced_d_names, state.split(',')):
-                    if int(s_val) in values_names:
-                        val = values_names[int(s_val)]
-                    else:
-                        val = s_val
-                    ep_prism_command += "(" + d_name + "'=" + val + ") & "
-                ep_prism_command = ep_prism_command[:-3] + " + "
-            ep_prism_command = ep_prism_command[:-3] + ";"
-        return ep_prism_command
-
-    def compute_repetitions(self, model, el_name):
-        """@brief Computes repetitions for the elements"""
-        # generate and return prism commands for the element
-        ep_prism_commands = []
-        the_element = model.elements[el_name]
+    def __run_prism_ss_tr_all(self, prism_models, tr=None, jobs=1):
+        """@brief Computes steady states of several models, in a pool of jobs processes"""
+        results = [None] * len(prism_models)
+        keys = [None] * len(prism_models)
+        if self.cache:
+            for i, prism_model in enumerate(prism_models):
+                keys[i] = self.__get_cache_key("ss_tr", prism_model, tr)
+                results[i] = self.cache.get(keys[i])
+        missing = [i for i, result in enumerate(results) if result is None]
+        if jobs > 1 and len(missing) > 1:
+            # the workers of the pool are processes already, threads only feed them
+            executor_class = concurrent.futures.ThreadPoolExecutor if self.pool \
+                else concurrent.futures.ProcessPoolExecutor
+            with executor_class(max_workers=jobs) as executor:
+                # map keeps the order of the models
+                computed = list(executor.map(functools.partial(_run_prism_ss_tr_job, \
+                    self, tr=tr), [prism_models[i] for i in missing]))
+        else:
+            computed = [self.run_prism_ss_tr(prism_models[i], tr=tr) for i in missing]
+        for i, result in zip(missing, computed):
+            results[i] = result
+            if self.cache and result and PRISM.__is_numeric(result[0]):
+                self.cache.put(keys[i], result)
+        return results
+
+    @staticmethod
+    def __split_combinations(probs, state_lines, n_combinations):
+        """@brief splits the results of a single run over all input combinations"""
+        id_index = state_lines[0][1:-1].split(',').index(PRISM.init_id)
+        results = [[[], [state_lines[0]]] for _ in range(n_combinations)]
+        for prob, state_line in zip(probs, state_lines[1:]):
+            init_id = int(state_line.split(':')[1][1:-1].split(',')[id_index])
+            # PRISM starts from the uniform distribution over the initial states
+            results[init_id][0].append(prob * n_combinations)
+            results[init_id][1].append(state_line)
+        return results
+
+    def __compute_ep_prism_commands(self, model, the_element, generate, tr=None, jobs=1, \
+        what='sub model', solve=None):
+        """@brief Computes ep commands of an element for all combinations of df input values,
+        generate(init_values=...) or generate(init_combinations=[...]) creates the prism model,
+        solve(combinations) computes [probs, state_lines] of all combinations without PRISM"""
+        if not the_element['df_outputs']:
+            return []
         #get lists of all df input values
         values_vectors = [model.data[df_input]['values'] \
             for df_input in the_element['df_inputs']]
-        #prepare models for all possible combinations of input values
-        for init_values_vector in itertools.product(*values_vectors):
-            init_values = dict(zip(the_element['df_inputs'], init_values_vector))
-            #compute and generate prism commands
-            model.logger.message('Computing repetitions with inputs: ' + str(init_values))
-            ep_prism_command = self.__generate_ep_prism_command_repetitions(model, \
-                el_name, init_values)
-            if ep_prism_command:
-                ep_prism_commands.append(ep_prism_command)
-        return ep_prism_commands
-
-    def compute_sub_models_and_repetitions(self, model, host_element=None):
-        """@brief Computes nested models up to the top level"""
-        # recursively ensure that all composite elements are computed
+        combinations = [dict(zip(the_element['df_inputs'], init_values_vector)) \
+            for init_values_vector in itertools.product(*values_vectors)]
+        guards = [PRISM.__generate_ep_prism_command_guard(model, the_element, init_values) \
+            for init_values in combinations]
+        if solve:
+            model.logger.message('Computing ' + what + ' with ' + str(len(combinations)) + \
+                ' input combinations in-process')
+            results = solve(combinations)
+        elif self.single_run and len(combinations) > 1:
+            model.logger.message('Computing ' + what + ' with ' + str(len(combinations)) + \
+                ' input combinations in a single PRISM run')
+            prism_model = generate(init_combinations=combinations)
+            [probs, state_lines] = self.__run_prism_ss_tr_all([prism_model], tr=tr)[0]
+            results = PRISM.__split_combinations(probs, state_lines, len(combinations))
+        else:
+            #prepare models for all possible combinations of input values
+            prism_models = []
+            for init_values in combinations:
+                model.logger.message('Computing ' + what + ' with inputs: ' + str(init_values))
+                prism_models.append(generate(init_values=init_values))
+            results = self.__run_prism_ss_tr_all(prism_models, tr=tr, jobs=jobs)
+        #generate prism commands
+        return [guard + PRISM.__generate_ep_prism_command_updates(model, the_element, \
+            PRISM.__correct_probabilities(probs, model.logger), state_lines) \
+            for guard, [probs, state_lines] in zip(guards, results)]
+
+    @staticmethod
+    def __generate_ep_prism_command_guard(model, the_element, init_values):
+        """@brief generates the guard of an ep command for a combination of input values"""
+        if not the_element['df_inputs']:
+            return "(true) -> "
+        guard = []
+        for df_input, value in init_values.items():
+            model.data[df_input]['init'] = value
+            guard.append("(" + df_input + "=" + str(value) + ")")
+        return " & ".join(guard) + " -> "
+
+    @staticmethod
+    def __generate_ep_prism_command_updates(model, the_element, probs, state_lines):
+        """@brief aggregates probabilities of PRISM states over df outputs to ep updates"""
+        #get vector of data names
+        d_names = state_lines[0][1:-1].split(',')
+        #get states with >0 probabilities
+        states = [state.split(':')[1][1:-1].split(',') \
+            for i, state in enumerate(state_lines) if i > 0]
+        #reduce data names vector for the df outputs only
+        reduced_d_names = [d_name for d_name in d_names if d_name in the_element['df_outputs']]
+        if not reduced_d_names:
+            model.logger.error("Something went wrong! reduced_d_names empty in " + \
+                "__generate_ep_prism_command_updates")
+        #aggregate for the df outputs only
+        out_states = {}
+        for (i, state) in enumerate(states):
+            if probs[i] > 0:
+                r_state = ",".join([s_val for (d_name, s_val) in \
+                    zip(d_names, state) if d_name in the_element['df_outputs']])
+                if r_state in out_states:
+                    out_states[r_state] += probs[i]
+                else:
+                    out_states[r_state] = probs[i]
+        values_names = PRISM.encode_string_values(model)
+        updates = []
+        for state, prob in out_states.items():
+            assignments = []
+            for (d_name, s_val) in zip(reduced_d_names, state.split(',')):
+                if int(s_val) in values_names:
+                    val = values_names[int(s_val)]
+                else:
+                    val = s_val
+                assignments.append("(" + d_name + "'=" + val + ")")
+            updates.append(str(prob) + ":" + " & ".join(assignments))
+        return " + ".join(updates) + ";"
+
+    def compute_repetitions(self, model, el_name, jobs=1):
+        """@brief Computes repetitions for the elements"""
+        if self.engine == "python":
+            try:
+                return self.__compute_ep_prism_commands(model, model.elements[el_name], None, \
+                    what='repetitions', solve=functools.partial(\
+                    epl_engine.Engine.compute_repetitions, model, el_name))
+            except (epl_parser.ParseError, epl_engine.EngineError) as exception:
+                model.logger.warning('Repetitions of element \"' + el_name + \
+                    '\" are computed with PRISM: ' + str(exception))
+        # generate and return prism commands for the element
+        return self.__compute_ep_prism_commands(model, model.elements[el_name], \
+            functools.partial(PRISM.generate_prism_model_for_repetitions, model, el_name), \
+            tr=model.elements[el_name]['repetitions'], jobs=jobs, what='repetitions')
+
+    def compute_sub_models_and_repetitions(self, model, host_element=None, jobs=1):
+        """@brief Computes nested models up to the top level in place, see also flatten"""
+        flat_model = self.flatten(model, jobs=jobs)
+        if host_element:
+            return self.__compute_host_ep_prism_commands(flat_model, host_element, jobs)
+        for el_name, el_value in flat_model.elements.items():
+            if model.elements[el_name]['sub_model'] or \
+                model.elements[el_name]['repetitions'] > 1:
+                for key in ['sub_model', 'repetitions', 'time', 'ep_prism_commands']:
+                    model.elements[el_name][key] = el_value[key]
+                model.touch(el_name)
+        return model
+
+    def flatten(self, model, jobs=1):
+        """@brief returns a flat copy of a hierarchical model, the model itself is not changed,
+        computed sub models and repetitions are memorized in model.abstractions"""
+        return self.__flatten(model, jobs, {})
+
+    def __flatten(self, model, jobs, abstractions):
+        """@brief flattens a model, abstractions = {structural hash:computed sub model}"""
+        flat_model = model.copy()
+        # the copy is not a sub model, its changes are not propagated
+        flat_model.host = None
         for el_name, el_value in model.elements.items():
+            flat_element = flat_model.elements[el_name]
             if el_value['sub_model']:
                 # generate prism commands istead of sub model
                 model.logger.message('Computing sub model of element \"' + el_name + '\" ... ')
-                model.elements[el_name]['ep_prism_commands'] = \
-                    self.compute_sub_models_and_repetitions(\
-                    el_value['sub_model'], el_value)
-                # compute execution time of the compund element
-                time = self.compute_execution_time(el_value['sub_model'])
-                model.elements[el_name]['sub_model'] = None
-                model.elements[el_name]['time'] = time
+                ep_prism_commands, time = self.__abstract_sub_model(model, el_name, \
+                    jobs, abstractions)
+                flat_element['ep_prism_commands'] = ep_prism_commands
+                flat_element['sub_model'] = None
+                flat_element['time'] = time
                 model.logger.message('Computing sub model of element \"' + el_name + '\" finished ')
             if el_value['repetitions'] > 1:
                 # generate prism commands istead of repetitions
                 model.logger.message('Computing repetitions of element \"' + el_name + '\" ... ')
-                model.elements[el_name]['ep_prism_commands'] = self.compute_repetitions(\
-                    model, el_name)
-                # compute execution time of the compund element
-                model.elements[el_name]['time'] *= model.elements[el_name]['repetitions']
-                model.elements[el_name]['repetitions'] = 1
-                model.logger.message('Computing repetitions of element \"' + el_name + '\" finished ')
-        # return top level flat prism model
-        if not host_element:
-            return model
-        # generate and return prism commands for the host element
-        ep_prism_commands = []
-        #get lists of all df input values
-        values_vectors = [model.data[df_input]['values'] \
-            for df_input in host_element['df_inputs']]
-        #prepare models for all possible combinations of input values
-        for init_values_vector in itertools.product(*values_vectors):
-            init_values = dict(zip(host_element['df_inputs'], init_values_vector))
-            #compute and generate prism commands
-            model.logger.message('Computing sub model with inputs: ' + str(init_values))
-            ep_prism_command = self.__generate_ep_prism_command_sub_model(model, \
-                host_element, init_values)
-            if ep_prism_command:
-                ep_prism_commands.append(ep_prism_command)
-        return ep_prism_commands
+                ep_prism_commands, time = self.__abstract_repetitions(model, flat_model, \
+                    el_name, jobs)
+                flat_element['ep_prism_commands'] = ep_prism_commands
+                flat_element['time'] = time
+                flat_element['repetitions'] = 1
+                model.logger.message('Computing repetitions of element \"' + el_name + \
+                    '\" finished ')
+            if el_value['sub_model'] or el_value['repetitions'] > 1:
+                flat_model.touch(el_name)
+        return flat_model
+
+    def __get_abstraction_settings(self):
+        """@brief settings that change the computed sub models and repetitions"""
+        return repr([self.engine, self.single_run, self.dead_data_reset, \
+            self.fast_execution_time, self.prism_options, self.solver.tolerance, \
+            self.solver.max_iterations, self.solver.method])
+
+    def __abstract_sub_model(self, model, el_name, jobs, abstractions):
+        """@brief Computes ep commands and execution time of a compound element,
+        structurally identical sub models are computed only once"""
+        el_value = model.elements[el_name]
+        sub_model = el_value['sub_model']
+        # changes of the sub model are propagated to the version of the host element,
+        # the memo is only valid for the same settings of the computation
+        settings = self.__get_abstraction_settings()
+        version = [model.get_version(el_name), settings]
+        memo = model.abstractions.get((el_name, 'sub_model'))
+        canonical_form, renaming = sub_model.get_canonical_form(\
+            el_value['df_inputs'], el_value['df_outputs'])
+        key = hashlib.sha256((settings + canonical_form).encode('utf-8')).hexdigest()
+        # the version sees changes by touch, the key also edits of the dicts without touch
+        if memo and memo['version'] == version and memo['key'] == key:
+            model.logger.message('Sub model of element \"' + el_name + '\" is not changed, reused')
+            return [list(memo['ep_prism_commands']), memo['time']]
+        if key in abstractions:
+            ep_prism_commands, time, origin_renaming, origin = abstractions[key]
+            model.logger.message('Sub model of element \"' + el_name + \
+                '\" is identical to the sub model of \"' + origin + '\", reused')
+            # the commands of the host element only name its interface data, values that
+            # are also names of other parts of the origin are kept, interface data that are
+            # not in the sub model have the same names in both canonical forms
+            origin_names = {canonical:name for name, canonical in origin_renaming.items()}
+            names = {origin_names[renaming[d_name]]:d_name \
+                for d_name in el_value['df_inputs'] + el_value['df_outputs'] \
+                if d_name in renaming}
+            ep_prism_commands = [epl_model.Model.rename_in_prism_text(command, names) \
+                for command in ep_prism_commands]
+        else:
+            flat_sub_model = self.__flatten(sub_model, jobs, abstractions)
+            ep_prism_commands = self.__compute_host_ep_prism_commands(\
+                flat_sub_model, el_value, jobs)
+            # compute execution time of the compund element
+            time = self.compute_execution_time(flat_sub_model)
+            abstractions[key] = [ep_prism_commands, time, renaming, el_name]
+        model.abstractions[(el_name, 'sub_model')] = {'version':version, 'key':key, \
+            'ep_prism_commands':list(ep_prism_commands), 'time':time}
+        return [ep_prism_commands, time]
+
+    def __abstract_repetitions(self, model, flat_model, el_name, jobs):
+        """@brief Computes ep commands and execution time of a repeated element"""
+        el_value = flat_model.elements[el_name]
+        d_names = sorted(set(el_value['df_inputs'] + el_value['df_outputs']))
+        settings = self.__get_abstraction_settings()
+        version = [model.get_version(el_name, *d_names), settings]
+        memo = model.abstractions.get((el_name, 'repetitions'))
+        key = repr([settings, el_value['repetitions'], el_value['time'], \
+            el_value['df_inputs'], el_value['df_outputs'], el_value['ep_prism_commands'], \
+            [[flat_model.data[d_name]['values'], flat_model.data[d_name]['initial_value']] \
+            for d_name in d_names]])
+        # the version sees changes by touch, the key also edits of the dicts without touch
+        if memo and memo['version'] == version and memo['key'] == key:
+            model.logger.message('Repetitions of element \"' + el_name + \
+                '\" are not changed, reused')
+            return [list(memo['ep_prism_commands']), memo['time']]
+        ep_prism_commands = self.compute_repetitions(flat_model, el_name, jobs=jobs)
+        # compute execution time of the compund element
+        time = el_value['time'] * el_value['repetitions']
+        model.abstractions[(el_name, 'repetitions')] = {'version':version, 'key':key, \
+            'ep_prism_commands':list(ep_prism_commands), 'time':time}
+        return [ep_prism_commands, time]
+
+    def __compute_host_ep_prism_commands(self, model, host_element, jobs):
+        """@brief generates prism commands of the host element from its flat sub model"""
+        if self.dead_data_reset:
+            # the outputs are observed in every state of the steady state
+            try:
+                model = epl_reduction.Reduction.reset_dead_data(model, \
+                    host_element['df_outputs'], host_element['df_inputs'])
+            except epl_parser.ParseError as exception:
+                model.logger.warning('Dead data are not reset: ' + str(exception))
+        if self.engine == "python":
+            try:
+                return self.__compute_ep_prism_commands(model, host_element, None, \
+                    solve=functools.partial(epl_engine.Engine.compute_steady_states, model, \
+                    solver=self.solver))
+            except (epl_parser.ParseError, epl_engine.EngineError, \
+                epl_solver.SolverError) as exception:
+                model.logger.warning('Sub model is computed with PRISM: ' + str(exception))
+        return self.__compute_ep_prism_commands(model, host_element, \
+            functools.partial(PRISM.generate_prism_model, model), jobs=jobs)
+
+
+def _get_pyplot():
+    """@brief imports pyplot for the plots, the computations do not need matplotlib"""
+    # keep this sequence of imports
+    import matplotlib
+    matplotlib.use('qt4agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def _run_prism_ss_tr_job(prism, prism_model, tr=None):
+    """@brief runs PRISM for a single model in a worker process of the pool"""
+    return prism.run_prism_ss_tr(prism_model, tr=tr)
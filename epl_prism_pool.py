@@ -0,0 +1,307 @@
+"""
+Error Propagation Library V6.
+Pool of long-lived PRISM worker processes.
+
+The workers read json requests from stdin and write json responses to stdout, one per line:
+{"cmd":"ping"}
+{"cmd":"check", "model":file, "properties":file, "results":file, "options":[...]}
+{"cmd":"ss_tr", "model":file, "tr":steps or null, "ss_tr":file, "states":file, "options":[...]}
+the files are the same as of the PRISM command line calls, every response contains "ok"
+and "error" if not ok. The PRISM worker needs the python package jpype1.
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import threading
+import subprocess
+
+class PoolError(Exception):
+    """@brief job failed in a worker process"""
+    pass
+
+class PoolTimeout(PoolError):
+    """@brief job exceeded its timeout, the worker is killed"""
+    pass
+
+class Worker(object):
+    """@brief Worker class, a worker process with a reader thread for timeouts"""
+
+    def __init__(self, command):
+        """@brief Constructor, starts the worker process"""
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, \
+            universal_newlines=True, bufsize=1)
+        self.responses = queue.Queue()
+        self.last_used = time.time()
+        self.jobs = 0
+        reader = threading.Thread(target=self.__read, daemon=True)
+        reader.start()
+
+    def __read(self):
+        """@brief puts responses to the queue, None at the end of the output"""
+        for line in self.process.stdout:
+            self.responses.put(line)
+        self.responses.put(None)
+
+    def is_alive(self):
+        """@brief checks that the worker process is running"""
+        return self.process.poll() is None
+
+    def request(self, request, timeout):
+        """@brief sends a request and waits for the response, the worker is killed on timeout"""
+        try:
+            self.process.stdin.write(json.dumps(request) + "\n")
+            self.process.stdin.flush()
+        except (OSError, ValueError):
+            raise PoolError("Worker process is not running")
+        try:
+            line = self.responses.get(timeout=timeout)
+        except queue.Empty:
+            self.kill()
+            raise PoolTimeout("Timeout of " + str(timeout) + " s exceeded")
+        if line is None:
+            self.kill()
+            raise PoolError("Worker process crashed")
+        self.last_used = time.time()
+        self.jobs += 1
+        response = json.loads(line)
+        if not response.get('ok'):
+            raise PoolError(response.get('error', 'Unknown error'))
+        return response
+
+    def kill(self):
+        """@brief stops the worker process"""
+        if self.is_alive():
+            self.process.kill()
+        self.process.wait()
+        for stream in [self.process.stdin, self.process.stdout]:
+            try:
+                stream.close()
+            except (OSError, ValueError):
+                pass
+
+class PrismPool(object):
+    """@brief PrismPool class, distributes jobs of PRISM runs to a fixed number of workers,
+    restarts crashed workers and checks workers that have been idle for health_interval seconds"""
+
+    def __init__(self, prism_dir=None, size=2, timeout=180, stub=False, health_interval=60):
+        """@brief Constructor, the workers are started on the first job,
+        stub=True runs stand-in workers that do not need PRISM"""
+        self.prism_dir = prism_dir
+        self.size = size
+        self.timeout = timeout
+        self.health_interval = health_interval
+        self.command = [sys.executable, os.path.abspath(__file__), "--worker"]
+        if stub:
+            self.command.append("--stub")
+        elif prism_dir:
+            self.command += ["--prism-dir", prism_dir]
+        self.restarts = 0
+        self.__idle = queue.Queue()
+        self.__workers = []
+        self.__lock = threading.Lock()
+
+    def __get_worker(self):
+        """@brief returns an idle worker, starts a new one if the pool is not full"""
+        with self.__lock:
+            if self.__idle.empty() and len(self.__workers) < self.size:
+                worker = Worker(self.command)
+                self.__workers.append(worker)
+                return worker
+        worker = self.__idle.get()
+        if not worker.is_alive() or time.time() - worker.last_used > self.health_interval:
+            try:
+                worker.request({'cmd':'ping'}, min(self.timeout, 30))
+            except PoolError:
+                worker = self.__restart(worker)
+        return worker
+
+    def __restart(self, worker):
+        """@brief replaces a broken worker by a new one"""
+        worker.kill()
+        new_worker = Worker(self.command)
+        with self.__lock:
+            self.__workers[self.__workers.index(worker)] = new_worker
+            self.restarts += 1
+        return new_worker
+
+    def run(self, request, timeout=None):
+        """@brief runs a job, a crashed job is repeated once in a new worker"""
+        if timeout is None:
+            timeout = self.timeout
+        worker = self.__get_worker()
+        try:
+            return worker.request(request, timeout)
+        except PoolTimeout:
+            worker = self.__restart(worker)
+            raise
+        except PoolError:
+            if worker.is_alive():
+                # error of PRISM, e.g. syntax error in the model
+                raise
+            worker = self.__restart(worker)
+            return worker.request(request, timeout)
+        finally:
+            self.__idle.put(worker)
+
+    def ping(self):
+        """@brief health check of all idle workers, returns the number of running workers"""
+        checked = []
+        while not self.__idle.empty():
+            worker = self.__idle.get()
+            try:
+                worker.request({'cmd':'ping'}, min(self.timeout, 30))
+            except PoolError:
+                worker = self.__restart(worker)
+            checked.append(worker)
+        for worker in checked:
+            self.__idle.put(worker)
+        return len([worker for worker in self.__workers if worker.is_alive()])
+
+    def close(self):
+        """@brief stops all workers"""
+        with self.__lock:
+            for worker in self.__workers:
+                worker.kill()
+            self.__workers = []
+            self.__idle = queue.Queue()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getstate__(self):
+        """@brief worker processes are not copied to other processes, the copy starts its own"""
+        state = self.__dict__.copy()
+        state['_PrismPool__idle'] = None
+        state['_PrismPool__workers'] = []
+        state['_PrismPool__lock'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__idle = queue.Queue()
+        self.__lock = threading.Lock()
+
+class StubBackend(object):
+    """@brief stand-in for PRISM: uniform distribution over two states with all variables
+    set to 0 or 1, the result of every property is 0.5, "sleep" and "crash" commands for tests"""
+
+    def handle(self, request):
+        """@brief executes a request"""
+        if request['cmd'] == 'check':
+            properties = [line.strip() for line in open(request['properties']) if line.strip()]
+            write_results(request['results'], properties, ["0.5" for _ in properties])
+        elif request['cmd'] == 'ss_tr':
+            names = []
+            for line in open(request['model']):
+                if line.startswith("\t") and " : [" in line:
+                    names.append(line.split(":")[0].strip())
+            with open(request['ss_tr'], 'w') as ss_tr_file:
+                ss_tr_file.write("0.5\n0.5\n")
+            with open(request['states'], 'w') as states_file:
+                states_file.write("(" + ",".join(names) + ")\n" + \
+                    "0:(" + ",".join("0" for _ in names) + ")\n" + \
+                    "1:(" + ",".join("1" for _ in names) + ")\n")
+        elif request['cmd'] == 'sleep':
+            time.sleep(request['seconds'])
+        elif request['cmd'] == 'crash':
+            os._exit(1)
+        return {'ok':True}
+
+class JPypeBackend(object):
+    """@brief PRISM in the JVM of the worker process, started once"""
+
+    def __init__(self, prism_dir):
+        """@brief Constructor, prism_dir is the bin folder of PRISM"""
+        import jpype
+        lib_dir = os.path.join(os.path.dirname(os.path.abspath(prism_dir)), "lib")
+        jpype.startJVM("-Djava.library.path=" + lib_dir, \
+            classpath=[os.path.join(lib_dir, "*"), \
+            os.path.join(os.path.dirname(lib_dir), "classes")])
+        self.jpype = jpype
+        self.java_file = jpype.JClass("java.io.File")
+        self.prism_class = jpype.JClass("prism.Prism")
+        self.prism = self.prism_class(jpype.JClass("prism.PrismDevNullLog")())
+        self.prism.initialise()
+
+    def __set_options(self, options):
+        """@brief applies command line options, e.g. -maxiters"""
+        args = self.jpype.JArray(self.jpype.JString)(options)
+        settings = self.prism.getSettings()
+        i = 0
+        while i < len(options):
+            if options[i].startswith("-"):
+                i = max(settings.setFromCommandLineSwitch(args, i), i + 1)
+            else:
+                i += 1
+
+    def __load_model(self, request):
+        """@brief parses and loads the model file"""
+        self.__set_options(request.get('options', []))
+        modules_file = self.prism.parseModelFile(self.java_file(request['model']))
+        self.prism.loadPRISMModel(modules_file)
+        return modules_file
+
+    def handle(self, request):
+        """@brief executes a request"""
+        if request['cmd'] == 'check':
+            modules_file = self.__load_model(request)
+            properties_file = self.prism.parsePropertiesFile(modules_file, \
+                self.java_file(request['properties']))
+            properties = []
+            results = []
+            for i in range(properties_file.getNumProperties()):
+                result = self.prism.modelCheck(properties_file, \
+                    properties_file.getPropertyObject(i))
+                properties.append(str(properties_file.getPropertyObject(i)))
+                results.append(str(result.getResult()))
+            write_results(request['results'], properties, results)
+        elif request['cmd'] == 'ss_tr':
+            self.__load_model(request)
+            self.prism.exportStatesToFile(self.prism_class.EXPORT_PLAIN, \
+                self.java_file(request['states']))
+            if request.get('tr'):
+                self.prism.doTransient(int(request['tr']), self.prism_class.EXPORT_PLAIN, \
+                    self.java_file(request['ss_tr']), None)
+            else:
+                self.prism.doSteadyState(self.prism_class.EXPORT_PLAIN, \
+                    self.java_file(request['ss_tr']), None)
+        return {'ok':True}
+
+def write_results(file_name, properties, results):
+    """@brief writes results in the format of PRISM -exportresults"""
+    with open(file_name, 'w') as results_file:
+        if len(properties) == 1:
+            results_file.write("Result\n" + results[0] + "\n")
+        else:
+            results_file.write("\n".join(prop + ":\nResult\n" + result + "\n" \
+                for prop, result in zip(properties, results)))
+
+def serve(backend, stdin=sys.stdin, stdout=sys.stdout):
+    """@brief worker loop, one json response per request line"""
+    for line in stdin:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            if request.get('cmd') == 'ping':
+                response = {'ok':True}
+            else:
+                response = backend.handle(request)
+        except Exception as exception:
+            response = {'ok':False, 'error':str(exception)}
+        stdout.write(json.dumps(response) + "\n")
+        stdout.flush()
+
+if __name__ == "__main__" and "--worker" in sys.argv:
+    if "--stub" in sys.argv:
+        serve(StubBackend())
+    else:
+        PRISM_DIR = sys.argv[sys.argv.index("--prism-dir") + 1] \
+            if "--prism-dir" in sys.argv else "."
+        serve(JPypeBackend(PRISM_DIR))
@@ -0,0 +1,281 @@
+"""
+Error Propagation Library V6.
+Cone of influence reduction and dead data reset of EPL models for the computation of failures.
+"""
+
+import numpy as np
+
+import epl_parser
+import epl_engine
+import epl_encoding
+
+class Reduction(object):
+    """@brief Reduction class, finds the data that can influence failures: the data of the
+    failure formulas, the data read by cf commands, and the data that the ep commands use to
+    compute relevant data. Ep commands with guards that do not cover all values block the
+    control flow, their data are relevant as well. Data that are dead, i.e. overwritten or not
+    read any more on every path of the control flow, are reset to their initial values"""
+
+    # largest number of value combinations of the guard check
+    max_combinations = 2**20
+
+    @staticmethod
+    def is_exhaustive(model, commands):
+        """@brief checks that a command is enabled for all values of the data in the guards,
+        otherwise the ep commands can block the control flow"""
+        guards = [epl_parser.Parser.parse_prism_command(command)['guard'] for command in commands]
+        consts = epl_engine.Engine.get_constants(model)
+        names = set()
+        for guard in guards:
+            epl_parser.Parser.get_names(guard, names)
+        variables = sorted(names - set(consts))
+        if not set(variables) <= set(model.data):
+            return False
+        ranges = epl_encoding.Encoding.get_data_ranges(model)
+        size = 1
+        for name in variables:
+            size *= ranges[name][1] - ranges[name][0] + 1
+        if size > Reduction.max_combinations:
+            return False
+        grids = np.meshgrid(*[np.arange(ranges[name][0], ranges[name][1] + 1) \
+            for name in variables], indexing='ij')
+        env = dict(consts)
+        env.update((name, grid.reshape(-1)) for name, grid in zip(variables, grids))
+        enabled = np.zeros(size, dtype=bool)
+        for guard in guards:
+            enabled |= epl_engine.Engine.evaluate(epl_parser.Parser.compile(guard), env, \
+                size, bool)
+        return bool(enabled.all())
+
+    @staticmethod
+    def get_influence(model, el_name, commands, relevant, blocking):
+        """@brief returns the data that influence the relevant outputs of the element,
+        all outputs of a blocking element are relevant"""
+        el_value = model.elements[el_name]
+        targets = set(el_value['df_outputs'])
+        for command in commands:
+            targets |= epl_parser.Parser.get_references(command)['targets']
+        if blocking:
+            names = set(targets)
+        elif targets & relevant:
+            names = set()
+        else:
+            return set()
+        if not set(el_value['df_outputs']) & (relevant | names):
+            # the commands of an element without outputs are not generated
+            names |= set(el_value['df_outputs'])
+        kept = relevant | names
+        for command in commands:
+            parsed = epl_parser.Parser.parse_prism_command(command)
+            # the guards decide between the commands that update relevant data
+            epl_parser.Parser.get_names(parsed['guard'], names)
+            if not any(target in kept for _, assignments in parsed['updates'] \
+                for target in assignments):
+                continue
+            for probability, assignments in parsed['updates']:
+                epl_parser.Parser.get_names(probability, names)
+                for target, value in assignments.items():
+                    if target in kept:
+                        epl_parser.Parser.get_names(value, names)
+        return names & set(model.data)
+
+    @staticmethod
+    def get_relevant_data(model, f_names):
+        """@brief returns the set of data that can influence the failures of f_names"""
+        d_names = set(model.data)
+        relevant = set()
+        for f_name in f_names:
+            relevant |= epl_parser.Parser.get_names(\
+                epl_parser.Parser.parse_prism_expression(model.failures[f_name])) & d_names
+        # data of the control flow influence everything
+        for el_name in model.elements:
+            for command in epl_engine.Engine.get_cf_commands(model, el_name):
+                references = epl_parser.Parser.get_references(command)
+                relevant |= (references['guard'] | references['updates']) & d_names
+        ep_commands = {el_name:epl_engine.Engine.get_ep_commands(model, el_name) \
+            for el_name, el_value in model.elements.items() if el_value['df_outputs']}
+        blocking = set(el_name for el_name, commands in ep_commands.items() \
+            if not Reduction.is_exhaustive(model, commands))
+        changed = True
+        while changed:
+            changed = False
+            for el_name, commands in ep_commands.items():
+                names = Reduction.get_influence(model, el_name, commands, relevant, \
+                    el_name in blocking)
+                if not names <= relevant:
+                    relevant |= names
+                    changed = True
+        return relevant
+
+    @staticmethod
+    def restrict_command(command, relevant):
+        """@brief removes the assignments of data that are not relevant from a command"""
+        parsed = epl_parser.Parser.parse_prism_command(command)
+        if all(target in relevant for _, assignments in parsed['updates'] \
+            for target in assignments):
+            return command
+        return epl_parser.Parser.command_to_text({'guard':parsed['guard'], \
+            'updates':[[probability, {target:value for target, value in assignments.items() \
+            if target in relevant}] for probability, assignments in parsed['updates']]})
+
+    @staticmethod
+    def reduce(model, f_names):
+        """@brief returns a copy of the model without the data that cannot influence the failures
+        of f_names and only with these failures, the model itself if nothing can be removed"""
+        relevant = Reduction.get_relevant_data(model, f_names)
+        irrelevant = set(model.data) - relevant
+        if not irrelevant:
+            return model
+        model.logger.message('Cone of influence of ' + ", ".join(f_names) + ': ' + \
+            str(len(relevant)) + ' of ' + str(len(model.data)) + ' data, removed ' + \
+            ", ".join(d_name for d_name in model.data if d_name in irrelevant))
+        reduced = model.copy()
+        # the copy is not a sub model, its changes are not propagated
+        reduced.host = None
+        reduced.abstractions = {}
+        reduced.failures = {f_name:model.failures[f_name] for f_name in f_names}
+        for el_name, el_value in reduced.elements.items():
+            if not irrelevant & set(el_value['df_inputs'] + el_value['df_outputs']):
+                continue
+            if el_value['df_outputs']:
+                # default commands depend on the data flow, they are fixed before it changes
+                el_value['ep_prism_commands'] = [Reduction.restrict_command(command, relevant) \
+                    for command in epl_engine.Engine.get_ep_commands(model, el_name)]
+            el_value['df_inputs'] = [d_name for d_name in el_value['df_inputs'] \
+                if d_name in relevant]
+            el_value['df_outputs'] = [d_name for d_name in el_value['df_outputs'] \
+                if d_name in relevant]
+            if not el_value['df_outputs']:
+                el_value['ep_prism_commands'] = []
+            reduced.touch(el_name)
+        for d_name in irrelevant:
+            del reduced.data[d_name]
+        reduced.touch(*irrelevant)
+        return reduced
+
+    @staticmethod
+    def get_cf_successors(model, el_name):
+        """@brief returns the set of elements and 'stop' that can follow the element"""
+        successors = set()
+        for command in epl_engine.Engine.get_cf_commands(model, el_name):
+            for _, assignments in epl_parser.Parser.parse_prism_command(command)['updates']:
+                if 'cf' not in assignments:
+                    successors.add(el_name)
+                elif assignments['cf'][0] == 'var' and (assignments['cf'][1] in model.elements \
+                    or assignments['cf'][1] == 'stop'):
+                    successors.add(assignments['cf'][1])
+                else:
+                    return set(model.elements) | {'stop'}
+        return successors
+
+    @staticmethod
+    def get_accesses(model, el_name):
+        """@brief returns [data read, data that may be written, data that are written
+        by every update] of the cf and ep commands of the element"""
+        d_names = set(model.data)
+        reads = set()
+        for command in epl_engine.Engine.get_cf_commands(model, el_name):
+            references = epl_parser.Parser.get_references(command)
+            reads |= references['guard'] | references['updates']
+        may_write = set()
+        must_write = None
+        if model.elements[el_name]['df_outputs']:
+            for command in epl_engine.Engine.get_ep_commands(model, el_name):
+                references = epl_parser.Parser.get_references(command)
+                reads |= references['guard'] | references['updates']
+                may_write |= references['targets']
+                for _, assignments in epl_parser.Parser.parse_prism_command(command)['updates']:
+                    if must_write is None:
+                        must_write = set(assignments)
+                    else:
+                        must_write &= set(assignments)
+        return [reads & d_names, may_write & d_names, (must_write or set()) & d_names]
+
+    @staticmethod
+    def get_resets(model, live, initial_data=()):
+        """@brief liveness analysis over the control flow, live = data that are live everywhere,
+        e.g. of failures, initial_data = data that may have other initial values,
+        returns {element name:data that are dead after the element and may differ from
+        their initial values}"""
+        successors = {el_name:Reduction.get_cf_successors(model, el_name) \
+            for el_name in model.elements}
+        accesses = {el_name:Reduction.get_accesses(model, el_name) for el_name in model.elements}
+        live = set(live)
+        # backward: data live before the elements
+        live_in = {el_name:set(live) for el_name in model.elements}
+        live_in['stop'] = set(live)
+        changed = True
+        while changed:
+            changed = False
+            for el_name in model.elements:
+                reads, _, must_write = accesses[el_name]
+                live_out = set().union(*[live_in[successor] \
+                    for successor in successors[el_name]])
+                new_live = live_in[el_name] | reads | (live_out - must_write)
+                if new_live != live_in[el_name]:
+                    live_in[el_name] = new_live
+                    changed = True
+        dead_after = {el_name:set(model.data) - set().union(*[live_in[successor] \
+            for successor in successors[el_name]]) for el_name in model.elements}
+        # forward: data that may differ from their initial values before the elements
+        changed_in = {el_name:set() for el_name in model.elements}
+        changed_in[model.initial_element] = set(initial_data)
+        resets = {}
+        changed = True
+        while changed:
+            changed = False
+            for el_name in model.elements:
+                may_differ = changed_in[el_name] | accesses[el_name][1]
+                resets[el_name] = dead_after[el_name] & may_differ
+                for successor in successors[el_name] - {'stop'}:
+                    new_changed = may_differ - resets[el_name]
+                    if not new_changed <= changed_in[successor]:
+                        changed_in[successor] |= new_changed
+                        changed = True
+        return {el_name:d_names for el_name, d_names in resets.items() if d_names}
+
+    @staticmethod
+    def reset_dead_data(model, live, initial_data=()):
+        """@brief returns a copy of the model whose ep commands reset the dead data of get_resets
+        to their initial values, the model itself if there is nothing to reset"""
+        resets = Reduction.get_resets(model, live, initial_data)
+        if not resets:
+            return model
+        model.logger.message('Dead data are reset by ' + str(len(resets)) + ' elements: ' + \
+            "; ".join(el_name + ": " + ", ".join(sorted(d_names)) \
+            for el_name, d_names in resets.items()))
+        reset_model = model.copy()
+        # the copy is not a sub model, its changes are not propagated
+        reset_model.host = None
+        reset_model.abstractions = {}
+        for el_name, d_names in resets.items():
+            el_value = reset_model.elements[el_name]
+            initial = {d_name:('var', value) if isinstance(value, str) else ('num', value) \
+                for d_name in d_names for value in [model.data[d_name]['initial_value']]}
+            if el_value['df_outputs']:
+                commands = [epl_parser.Parser.parse_prism_command(command) \
+                    for command in epl_engine.Engine.get_ep_commands(model, el_name)]
+            else:
+                commands = [{'guard':('bool', True), 'updates':[[('num', 1), {}]]}]
+            el_value['ep_prism_commands'] = [epl_parser.Parser.command_to_text(\
+                {'guard':command['guard'], 'updates':[[probability, dict(assignments, **initial)] \
+                for probability, assignments in command['updates']]}) for command in commands]
+            for d_name in sorted(d_names):
+                if d_name not in el_value['df_outputs']:
+                    el_value['df_outputs'].append(d_name)
+                    reset_model.data[d_name]['df_inputs'].append(el_name)
+            reset_model.touch(el_name, *d_names)
+        return reset_model
+
+    @staticmethod
+    def get_state_counts(model, f_names):
+        """@brief returns {'model', 'cone', 'reset'}: numbers of reachable states of the model,
+        of its cone of influence of the failures and with reset dead data, built in-process"""
+        cone = Reduction.reduce(model, f_names)
+        live = set()
+        for f_name in f_names:
+            live |= epl_parser.Parser.get_names(\
+                epl_parser.Parser.parse_prism_expression(model.failures[f_name]))
+        reset_model = Reduction.reset_dead_data(cone, live & set(cone.data))
+        return {name:len(epl_engine.Engine.build_dtmc(counted).states) \
+            for name, counted in [['model', model], ['cone', cone], ['reset', reset_model]]}
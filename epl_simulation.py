@@ -0,0 +1,425 @@
+"""
+Error Propagation Library V6.
+Statistical model checking of EPL models by Monte Carlo simulation of batches of trajectories.
+"""
+
+import concurrent.futures
+
+import numpy as np
+# scipy is imported where it is used, PRISM runs of epl_prism do not need it
+
+import epl_parser
+import epl_engine
+import epl_solver
+
+class Simulator(object):
+    """@brief Simulator class, estimates the results of PRISM.compute_P_single, compute_MTTF and
+    compute_P with confidence intervals, without building the state space. Trajectories are
+    simulated in batches of batch_size with the PRISM semantics of dtmc as rows of numpy arrays,
+    the batches run in jobs processes until the confidence interval is narrow enough"""
+
+    def __init__(self, width=0.01, confidence=0.95, batch_size=10000, jobs=1, \
+        max_samples=10000000, max_steps=100000, seed=None, importance_sampling=False, \
+        relative_error=0.1, bias=0.5, rare_threshold=0.1):
+        """@brief Constructor, width = requested half width of the confidence intervals,
+        relative to the estimate for MTTF, max_steps = length of the trajectories of
+        unbounded properties, seed = seed of the random numbers, None = random,
+        importance_sampling = estimate P_single by estimate_P_rare with the requested
+        relative_error, bias and rare_threshold of get_biased_command"""
+        self.width = width
+        self.confidence = confidence
+        self.batch_size = batch_size
+        self.jobs = jobs
+        self.max_samples = max_samples
+        self.max_steps = max_steps
+        self.seed = seed
+        self.importance_sampling = importance_sampling
+        self.relative_error = relative_error
+        self.bias = bias
+        self.rare_threshold = rare_threshold
+
+    @staticmethod
+    def get_specification(model, f_name):
+        """@brief returns the picklable description of the model for the worker processes"""
+        specification = epl_engine.Engine.get_semantics(model)
+        specification['failure'] = model.failures[f_name]
+        # cf=stop has no time
+        specification['times'] = [el_value['time'] for el_value in model.elements.values()] + [0.0]
+        return specification
+
+    @staticmethod
+    def get_biased_command(command, rare_threshold, bias):
+        """@brief balanced failure biasing of a command: the updates with a constant probability
+        below rare_threshold share the probability bias equally, the other updates share the rest
+        in proportion to their probabilities, returns the command unchanged if it has no rare
+        updates or probabilities that depend on variables"""
+        parsed = epl_parser.Parser.parse_prism_command(command)
+        try:
+            probs = [float(epl_parser.evaluate(probability, {})) \
+                for probability, _ in parsed['updates']]
+        except epl_parser.ParseError:
+            return command
+        rare = [0.0 < prob < rare_threshold for prob in probs]
+        common = sum(prob for prob, is_rare in zip(probs, rare) if not is_rare)
+        rare_prob = sum(prob for prob, is_rare in zip(probs, rare) if is_rare)
+        if not any(rare) or common <= 0.0 or rare_prob >= bias:
+            return command
+        updates = [[('num', bias / sum(rare) if is_rare else (1.0 - bias) * prob / common), \
+            assignments] for prob, is_rare, (_, assignments) in zip(probs, rare, parsed['updates'])]
+        return epl_parser.Parser.command_to_text({'guard':parsed['guard'], 'updates':updates})
+
+    @staticmethod
+    def get_biased_actions(actions, rare_threshold, bias):
+        """@brief biases the ep commands of the actions of Engine.get_semantics"""
+        return [[cf_commands, None if ep_commands is None else \
+            [Simulator.get_biased_command(command, rare_threshold, bias) \
+            for command in ep_commands]] for cf_commands, ep_commands in actions]
+
+    @staticmethod
+    def get_z(confidence):
+        """@brief quantile of the standard normal distribution for two-sided intervals"""
+        import scipy.stats
+        return scipy.stats.norm.ppf(0.5 + confidence / 2.0)
+
+    @staticmethod
+    def get_proportion(successes, samples, z):
+        """@brief returns {'value', 'lower', 'upper', 'half_width', 'samples'},
+        the Wilson score interval of a probability"""
+        if not samples:
+            return {'value':0.0, 'lower':0.0, 'upper':1.0, 'half_width':0.5, 'samples':0}
+        value = successes / samples
+        denominator = 1.0 + z * z / samples
+        center = (value + z * z / (2.0 * samples)) / denominator
+        half_width = z / denominator * np.sqrt(value * (1.0 - value) / samples + \
+            z * z / (4.0 * samples * samples))
+        return {'value':float(value), 'lower':float(max(center - half_width, 0.0)), \
+            'upper':float(min(center + half_width, 1.0)), 'half_width':float(half_width), \
+            'samples':int(samples)}
+
+    @staticmethod
+    def get_mean(total, total_squares, samples, z):
+        """@brief returns {'value', 'lower', 'upper', 'half_width', 'samples'},
+        the normal interval of a mean"""
+        if samples < 2:
+            return {'value':float(total / samples) if samples else 0.0, 'lower':-np.inf, \
+                'upper':np.inf, 'half_width':np.inf, 'samples':int(samples)}
+        value = total / samples
+        variance = max(total_squares - samples * value * value, 0.0) / (samples - 1)
+        half_width = z * np.sqrt(variance / samples)
+        return {'value':float(value), 'lower':float(value - half_width), \
+            'upper':float(value + half_width), 'half_width':float(half_width), \
+            'samples':int(samples)}
+
+    @staticmethod
+    def sample(sources, probs, size, rng):
+        """@brief draws a successor of every state 0..size-1 from the successors of
+        Engine.get_successors, returns [indexes of the drawn successors, mask of the states
+        with a single successor]"""
+        order = np.argsort(sources, kind='stable')
+        sorted_sources = sources[order]
+        cumulated = np.cumsum(probs[order])
+        starts = np.searchsorted(sorted_sources, np.arange(size))
+        ends = np.searchsorted(sorted_sources, np.arange(size), side='right')
+        offsets = np.concatenate([[0.0], cumulated])[starts]
+        targets = offsets + rng.random(size) * (cumulated[ends - 1] - offsets)
+        picked = np.clip(np.searchsorted(cumulated, targets, side='right'), starts, ends - 1)
+        return [order[picked], ends - starts == 1]
+
+    @staticmethod
+    def get_transition_probabilities(successors, chosen):
+        """@brief returns the probability of the transition from the state i to chosen[i] for
+        every i, successors = [source indexes, successor states, probabilities]"""
+        sources, states, probs = successors
+        rows = np.vstack([np.column_stack([sources, states]), \
+            np.column_stack([np.arange(len(chosen)), chosen])])
+        inverse = np.unique(rows, axis=0, return_inverse=True)[1].reshape(-1)
+        # several updates may lead to the same successor
+        totals = np.bincount(inverse[:len(sources)], weights=probs, minlength=inverse.max() + 1)
+        return totals[inverse[len(sources):]]
+
+    @staticmethod
+    def simulate_rare(specification, batch_size, max_steps, seed):
+        """@brief simulates a batch of trajectories with the biased ep commands of the
+        specification, returns sums of the batch: 'hits' = failures within max_steps,
+        'weight', 'weight_squares' = likelihood ratios of the trajectories with the failure
+        and their squares, 'truncated' = undecided trajectories"""
+        rng = np.random.default_rng(seed)
+        variables = specification['variables']
+        max_values = specification['max_values']
+        min_values = specification['min_values']
+        consts = specification['consts']
+        actions = epl_engine.Engine.compile_actions(specification['actions'])
+        biased_actions = epl_engine.Engine.compile_actions(specification['biased_actions'])
+        failure = epl_parser.Parser.compile(\
+            epl_parser.Parser.parse_prism_expression(specification['failure']))
+        initial_states = np.array(specification['initial_states'], dtype=np.int64)
+        states = initial_states[rng.integers(len(initial_states), size=batch_size)]
+        running = np.ones(batch_size, dtype=bool)
+        hit = np.zeros(batch_size, dtype=bool)
+        weights = np.ones(batch_size)
+        for step in range(max_steps + 1):
+            indexes = np.nonzero(running)[0]
+            current = states[indexes]
+            failed = epl_engine.Engine.evaluate(failure, epl_engine.Engine.get_env(consts, \
+                variables, current), len(current), bool)
+            hit[indexes[failed]] = True
+            running[indexes[failed]] = False
+            indexes = indexes[~failed]
+            current = current[~failed]
+            if step == max_steps or not len(indexes):
+                break
+            biased = epl_engine.Engine.get_successors(biased_actions, variables, max_values, \
+                consts, current, min_values)
+            picked, single = Simulator.sample(biased[0], biased[2], len(indexes), rng)
+            chosen = biased[1][picked]
+            original = epl_engine.Engine.get_successors(actions, variables, max_values, \
+                consts, current, min_values)
+            # likelihood ratio of the original and the biased transition probabilities
+            weights[indexes] *= Simulator.get_transition_probabilities(original, chosen) / \
+                Simulator.get_transition_probabilities(biased, chosen)
+            states[indexes] = chosen
+            running[indexes[single & np.all(chosen == current, axis=1)]] = False
+        return {'samples':batch_size, 'hits':int(hit.sum()), \
+            'weight':float(weights[hit].sum()), 'weight_squares':float((weights[hit]**2).sum()), \
+            'truncated':int((running & ~hit).sum())}
+
+    @staticmethod
+    def simulate(specification, batch_size, max_steps, steps, seed):
+        """@brief simulates a batch of trajectories, returns sums of the batch:
+        steps=None: 'hits' = failures within max_steps, 'absorbed' = trajectories that are
+        absorbed in a state without the failure, 'truncated' = undecided trajectories,
+        'trapped' = undecided trajectories in a state that cannot reach the failure,
+        'time', 'time_squares' = time until the failure of the trajectories with the failure;
+        steps: 'hits' and 'time' = cumulative time at every step,
+        simulate_rare if the specification has biased actions"""
+        if 'biased_actions' in specification:
+            return Simulator.simulate_rare(specification, batch_size, max_steps, seed)
+        rng = np.random.default_rng(seed)
+        variables = specification['variables']
+        max_values = specification['max_values']
+        min_values = specification['min_values']
+        consts = specification['consts']
+        actions = epl_engine.Engine.compile_actions(specification['actions'])
+        failure = epl_parser.Parser.compile(\
+            epl_parser.Parser.parse_prism_expression(specification['failure']))
+        times = np.array(specification['times'], dtype=float)
+        initial_states = np.array(specification['initial_states'], dtype=np.int64)
+        # PRISM starts from the uniform distribution over the initial states
+        states = initial_states[rng.integers(len(initial_states), size=batch_size)]
+        def is_failed(current):
+            """@brief evaluates the failure formula for the states"""
+            return epl_engine.Engine.evaluate(failure, epl_engine.Engine.get_env(consts, \
+                variables, current), len(current), bool)
+        def move(indexes):
+            """@brief one step of the states of indexes, returns the mask of absorbed ones"""
+            current = states[indexes]
+            sources, successors, probs = epl_engine.Engine.get_successors(actions, \
+                variables, max_values, consts, current, min_values)
+            picked, single = Simulator.sample(sources, probs, len(indexes), rng)
+            states[indexes] = successors[picked]
+            return single & np.all(successors[picked] == current, axis=1)
+        if steps is None:
+            running = np.ones(batch_size, dtype=bool)
+            hit = np.zeros(batch_size, dtype=bool)
+            absorbed = np.zeros(batch_size, dtype=bool)
+            elapsed = np.zeros(batch_size)
+            for step in range(max_steps + 1):
+                indexes = np.nonzero(running)[0]
+                failed = is_failed(states[indexes])
+                hit[indexes[failed]] = True
+                running[indexes[failed]] = False
+                indexes = indexes[~failed]
+                if step == max_steps or not len(indexes):
+                    break
+                # reward of the state is earned before it is left
+                elapsed[indexes] += times[states[indexes, 0]]
+                stuck = indexes[move(indexes)]
+                absorbed[stuck] = True
+                running[stuck] = False
+            # e.g. loops without the failure, the states reachable from the last states of the
+            # undecided trajectories are explored only if there are any
+            trapped = 0
+            if running.any():
+                ends, counts = np.unique(states[running], axis=0, return_counts=True)
+                reachable, matrix, initial = epl_engine.Engine.explore(variables, max_values, \
+                    actions, ends, consts, min_values)
+                can_fail = epl_solver.Solver.get_backward_reachable(matrix, is_failed(reachable))
+                trapped = int(counts[~can_fail[initial]].sum())
+            return {'samples':batch_size, 'hits':int(hit.sum()), \
+                'absorbed':int(absorbed.sum()), 'truncated':int(running.sum()), \
+                'trapped':trapped, 'time':float(elapsed[hit].sum()), \
+                'time_squares':float((elapsed[hit]**2).sum())}
+        hit_steps = np.full(batch_size, -1)
+        absorbed = np.zeros(batch_size, dtype=bool)
+        elapsed = np.zeros(batch_size)
+        hits = np.zeros(len(steps))
+        cumulated = np.zeros(len(steps))
+        last_step = max(steps) if steps else 0
+        for step in range(last_step + 1):
+            failed = is_failed(states) & (hit_steps < 0)
+            hit_steps[failed] = step
+            for i, requested in enumerate(steps):
+                if requested == step:
+                    hits[i] = np.count_nonzero(hit_steps >= 0)
+                    cumulated[i] = elapsed.sum()
+            if step == last_step:
+                break
+            elapsed += times[states[:, 0]]
+            indexes = np.nonzero(~absorbed)[0]
+            if len(indexes):
+                absorbed[indexes[move(indexes)]] = True
+        return {'samples':batch_size, 'hits':hits.tolist(), 'time':cumulated.tolist()}
+
+    def __run(self, specification, steps, is_done, max_steps=None):
+        """@brief simulates batches until is_done(sums) or max_samples, returns the sums,
+        the batches are added in their order, so that the sums do not depend on the jobs"""
+        if max_steps is None:
+            max_steps = self.max_steps
+        entropy = np.random.SeedSequence(self.seed).entropy
+        sums = None
+        index = 0
+        executor = None
+        if self.jobs > 1:
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.jobs)
+        try:
+            while True:
+                # every batch has its own stream of random numbers given by its index
+                batch_seeds = [np.random.SeedSequence(entropy, spawn_key=(index + i,)) \
+                    for i in range(self.jobs)]
+                index += self.jobs
+                if executor:
+                    batches = executor.map(_simulate_job, [specification] * self.jobs, \
+                        [self.batch_size] * self.jobs, [max_steps] * self.jobs, \
+                        [steps] * self.jobs, batch_seeds)
+                else:
+                    batches = (Simulator.simulate(specification, self.batch_size, \
+                        max_steps, steps, seed) for seed in batch_seeds)
+                for batch in batches:
+                    sums = batch if sums is None else Simulator.add_sums(sums, batch)
+                    # later batches that are already simulated are dropped
+                    if sums['samples'] >= self.max_samples or is_done(sums):
+                        return sums
+        finally:
+            if executor:
+                executor.shutdown()
+
+    @staticmethod
+    def add_sums(sums, batch):
+        """@brief adds the sums of a batch to the sums of the previous batches"""
+        for key, value in batch.items():
+            if isinstance(value, list):
+                sums[key] = [a + b for a, b in zip(sums[key], value)]
+            else:
+                sums[key] += value
+        return sums
+
+    def __check_width(self, model, estimates):
+        """@brief warns if max_samples were not enough for the requested width"""
+        if any(not estimate['half_width'] <= self.width for estimate in estimates):
+            model.logger.warning('Requested width of the confidence interval is not reached ' + \
+                'with ' + str(estimates[0]['samples']) + ' samples.')
+
+    def __check_truncated(self, model, sums, max_steps):
+        """@brief warns about trajectories that were stopped after max_steps"""
+        if sums['truncated']:
+            model.logger.warning(str(sums['truncated']) + ' of ' + str(sums['samples']) + \
+                ' trajectories are undecided after ' + str(max_steps) + ' steps.')
+
+    def estimate_P_single(self, model, f_name):
+        """@brief estimates P=? [ F f_name ], returns {'value', 'lower', 'upper',
+        'half_width', 'samples'}, undecided trajectories count as without failure"""
+        if self.importance_sampling:
+            return self.estimate_P_rare(model, f_name)
+        model.logger.message('Simulating P for ' + f_name + ' ... ')
+        z = Simulator.get_z(self.confidence)
+        estimate = lambda sums: Simulator.get_proportion(sums['hits'], sums['samples'], z)
+        sums = self.__run(Simulator.get_specification(model, f_name), None, \
+            lambda sums: estimate(sums)['half_width'] <= self.width)
+        self.__check_truncated(model, sums, self.max_steps)
+        result = estimate(sums)
+        self.__check_width(model, [result])
+        return result
+
+    def estimate_P_rare(self, model, f_name, step_bound=None):
+        """@brief estimates P=? [ F f_name ], or P=? [ F<=step_bound f_name ], by importance
+        sampling with biased ep commands until the requested relative_error is reached,
+        returns {'value', 'lower', 'upper', 'half_width', 'samples', 'hits', 'relative_error'},
+        relative_error = standard error / estimate"""
+        model.logger.message('Simulating rare P for ' + f_name + ' ... ')
+        specification = Simulator.get_specification(model, f_name)
+        specification['biased_actions'] = Simulator.get_biased_actions(\
+            specification['actions'], self.rare_threshold, self.bias)
+        if specification['biased_actions'] == specification['actions']:
+            model.logger.warning('No ep commands with rare updates, ' + \
+                'the simulation is not biased.')
+        z = Simulator.get_z(self.confidence)
+        def estimate(sums):
+            """@brief estimate of the sums with its relative error"""
+            result = Simulator.get_mean(sums['weight'], sums['weight_squares'], \
+                sums['samples'], z)
+            result['hits'] = sums['hits']
+            result['relative_error'] = float(result['half_width'] / z / result['value']) \
+                if result['value'] > 0 else np.inf
+            return result
+        # the variance estimate of few hits is not reliable
+        is_done = lambda sums: sums['hits'] >= 100 and \
+            estimate(sums)['relative_error'] <= self.relative_error
+        max_steps = self.max_steps if step_bound is None else int(step_bound)
+        sums = self.__run(specification, None, is_done, max_steps)
+        if step_bound is None:
+            self.__check_truncated(model, sums, max_steps)
+        result = estimate(sums)
+        if not result['relative_error'] <= self.relative_error:
+            model.logger.warning('Requested relative error is not reached with ' + \
+                str(sums['samples']) + ' samples.')
+        model.logger.message('Relative error ' + str(result['relative_error']) + ' with ' + \
+            str(result['hits']) + ' failures in ' + str(result['samples']) + ' samples')
+        return result
+
+    def estimate_MTTF(self, model, f_name):
+        """@brief estimates R{"time"}=? [ F f_name ], returns {'value', 'lower', 'upper',
+        'half_width', 'samples'}, the value is infinite if the failure is not reached
+        with probability 1 as in PRISM, i.e. if a trajectory is absorbed or trapped in states
+        that cannot reach the failure"""
+        model.logger.message('Simulating MTTF for ' + f_name + ' ... ')
+        z = Simulator.get_z(self.confidence)
+        estimate = lambda sums: Simulator.get_mean(sums['time'], sums['time_squares'], \
+            sums['hits'], z)
+        is_done = lambda sums: sums['absorbed'] > 0 or sums['trapped'] > 0 or \
+            estimate(sums)['half_width'] <= self.width * abs(estimate(sums)['value'])
+        sums = self.__run(Simulator.get_specification(model, f_name), None, is_done)
+        self.__check_truncated(model, sums, self.max_steps)
+        if sums['absorbed'] or sums['trapped']:
+            return {'value':np.inf, 'lower':np.inf, 'upper':np.inf, 'half_width':0.0, \
+                'samples':sums['samples']}
+        result = estimate(sums)
+        if not result['half_width'] <= self.width * abs(result['value']):
+            model.logger.warning('Requested width of the confidence interval is not reached ' + \
+                'with ' + str(sums['samples']) + ' samples.')
+        return result
+
+    def estimate_P(self, model, f_name, steps):
+        """@brief estimates P=? [ F<=t f_name ] and R{"time"}=? [ C<=t ] for every t of the
+        steps, returns {'steps', 'time', 'P', 'lower', 'upper', 'half_width', 'samples'}"""
+        model.logger.message('Simulating P for ' + f_name + ' ... ')
+        steps = [int(step) for step in steps]
+        z = Simulator.get_z(self.confidence)
+        estimate = lambda sums: [Simulator.get_proportion(hits, sums['samples'], z) \
+            for hits in sums['hits']]
+        sums = self.__run(Simulator.get_specification(model, f_name), steps, \
+            lambda sums: all(result['half_width'] <= self.width for result in estimate(sums)))
+        results = estimate(sums)
+        if results:
+            self.__check_width(model, results)
+        return {'steps':[float(step) for step in steps], \
+            'time':[time / sums['samples'] for time in sums['time']], \
+            'P':[result['value'] for result in results], \
+            'lower':[result['lower'] for result in results], \
+            'upper':[result['upper'] for result in results], \
+            'half_width':[result['half_width'] for result in results], \
+            'samples':sums['samples']}
+
+
+def _simulate_job(specification, batch_size, max_steps, steps, seed):
+    """@brief simulates a batch of trajectories in a worker process of the pool"""
+    return Simulator.simulate(specification, batch_size, max_steps, steps, seed)
@@ -0,0 +1,311 @@
+"""
+Error Propagation Library V6.
+Steady state and transient probabilities of DTMCs given by sparse transition matrices.
+"""
+
+import time
+
+import numpy as np
+# scipy is imported where it is used, PRISM runs of epl_prism do not need it
+
+class SolverError(Exception):
+    """@brief iterative method did not converge"""
+    pass
+
+class Solver(object):
+    """@brief Solver class, direct sparse solution of small systems, iterations up to
+    the tolerance for large ones, several initial distributions are solved together"""
+
+    methods = ['gauss_seidel', 'power']
+
+    def __init__(self, tolerance=1e-10, max_iterations=100000, direct_limit=50000, \
+        method='gauss_seidel', topological=True):
+        """@brief Constructor, systems with up to direct_limit unknowns are solved directly,
+        topological=True solves larger systems by their strongly connected components
+        one after another, directly or iteratively depending on their sizes"""
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self.direct_limit = direct_limit
+        self.method = method
+        self.topological = topological
+        # [{'states', 'method', 'time'}] of the last linear system or of its sccs,
+        # the acyclic states of a topological solution are summarized in a single entry
+        self.timings = []
+
+    @staticmethod
+    def get_bsccs(matrix):
+        """@brief returns [scc labels of states, list of arrays of states of bottom sccs]"""
+        import scipy.sparse
+        import scipy.sparse.csgraph
+        n_sccs, labels = scipy.sparse.csgraph.connected_components(matrix, directed=True, \
+            connection='strong')
+        coo = matrix.tocoo()
+        leaving = labels[coo.row] != labels[coo.col]
+        bottom = np.ones(n_sccs, dtype=bool)
+        bottom[labels[coo.row[leaving]]] = False
+        bottom_labels = np.nonzero(bottom)[0]
+        order = np.argsort(labels, kind='stable')
+        bounds = np.searchsorted(labels[order], np.arange(n_sccs + 1))
+        return [labels, [order[bounds[label]:bounds[label + 1]] for label in bottom_labels]]
+
+    def __iterate(self, matrix, rhs, split):
+        """@brief solves x = rhs + matrix x for the columns of rhs, split=True is Gauss-Seidel"""
+        import scipy.sparse
+        import scipy.sparse.linalg
+        solution = rhs.copy()
+        if split:
+            # (I - lower) x_{k+1} = rhs + upper x_k
+            lower = (scipy.sparse.identity(matrix.shape[0], format='csr') - \
+                scipy.sparse.tril(matrix, format='csr')).tocsr()
+            upper = scipy.sparse.triu(matrix, k=1, format='csr')
+        for _ in range(self.max_iterations):
+            if split:
+                new_solution = scipy.sparse.linalg.spsolve_triangular(lower, \
+                    rhs + upper @ solution, lower=True)
+            else:
+                new_solution = rhs + matrix @ solution
+            difference = np.max(np.abs(new_solution - solution)) if solution.size else 0.0
+            solution = new_solution
+            if difference <= self.tolerance:
+                return solution
+        raise SolverError("No convergence after " + str(self.max_iterations) + " iterations")
+
+    @staticmethod
+    def get_scc_levels(matrix, labels, n_sccs):
+        """@brief returns the level of every scc, the sccs of level 0 have no transitions to other
+        sccs, the sccs of level i only to the sccs of the levels below i"""
+        import scipy.sparse
+        coo = matrix.tocoo()
+        leaving = (labels[coo.row] != labels[coo.col]) & (coo.data != 0)
+        edges = np.unique(np.column_stack([labels[coo.row[leaving]], \
+            labels[coo.col[leaving]]]), axis=0).reshape(-1, 2)
+        remaining = np.bincount(edges[:, 0], minlength=n_sccs)
+        # predecessors of every scc in the condensed graph
+        predecessors = scipy.sparse.csr_matrix((np.ones(len(edges)), (edges[:, 1], edges[:, 0])), \
+            shape=(n_sccs, n_sccs))
+        levels = np.full(n_sccs, -1)
+        current = np.nonzero(remaining == 0)[0]
+        level = 0
+        while len(current):
+            levels[current] = level
+            sources = predecessors[current].indices
+            np.subtract.at(remaining, sources, 1)
+            current = np.unique(sources[remaining[sources] == 0])
+            level += 1
+        return levels
+
+    def __solve_direct_or_iterative(self, matrix, rhs):
+        """@brief solves x = rhs + matrix x, directly or iteratively depending on the size"""
+        import scipy.sparse
+        import scipy.sparse.linalg
+        if matrix.shape[0] <= self.direct_limit:
+            system = scipy.sparse.identity(matrix.shape[0], format='csc') - matrix.tocsc()
+            return scipy.sparse.linalg.splu(system).solve(np.ascontiguousarray(rhs))
+        return self.__iterate(matrix.tocsr(), rhs, self.method == 'gauss_seidel')
+
+    def __solve_topological(self, matrix, rhs):
+        """@brief solves x = rhs + matrix x scc by scc in reverse topological order, the acyclic
+        states of a level together without a solver, records the timings"""
+        import scipy.sparse
+        import scipy.sparse.csgraph
+        matrix = matrix.tocsr()
+        n_sccs, labels = scipy.sparse.csgraph.connected_components(matrix, directed=True, \
+            connection='strong')
+        levels = Solver.get_scc_levels(matrix, labels, n_sccs)
+        sizes = np.bincount(labels, minlength=n_sccs)
+        state_levels = levels[labels]
+        order = np.argsort(state_levels, kind='stable')
+        bounds = np.searchsorted(state_levels[order], np.arange(levels.max() + 2))
+        scc_order = np.argsort(labels, kind='stable')
+        scc_bounds = np.searchsorted(labels[scc_order], np.arange(n_sccs + 1))
+        diagonal = matrix.diagonal()
+        solution = np.zeros(rhs.shape)
+        values = np.zeros(rhs.shape)
+        self.timings = []
+        acyclic = {'states':0, 'method':'acyclic', 'time':0.0}
+        for level in range(levels.max() + 1):
+            start = time.time()
+            states = order[bounds[level]:bounds[level + 1]]
+            # the states of the levels below are solved, the others are still 0
+            values[states] = rhs[states] + matrix[states] @ solution
+            single = states[sizes[labels[states]] == 1]
+            # a single state with a self loop: x = b + p x
+            solution[single] = (values[single].T / (1.0 - diagonal[single])).T
+            acyclic['states'] += len(single)
+            acyclic['time'] += time.time() - start
+            for label in np.unique(labels[states[sizes[labels[states]] > 1]]):
+                start = time.time()
+                scc = scc_order[scc_bounds[label]:scc_bounds[label + 1]]
+                solution[scc] = self.__solve_direct_or_iterative(matrix[scc][:, scc], values[scc])
+                self.timings.append({'states':len(scc), 'method':'direct' \
+                    if len(scc) <= self.direct_limit else self.method, \
+                    'time':time.time() - start})
+        self.timings.append(acyclic)
+        return solution
+
+    def __solve(self, matrix, rhs):
+        """@brief solves x = rhs + matrix x, small systems directly at once"""
+        if self.topological and matrix.shape[0] > self.direct_limit:
+            return self.__solve_topological(matrix, rhs)
+        start = time.time()
+        solution = self.__solve_direct_or_iterative(matrix, rhs)
+        self.timings = [{'states':matrix.shape[0], 'method':'direct' \
+            if matrix.shape[0] <= self.direct_limit else self.method, 'time':time.time() - start}]
+        return solution
+
+    def __solve_visits(self, matrix, transient, initial):
+        """@brief expected numbers of visits of the transient states, rows of initial are the
+        initial distributions restricted to the transient states"""
+        # visits = initial + visits Q, i.e. (I - Q^T) visits^T = initial^T
+        return self.__solve(matrix[transient][:, transient].T, initial.T).T
+
+    def __solve_stationary(self, matrix):
+        """@brief stationary distribution of an irreducible chain"""
+        import scipy.sparse
+        import scipy.sparse.linalg
+        size = matrix.shape[0]
+        if size == 1:
+            return np.ones(1)
+        if size <= self.direct_limit:
+            # pi (P - I) = 0 with the last equation replaced by sum(pi) = 1
+            system = (matrix.T - scipy.sparse.identity(size, format='csr')).tolil()
+            system[size - 1, :] = np.ones(size)
+            rhs = np.zeros(size)
+            rhs[size - 1] = 1.0
+            solution = scipy.sparse.linalg.spsolve(system.tocsc(), rhs)
+        else:
+            # the lazy chain (P + I)/2 has the same stationary distribution and is aperiodic
+            lazy = ((matrix.T + scipy.sparse.identity(size, format='csr')) * 0.5).tocsr()
+            solution = np.full(size, 1.0 / size)
+            for _ in range(self.max_iterations):
+                new_solution = lazy @ solution
+                difference = np.max(np.abs(new_solution - solution))
+                solution = new_solution
+                if difference <= self.tolerance:
+                    break
+            else:
+                raise SolverError("No convergence after " + \
+                    str(self.max_iterations) + " iterations")
+        solution = np.maximum(solution, 0.0)
+        return solution / solution.sum()
+
+    def steady_state(self, matrix, initial):
+        """@brief long run probabilities (PRISM -ss) for every row of initial,
+        mass reaching each bottom scc is distributed by its stationary distribution"""
+        import scipy.sparse
+        matrix = scipy.sparse.csr_matrix(matrix)
+        initial = np.atleast_2d(np.asarray(initial, dtype=float))
+        _, bsccs = Solver.get_bsccs(matrix)
+        in_bscc = np.zeros(matrix.shape[0], dtype=bool)
+        for bscc in bsccs:
+            in_bscc[bscc] = True
+        transient = np.nonzero(~in_bscc)[0]
+        # mass entering the states of the bottom sccs
+        absorbed = initial.copy()
+        absorbed[:, transient] = 0.0
+        if len(transient):
+            visits = self.__solve_visits(matrix, transient, initial[:, transient])
+            absorbed += (matrix[transient].T @ visits.T).T
+            absorbed[:, transient] = 0.0
+        result = np.zeros_like(initial)
+        for bscc in bsccs:
+            mass = absorbed[:, bscc].sum(axis=1)
+            if not mass.any():
+                continue
+            stationary = self.__solve_stationary(matrix[bscc][:, bscc])
+            result[:, bscc] = np.outer(mass, stationary)
+        return result
+
+    @staticmethod
+    def get_backward_reachable(matrix, targets, allowed=None):
+        """@brief returns the mask of the states that reach targets through allowed states"""
+        import scipy.sparse
+        import scipy.sparse.csgraph
+        size = matrix.shape[0]
+        coo = scipy.sparse.coo_matrix(matrix)
+        keep = coo.data > 0
+        if allowed is not None:
+            keep &= np.asarray(allowed, dtype=bool)[coo.row]
+        sources = np.nonzero(targets)[0]
+        # reversed edges and an extra state size with edges to all targets
+        graph = scipy.sparse.csr_matrix((np.ones(keep.sum() + len(sources)), \
+            (np.concatenate([coo.col[keep], np.full(len(sources), size)]), \
+            np.concatenate([coo.row[keep], sources]))), shape=(size + 1, size + 1))
+        reached = np.zeros(size + 1, dtype=bool)
+        reached[scipy.sparse.csgraph.breadth_first_order(graph, size, directed=True, \
+            return_predecessors=False)] = True
+        return reached[:size]
+
+    def reachability(self, matrix, targets):
+        """@brief probability to reach targets (PRISM P=? [ F targets ]) from every state"""
+        import scipy.sparse
+        matrix = scipy.sparse.csr_matrix(matrix)
+        targets = np.asarray(targets, dtype=bool)
+        # states that cannot reach targets have probability 0 without solving
+        unknown = np.nonzero(Solver.get_backward_reachable(matrix, targets) & ~targets)[0]
+        result = targets.astype(float)
+        if len(unknown):
+            rhs = np.asarray(matrix[unknown][:, np.nonzero(targets)[0]].sum(axis=1)).reshape(-1)
+            result[unknown] = self.__solve(matrix[unknown][:, unknown], rhs)
+        return np.clip(result, 0.0, 1.0)
+
+    def expected_reward(self, matrix, targets, reward):
+        """@brief expected reward cumulated until targets (PRISM R=? [ F targets ]) from every
+        state, infinite if targets are not reached with probability 1"""
+        import scipy.sparse
+        matrix = scipy.sparse.csr_matrix(matrix)
+        targets = np.asarray(targets, dtype=bool)
+        never = ~Solver.get_backward_reachable(matrix, targets)
+        # reaching the states that never reach targets has a probability below 1
+        below_one = Solver.get_backward_reachable(matrix, never, ~targets)
+        unknown = np.nonzero(~below_one & ~targets)[0]
+        result = np.where(below_one, np.inf, 0.0)
+        if len(unknown):
+            result[unknown] = self.__solve(matrix[unknown][:, unknown], \
+                np.asarray(reward, dtype=float)[unknown])
+        return result
+
+    @staticmethod
+    def transient(matrix, initial, steps):
+        """@brief probabilities after the given number of steps (PRISM -tr)
+        for every row of initial"""
+        import scipy.sparse
+        transposed = scipy.sparse.csr_matrix(matrix).T.tocsr()
+        distribution = np.atleast_2d(np.asarray(initial, dtype=float)).T
+        for _ in range(steps):
+            distribution = transposed @ distribution
+        return distribution.T
+
+    @staticmethod
+    def time_series(matrix, initial, steps, targets=None, rewards=None):
+        """@brief propagates the initial distribution once and records at every step t of steps:
+        'P' = probability to reach targets within t steps (PRISM P=? [ F<=t ]) and the
+        cumulative rewards (R=? [ C<=t ]) of rewards = {name:reward of states}"""
+        import scipy.sparse
+        matrix = scipy.sparse.csr_matrix(matrix)
+        transposed = matrix.T.tocsr()
+        distribution = np.asarray(initial, dtype=float)
+        rewards = rewards if rewards else {}
+        cumulated = {name:0.0 for name in rewards}
+        results = {name:[] for name in rewards}
+        if targets is not None:
+            # targets are absorbing, their mass is the probability to reach them
+            targets = np.asarray(targets, dtype=bool)
+            absorbing = (scipy.sparse.diags((~targets).astype(float)) @ matrix + \
+                scipy.sparse.diags(targets.astype(float))).T.tocsr()
+            reached = distribution.copy()
+            results['P'] = []
+        step = 0
+        for requested in steps:
+            while step < requested:
+                for name, reward in rewards.items():
+                    cumulated[name] += distribution @ reward
+                distribution = transposed @ distribution
+                if targets is not None:
+                    reached = absorbing @ reached
+                step += 1
+            for name in rewards:
+                results[name].append(float(cumulated[name]))
+            if targets is not None:
+                results['P'].append(float(reached[targets].sum()))
+        return results
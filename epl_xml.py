@@ -69,12 +69,12 @@ class XML(object):
     @staticmethod
     def __load_prism_commands(element_node, name, model):
         """@brief loads model elements"""
-        prism_cmds = element_node.getElementsByTagName('cfc')
-        for prism_cmd in prism_cmds:
-            model.elements[name]['cf_prism_commands'].append(prism_cmd.firstChild.nodeValue)
-        prism_cmds = element_node.getElementsByTagName('epc')
-        for prism_cmd in prism_cmds:
-            model.elements[name]['ep_prism_commands'].append(prism_cmd.firstChild.nodeValue)
+        cf_prism_commands = [prism_cmd.firstChild.nodeValue \
+            for prism_cmd in element_node.getElementsByTagName('cfc')]
+        ep_prism_commands = [prism_cmd.firstChild.nodeValue \
+            for prism_cmd in element_node.getElementsByTagName('epc')]
+        if cf_prism_commands or ep_prism_commands:
+            model.update_element_prism_commands(name, cf_prism_commands, ep_prism_commands)
 
     @staticmethod
     def __load_failures(model_node, model):
@@ -116,7 +116,7 @@ class XML(object):
                 if el_value['sub_model']:
                     if not el_name in models:
                         model.logger.error("No sub model for \"" + el_name + "\"")
-                    cur_model.elements[el_name]['sub_model'] = models[el_name]
+                    cur_model.update_element_sub_model(el_name, models[el_name])
         #print(model.elements)
         model.logger.message("The model has been loaded from file \"" + \
             file_name + "\"")
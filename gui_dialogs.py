@@ -160,8 +160,8 @@ class ElementPropertiesDialog(QtGui.QDialog):
                 self.cf_commands_te.append(cfc)
 
     def save_cfc(self):
-        self.element['cf_prism_commands'] = \
-            [cfc for cfc in self.cf_commands_te.toPlainText().split('\n') if cfc]
+        self.model.update_element_prism_commands(self.el_name, cf_prism_commands=\
+            [cfc for cfc in self.cf_commands_te.toPlainText().split('\n') if cfc])
         self.model_view.draw_model()
 
     def def_epc(self):
@@ -178,6 +178,6 @@ class ElementPropertiesDialog(QtGui.QDialog):
 
     def save_epc(self):
         if not self.element['sub_model']:
-            self.element['ep_prism_commands'] = \
-            [epc for epc in self.ep_commands_te.toPlainText().split('\n') if epc]
+            self.model.update_element_prism_commands(self.el_name, ep_prism_commands=\
+            [epc for epc in self.ep_commands_te.toPlainText().split('\n') if epc])
         self.model_view.draw_model()
@@ -3,6 +3,7 @@ ErrorPro V6.
 PySide GUI main window class.
 """
 
+import os
 import collections
 import traceback
 
@@ -12,6 +13,7 @@ from PySide import QtCore
 import epl_model
 import epl_logger
 import epl_prism
+import epl_cache
 import epl_checker
 import epl_xml
 
@@ -67,8 +69,9 @@ class MainWindow(QtGui.QMainWindow):
         self.model = epl_model.Model(self.logger)
         # XML related functions
         self.xml = epl_xml.XML()
-        # PRISM related functions
-        self.prism = epl_prism.PRISM()
+        # PRISM related functions, results are cached between the sessions
+        self.prism = epl_prism.PRISM(cache=epl_cache.Cache(\
+            os.path.join(os.path.expanduser("~"), ".errorpro", "cache")))
         # checking functions
         self.checker = epl_checker.Checker()
         # top-level model
@@ -0,0 +1,69 @@
+"""
+Error Propagation Library V6.
+Test configuration, the modules of the library are imported from the repository root.
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+# the stand-in of the PRISM executable copies the prepared outputs to the files of the export
+# options and logs its working directory, arguments and the model and properties it got
+FAKE_PRISM = """#!{python}
+import json, os, shutil, sys
+bin_dir = os.path.dirname(os.path.abspath(__file__))
+args = sys.argv[1:]
+inputs = [open(arg).read() for arg in args[:2] if not arg.startswith("-")]
+with open(os.path.join(bin_dir, "calls.log"), "a") as log:
+    log.write(json.dumps({{'cwd':os.getcwd(), 'args':args, 'inputs':inputs}}) + "\\n")
+outputs = {{'-exportresults':'results', '-exportss':'ss_tr', '-exporttr':'ss_tr', \\
+    '-exportstates':'states'}}
+for i, arg in enumerate(args):
+    if arg in outputs and os.path.exists(os.path.join(bin_dir, outputs[arg])):
+        shutil.copy(os.path.join(bin_dir, outputs[arg]), args[i + 1].split(":")[0])
+"""
+
+class FakePrism(object):
+    """@brief FakePrism class, the PRISM executable of the tests"""
+
+    def __init__(self, bin_dir):
+        """@brief Constructor, installs the executable in bin_dir"""
+        self.bin_dir = bin_dir
+        self.executable = os.path.join(bin_dir, "prism")
+        with open(self.executable, 'w') as script:
+            script.write(FAKE_PRISM.format(python=sys.executable))
+        os.chmod(self.executable, 0o755)
+
+    def install(self, prism):
+        """@brief lets a PRISM object run the fake executable"""
+        prism.prism_dir = self.bin_dir
+        prism.prism_executable = "./prism"
+        return prism
+
+    def set_outputs(self, results=None, ss_tr=None, states=None):
+        """@brief contents of the exported results, probabilities and states"""
+        for name, content in [['results', results], ['ss_tr', ss_tr], ['states', states]]:
+            if content is not None:
+                with open(os.path.join(self.bin_dir, name), 'w') as output_file:
+                    output_file.write(content)
+
+    def get_calls(self):
+        """@brief returns [{'cwd', 'args', 'inputs'}] of all calls"""
+        log_name = os.path.join(self.bin_dir, "calls.log")
+        if not os.path.exists(log_name):
+            return []
+        with open(log_name) as log:
+            return [json.loads(line) for line in log]
+
+@pytest.fixture
+def fake_prism(tmp_path):
+    """@brief PRISM executable that returns the prepared outputs"""
+    bin_dir = tmp_path / "prism_bin"
+    bin_dir.mkdir()
+    return FakePrism(str(bin_dir))
@@ -0,0 +1,55 @@
+"""
+Error Propagation Library V6.
+Tests of the on-disk cache of PRISM results.
+"""
+
+import os
+
+import epl_cache
+
+def test_round_trip(tmp_path):
+    """@brief a stored value is read back, unknown keys are misses"""
+    cache = epl_cache.Cache(str(tmp_path / "cache"))
+    key = epl_cache.Cache.make_key("model", "properties", ["-maxiters", "100"])
+    assert cache.get(key) is None
+    cache.put(key, {'results':[0.5, 0.25]})
+    assert cache.get(key) == {'results':[0.5, 0.25]}
+    statistics = cache.statistics()
+    assert [statistics['hits'], statistics['misses'], statistics['entries']] == [1, 1, 1]
+    assert statistics['hit_rate'] == 0.5
+
+def test_make_key():
+    """@brief keys depend on the boundaries of the parts"""
+    assert epl_cache.Cache.make_key("ab", "c") != epl_cache.Cache.make_key("a", "bc")
+    assert epl_cache.Cache.make_key("a", 1) == epl_cache.Cache.make_key("a", "1")
+
+def test_corrupt_entry_is_miss(tmp_path):
+    """@brief an entry that is not json is a miss"""
+    cache = epl_cache.Cache(str(tmp_path))
+    key = epl_cache.Cache.make_key("model")
+    with open(os.path.join(str(tmp_path), key + ".json"), 'w') as entry_file:
+        entry_file.write("{")
+    assert cache.get(key) is None
+    assert cache.misses == 1
+
+def test_evict_least_recently_used(tmp_path):
+    """@brief the oldest entries are removed until the cache fits into max_size"""
+    cache = epl_cache.Cache(str(tmp_path))
+    keys = [epl_cache.Cache.make_key(i) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, "x" * 100)
+        os.utime(os.path.join(str(tmp_path), key + ".json"), (i, i))
+    entry_size = cache.statistics()['size'] // 3
+    cache.max_size = 2 * entry_size
+    cache.evict()
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[1]) == "x" * 100
+    assert cache.get(keys[2]) == "x" * 100
+
+def test_clear(tmp_path):
+    """@brief clear removes all entries and resets the statistics"""
+    cache = epl_cache.Cache(str(tmp_path))
+    cache.put(epl_cache.Cache.make_key("model"), 1)
+    cache.get(epl_cache.Cache.make_key("model"))
+    assert cache.clear()
+    assert cache.statistics() == {'hits':0, 'misses':0, 'hit_rate':0.0, 'entries':0, 'size':0}
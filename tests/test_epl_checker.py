@@ -0,0 +1,51 @@
+"""
+Error Propagation Library V6.
+Tests of the checks of commands and failures on the parsed syntax tree.
+"""
+
+import pytest
+
+import epl_checker
+import epl_logger
+import epl_model
+
+@pytest.fixture
+def model():
+    """@brief Src writes x, Work reads it, the control flow is a loop"""
+    test_model = epl_model.Model(epl_logger.Logger())
+    test_model.add_element('Src')
+    test_model.set_initial_element('Src')
+    test_model.add_element('Work')
+    test_model.add_control_flow('Src', 'Work')
+    test_model.add_control_flow('Work', 'Src')
+    test_model.add_data('x')
+    test_model.add_data_flow('Src', 'x')
+    test_model.add_data_flow('x', 'Work')
+    test_model.elements['Src']['ep_prism_commands'] = ["true -> 0.9:(x'=ok) + 0.1:(x'=error);"]
+    return test_model
+
+def test_correct_model(model):
+    """@brief the model and its default commands are correct"""
+    model.add_failure('Fail', 'x=error & cf=Work')
+    checker = epl_checker.Checker()
+    assert checker.check(model)
+    assert checker.check_failure(model, 'Fail')
+
+@pytest.mark.parametrize("command", ["cf=Work -> (cf'=Work);", "cf=Src -> (cf'=Src);", \
+    "cf=Src -> (cf'=Work"])
+def test_bad_cf_commands(model, command):
+    """@brief cf commands need the element in the guard and existing cf arcs as targets"""
+    model.elements['Src']['cf_prism_commands'] = [command]
+    assert not epl_checker.Checker().check_element(model, 'Src')
+
+@pytest.mark.parametrize("command", ["true -> 0.9:(x'=ok) + 0.1:(x'=bogus);", \
+    "true -> (y'=ok);", "true -> (x'=ok"])
+def test_bad_ep_commands(model, command):
+    """@brief unknown values, variables that are not df outputs and syntax errors"""
+    model.elements['Src']['ep_prism_commands'] = [command]
+    assert not epl_checker.Checker().check_element(model, 'Src')
+
+def test_bad_failure(model):
+    """@brief failures may only reference data, their values and elements"""
+    model.add_failure('Fail', 'x=unknown')
+    assert not epl_checker.Checker().check_failure(model, 'Fail')
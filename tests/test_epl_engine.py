@@ -0,0 +1,216 @@
+"""
+Error Propagation Library V6.
+Tests of the in-process computations on EPL models.
+"""
+
+import numpy as np
+import pytest
+
+import epl_engine
+import epl_logger
+import epl_model
+import epl_parser
+import epl_prism
+import epl_solver
+
+def make_repeated_model(repetitions=3):
+    """@brief Work keeps z ok with probability 0.9 as long as x is ok"""
+    model = epl_model.Model(epl_logger.Logger())
+    model.add_element('Work', repetitions=repetitions)
+    model.set_initial_element('Work')
+    model.add_data('x', values=['ok', 'error'], initial_value='ok')
+    model.add_data('z', values=['ok', 'error'], initial_value='ok')
+    model.add_data_flow('x', 'Work')
+    model.add_data_flow('Work', 'z')
+    model.elements['Work']['ep_prism_commands'] = \
+        ["x=ok & z=ok -> 0.9:(z'=ok) + 0.1:(z'=error);", "x=error -> (z'=error);"]
+    return model
+
+@pytest.mark.parametrize("n", [0, 1, 2, 5, 13])
+def test_matrix_power(n):
+    """@brief repeated squaring gives the n-th power of a stochastic matrix"""
+    matrix = np.array([[0.5, 0.5, 0.0], [0.1, 0.6, 0.3], [0.0, 0.2, 0.8]])
+    assert np.allclose(epl_engine.Engine.matrix_power(matrix, n), \
+        np.linalg.matrix_power(matrix, n))
+
+def test_compute_repetitions():
+    """@brief distributions after n repetitions for every input combination,
+    deadlocks are self loops"""
+    model = make_repeated_model()
+    # ok=0, error=1
+    results = epl_engine.Engine.compute_repetitions(model, 'Work', [{'x':'ok'}, {'x':'error'}])
+    [probs, state_lines] = results[0]
+    assert state_lines == ["(x,z)", "0:(0,0)", "1:(0,1)"]
+    assert np.allclose(probs, [0.9 ** 3, 1 - 0.9 ** 3])
+    assert results[1] == [[1.0], ["(x,z)", "3:(1,1)"]]
+
+@pytest.mark.parametrize("n", [1, 2, 4, 7])
+def test_repetitions_transient(n):
+    """@brief the power of the local matrix and the repetitions are n transient steps"""
+    model = make_repeated_model(repetitions=n)
+    model.elements['Work']['ep_prism_commands'] = ["x=ok & z=ok -> 0.9:(z'=ok) + " \
+        "0.1:(z'=error);", "x=ok & z=error -> 0.5:(z'=ok) + 0.5:(z'=error);", \
+        "x=error -> (z'=error);"]
+    # ok=0, error=1
+    states, matrix, initial = epl_engine.Engine.build_local_matrix(model, 'Work', ['x', 'z'], \
+        [[0, 0], [1, 0]])
+    starts = np.identity(len(states))[initial]
+    transient = epl_solver.Solver.transient(matrix, starts, n)
+    assert np.allclose(epl_engine.Engine.matrix_power(matrix.toarray(), n)[initial], transient)
+    results = epl_engine.Engine.compute_repetitions(model, 'Work', [{'x':'ok'}, {'x':'error'}])
+    for [probs, state_lines], distribution in zip(results, transient):
+        indexes = [int(line.split(":")[0]) for line in state_lines[1:]]
+        assert np.allclose(probs, distribution[indexes])
+        assert np.isclose(sum(probs), 1.0)
+
+def test_python_engine(fake_prism, tmp_path):
+    """@brief the python engine runs no PRISM, values out of range fall back to PRISM"""
+    prism = fake_prism.install(epl_prism.PRISM(no_output=True, temp_dir=str(tmp_path), \
+        engine="python"))
+    model = make_repeated_model()
+    commands = prism.compute_repetitions(model, 'Work')
+    assert commands[1] == "(x=error) -> 1.0:(z'=error);"
+    assert commands[0].startswith("(x=ok) -> ")
+    assert fake_prism.get_calls() == []
+    model.elements['Work']['ep_prism_commands'][1] = "x=error -> (z'=5);"
+    fake_prism.set_outputs(ss_tr="1.0\n", states="(x,z)\n0:(1,1)\n")
+    prism.compute_repetitions(model, 'Work')
+    assert len(fake_prism.get_calls()) == 2
+
+def make_flat_model():
+    """@brief Src writes x0 in a loop, Fail = x0 is error"""
+    model = epl_model.Model(epl_logger.Logger())
+    model.add_element('Src')
+    model.set_initial_element('Src')
+    model.add_control_flow('Src', 'Src')
+    model.add_data('x0')
+    model.add_data_flow('Src', 'x0')
+    model.elements['Src']['ep_prism_commands'] = ["true -> 0.95:(x0'=ok) + 0.05:(x0'=error);"]
+    model.elements['Src']['time'] = 2.0
+    model.add_failure('Fail', 'x0=error')
+    return model
+
+def test_build_dtmc():
+    """@brief the states, transitions, labels and rewards of the generated PRISM model"""
+    dtmc = epl_engine.Engine.build_dtmc(make_flat_model(), time_reward=True)
+    # ok=0, error=1
+    assert dtmc.get_state_lines() == ["(cf,x0)", "0:(0,0)", "1:(0,1)"]
+    assert dtmc.initial == [0]
+    assert np.allclose(dtmc.matrix.toarray(), [[0.95, 0.05], [0.95, 0.05]])
+    assert dtmc.labels['Fail'].tolist() == [False, True]
+    assert dtmc.rewards['time'].tolist() == [2.0, 2.0]
+    dtmc = epl_engine.Engine.build_dtmc(make_flat_model(), \
+        init_combinations=[{'x0':'ok'}, {'x0':'error'}])
+    assert dtmc.initial == [0, 1]
+    assert dtmc.get_initial_distribution().tolist() == [0.5, 0.5]
+
+def test_uniform_choice():
+    """@brief several enabled commands are chosen uniformly"""
+    model = make_repeated_model(1)
+    model.elements['Work']['ep_prism_commands'] = ["true -> (z'=ok);", "x=ok -> (z'=error);"]
+    results = epl_engine.Engine.compute_repetitions(model, 'Work', [{'x':'ok'}, {'x':'error'}])
+    assert results == [[[0.5, 0.5], ["(x,z)", "0:(0,0)", "1:(0,1)"]], \
+        [[1.0], ["(x,z)", "2:(1,0)"]]]
+
+def test_python_engine_sub_models(fake_prism, tmp_path):
+    """@brief the steady states of sub models are computed without PRISM"""
+    prism = fake_prism.install(epl_prism.PRISM(no_output=True, temp_dir=str(tmp_path), \
+        engine="python"))
+    model = epl_model.Model(epl_logger.Logger())
+    model.add_element('Src')
+    model.set_initial_element('Src')
+    model.add_element('C0')
+    model.add_control_flow('Src', 'C0')
+    model.add_control_flow('C0', 'Src')
+    for d_name in ['x0', 'x1']:
+        model.add_data(d_name)
+    model.add_data_flow('Src', 'x0')
+    model.add_data_flow('x0', 'C0')
+    model.add_data_flow('C0', 'x1')
+    model.create_sub_model('C0')
+    sub_model = model.elements['C0']['sub_model']
+    sub_model.add_element('Work')
+    sub_model.set_initial_element('Work')
+    sub_model.add_data_flow('x0', 'Work')
+    sub_model.add_data_flow('Work', 'x1')
+    sub_model.elements['Work']['ep_prism_commands'] = \
+        ["x0=ok -> 0.75:(x1'=ok) + 0.25:(x1'=error);", "x0=error -> (x1'=error);"]
+    flat_model = prism.flatten(model)
+    assert flat_model.elements['C0']['ep_prism_commands'] == \
+        ["(x0=ok) -> 0.75:(x1'=ok) + 0.25:(x1'=error);", "(x0=error) -> 1.0:(x1'=error);"]
+    assert flat_model.elements['C0']['time'] == 1.0
+    assert fake_prism.get_calls() == []
+
+def test_parse_step_range():
+    """@brief ranges with and without the step, single steps"""
+    assert epl_prism.PRISM.parse_step_range("0:10:30") == [0, 10, 20, 30]
+    assert epl_prism.PRISM.parse_step_range("2:4") == [2, 3, 4]
+    assert epl_prism.PRISM.parse_step_range("7") == [7]
+
+def test_time_series():
+    """@brief the failure happens with 0.05 in every step after the first one"""
+    steps = [0, 1, 5, 20]
+    series = epl_engine.Engine.compute_time_series(make_flat_model(), 'Fail', steps)
+    assert np.allclose(series['P'], [1 - 0.95 ** step for step in steps])
+    n_failures = [0.05 * max(0, step - 1) for step in steps]
+    assert np.allclose(series['N_failures'], n_failures)
+    assert np.allclose(series['downtime'], [2.0 * n for n in n_failures])
+    assert np.allclose(series['time'], [2.0 * step for step in steps])
+
+def test_python_engine_time_series(fake_prism, tmp_path):
+    """@brief the time series of the python engine runs no PRISM"""
+    prism = fake_prism.install(epl_prism.PRISM(no_output=True, temp_dir=str(tmp_path), \
+        engine="python"))
+    res = prism.compute_P(make_flat_model(), 'Fail', show_plot=False, step_range="0:5:10")
+    assert res['steps'] == [0.0, 5.0, 10.0]
+    assert np.allclose(res['P'], [0.0, 1 - 0.95 ** 5, 1 - 0.95 ** 10])
+    assert fake_prism.get_calls() == []
+
+def test_python_engine_P_single_and_MTTF(fake_prism, tmp_path):
+    """@brief P and MTTF of the python engine run no PRISM, values out of range fall back
+    to PRISM"""
+    prism = fake_prism.install(epl_prism.PRISM(no_output=True, temp_dir=str(tmp_path), \
+        engine="python"))
+    model = make_flat_model()
+    assert np.isclose(prism.compute_P_single(model, 'Fail'), 1.0)
+    assert np.isclose(prism.compute_MTTF(model, 'Fail'), 40.0)
+    # Src stops with 0.5 after every step without the failure, P = 0.05 + 0.95 * 0.5 * P
+    model.add_element('End')
+    model.add_control_flow('Src', 'End')
+    assert np.isclose(prism.compute_P_single(model, 'Fail'), 0.05 / (1 - 0.95 * 0.5))
+    assert prism.compute_MTTF(model, 'Fail') == float('inf')
+    assert fake_prism.get_calls() == []
+    model.elements['Src']['ep_prism_commands'] = ["true -> (x0'=5);"]
+    fake_prism.set_outputs(results="Result\n0.5\n")
+    assert prism.compute_P_single(model, 'Fail') == 0.5
+    assert len([call for call in fake_prism.get_calls() if "-version" not in call['args']]) == 1
+
+def test_compute_reachability():
+    """@brief P and MTTF of all initial states from one table"""
+    model = make_flat_model()
+    model.add_failure('Never', 'x0=error & x0=ok')
+    table = epl_engine.Engine.compute_reachability(model, 'Fail', epl_solver.Solver())
+    # the failure happens with 0.05 in every step of 2 time units
+    assert np.allclose(table.lookup(), [1.0, 40.0])
+    assert table.lookup({'x0':'error'}) == [1.0, 0.0]
+    table = epl_engine.Engine.compute_reachability(model, 'Never', epl_solver.Solver(), \
+        init_combinations=[{}])
+    assert table.lookup() == [0.0, float('inf')]
+
+def test_execution_time():
+    """@brief the expected time until the control flow stops, infinite for endless loops"""
+    model = epl_model.Model(epl_logger.Logger())
+    for el_name, time in [['Start', 1.0], ['Left', 2.0], ['Right', 4.0], ['End', 0.5]]:
+        model.add_element(el_name)
+        model.elements[el_name]['time'] = time
+    model.set_initial_element('Start')
+    for from_name, to_name in [['Start', 'Left'], ['Start', 'Right'], ['Left', 'End'], \
+        ['Right', 'End']]:
+        model.add_control_flow(from_name, to_name)
+    # the default branching is uniform
+    assert epl_engine.Engine.compute_execution_time(model) == 1.0 + 0.5 * (2.0 + 4.0) + 0.5
+    model.add_control_flow('End', 'Start')
+    assert epl_engine.Engine.compute_execution_time(model) == float('inf')
+    model.elements['Start']['cf_prism_commands'] = ["cf=Start & x=ok -> (cf'=Left);"]
+    with pytest.raises(epl_parser.ParseError):
+        epl_engine.Engine.compute_execution_time(model)
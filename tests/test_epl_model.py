@@ -0,0 +1,71 @@
+"""
+Error Propagation Library V6.
+Tests of the model class.
+"""
+
+import epl_logger
+import epl_model
+
+def make_sub_model(prefix, probability="0.9"):
+    """@brief copies x to y through the elements In and Out and the inner data tmp,
+    all names start with the prefix"""
+    model = epl_model.Model(epl_logger.Logger())
+    model.add_element(prefix + 'In')
+    model.add_element(prefix + 'Out')
+    model.add_control_flow(prefix + 'In', prefix + 'Out')
+    model.set_initial_element(prefix + 'In')
+    for d_name in [prefix + 'x', prefix + 'tmp', prefix + 'y']:
+        model.add_data(d_name)
+    model.add_data_flow(prefix + 'x', prefix + 'In')
+    model.add_data_flow(prefix + 'In', prefix + 'tmp')
+    model.add_data_flow(prefix + 'tmp', prefix + 'Out')
+    model.add_data_flow(prefix + 'Out', prefix + 'y')
+    model.elements[prefix + 'In']['ep_prism_commands'] = [prefix + "x=ok -> " + probability + \
+        ":(" + prefix + "tmp'=ok) + 1-" + probability + ":(" + prefix + "tmp'=error);", \
+        prefix + "x=error -> (" + prefix + "tmp'=error);"]
+    model.add_failure(prefix + 'Fail', prefix + "y=error")
+    return model
+
+def test_rename_in_prism_text():
+    """@brief whole identifiers are renamed, values and numbers are kept"""
+    assert epl_model.Model.rename_in_prism_text("x=ok & x1<2.5 -> 0.9:(x'=error);", \
+        {'x':'y', 'ok':'ok'}) == "y=ok & x1<2.5 -> 0.9:(y'=error);"
+
+def test_structural_hash():
+    """@brief models that differ only in names have the same hash"""
+    first = make_sub_model('A')
+    second = make_sub_model('B')
+    assert first.get_structural_hash(['Ax'], ['Ay']) == second.get_structural_hash(['Bx'], ['By'])
+    # the order of adding data does not matter
+    third = make_sub_model('C')
+    third.data = dict(reversed(list(third.data.items())))
+    assert third.get_structural_hash(['Cx'], ['Cy']) == first.get_structural_hash(['Ax'], ['Ay'])
+    # the interface and the probabilities are a part of the structure
+    assert first.get_structural_hash(['Ay'], ['Ax']) != first.get_structural_hash(['Ax'], ['Ay'])
+    assert make_sub_model('A', "0.8").get_structural_hash(['Ax'], ['Ay']) != \
+        first.get_structural_hash(['Ax'], ['Ay'])
+
+def test_canonical_renaming():
+    """@brief the renamings of identical models map the same names to the same canonical names"""
+    first_form, first_renaming = make_sub_model('A').get_canonical_form(['Ax'], ['Ay'])
+    second_form, second_renaming = make_sub_model('B').get_canonical_form(['Bx'], ['By'])
+    assert first_form == second_form
+    assert {first_renaming[name]:'B' + name[1:] for name in first_renaming} == \
+        {canonical:name for name, canonical in second_renaming.items()}
+
+def test_touch():
+    """@brief changes get new versions, changes of a sub model are propagated to its host"""
+    model = make_sub_model('A')
+    version = model.get_version('AIn', 'Ax')
+    model.update_element_time('AOut', 2.0)
+    assert model.get_version('AIn', 'Ax') == version
+    assert model.get_version('AOut') > version[:1]
+    host = epl_model.Model(epl_logger.Logger())
+    host.add_element('Host')
+    host.add_element('Other')
+    host.update_element_sub_model('Host', model)
+    assert model.host == [host, 'Host']
+    versions = host.get_version('Host', 'Other')
+    model.touch('AIn')
+    assert host.get_version('Host') > versions[:1]
+    assert host.get_version('Other') == versions[1:]
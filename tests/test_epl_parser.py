@@ -0,0 +1,72 @@
+"""
+Error Propagation Library V6.
+Tests of the parser of PRISM commands and expressions.
+"""
+
+import numpy as np
+import pytest
+
+import epl_parser
+from epl_parser import Parser
+
+def test_precedence():
+    """@brief & binds stronger than |, arithmetic stronger than relations"""
+    expression = Parser.parse_prism_expression("a | b & c+1>2")
+    assert expression == ('bin', '|', ('var', 'a'), ('bin', '&', ('var', 'b'), \
+        ('bin', '>', ('bin', '+', ('var', 'c'), ('num', 1)), ('num', 2))))
+
+def test_expression_with_semicolon():
+    """@brief a failure formula can end with ';'"""
+    assert Parser.parse_prism_expression("x=ok;") == Parser.parse_prism_expression("x=ok")
+
+def test_command():
+    """@brief updates with and without probabilities, true as empty update"""
+    command = Parser.parse_prism_command("x=1 -> 0.5:(y'=2)&(z'=x) + 0.5:true;")
+    assert command['guard'] == ('bin', '=', ('var', 'x'), ('num', 1))
+    assert command['updates'] == [[('num', 0.5), {'y':('num', 2), 'z':('var', 'x')}], \
+        [('num', 0.5), {}]]
+    assert Parser.parse_prism_command("true -> (y'=1);")['updates'] == \
+        [[('num', 1), {'y':('num', 1)}]]
+
+@pytest.mark.parametrize("text", ["x=1 -> (y'=2);;", "x= -> (y'=2);", "x=1 (y'=2);", \
+    "x=1 -> (y'=2"])
+def test_syntax_errors(text):
+    """@brief incomplete commands and trailing tokens are errors"""
+    with pytest.raises(epl_parser.ParseError):
+        Parser.parse_prism_command(text)
+
+def test_evaluate():
+    """@brief scalar evaluation with short cut logical operators"""
+    env = {'x':3, 'ok':0}
+    assert epl_parser.evaluate(Parser.parse_prism_expression("x>2 ? mod(x, 2) : 0"), env) == 1
+    # y is not defined, the right operand is not evaluated
+    assert epl_parser.evaluate(Parser.parse_prism_expression("x<2 & y=1"), env) is False
+    with pytest.raises(epl_parser.ParseError):
+        epl_parser.evaluate(Parser.parse_prism_expression("y=1"), env)
+
+def test_left_associative():
+    """@brief the right operand of the same level keeps its brackets"""
+    expression = Parser.parse_prism_expression("a-(b-c)")
+    assert Parser.to_text(expression) == "a-(b-c)"
+    assert Parser.to_text(Parser.parse_prism_expression("(a-b)-c")) == "a-b-c"
+
+def test_command_to_text():
+    """@brief printed commands are parsed to the same command"""
+    text = "x=1 & !(y>2) -> 0.25:(y'=min(y+1, 3)) + 0.75:true;"
+    command = Parser.parse_prism_command(text)
+    assert Parser.parse_prism_command(Parser.command_to_text(command)) == command
+
+def test_get_references():
+    """@brief names of the guard, of the updates and the updated variables"""
+    references = Parser.get_references("x=ok & cf=A -> p:(y'=x) + (1-p):(z'=1);")
+    assert references == {'guard':frozenset(['x', 'ok', 'cf', 'A']), \
+        'updates':frozenset(['p', 'x']), 'targets':frozenset(['y', 'z'])}
+
+def test_compile_arrays():
+    """@brief compiled expressions are evaluated for whole arrays as the scalar evaluation"""
+    text = "x>=2 => max(x, y)-1=y | !(y<x)"
+    values = [[x, y] for x in range(4) for y in range(4)]
+    function = Parser.compile(Parser.parse_prism_expression(text))
+    result = function({'x':np.array([x for x, _ in values]), 'y':np.array([y for _, y in values])})
+    assert result.tolist() == [epl_parser.evaluate(Parser.parse_prism_expression(text), \
+        {'x':x, 'y':y}) for x, y in values]
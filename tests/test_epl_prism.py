@@ -0,0 +1,532 @@
+"""
+Error Propagation Library V6.
+Tests of the PRISM interface with a stand-in of the PRISM executable.
+"""
+
+import concurrent.futures
+import functools
+import os
+
+import pytest
+
+import epl_cache
+import epl_engine
+import epl_logger
+import epl_model
+import epl_prism
+import epl_prism_pool
+
+def test_run_in_own_directory(fake_prism, tmp_path):
+    """@brief a run writes its files into a new directory of temp_dir, which is removed"""
+    temp_dir = tmp_path / "runs"
+    temp_dir.mkdir()
+    prism = fake_prism.install(epl_prism.PRISM(no_output=True, temp_dir=str(temp_dir)))
+    fake_prism.set_outputs(results="Result\n0.25\n")
+    cwd = os.getcwd()
+    assert prism.run_prism("dtmc\n", "P=? [ F true ]") == ["Result", "0.25"]
+    assert os.getcwd() == cwd
+    [call] = fake_prism.get_calls()
+    assert os.path.dirname(call['cwd']) == str(temp_dir)
+    assert os.path.basename(call['cwd']).startswith("errorpro_")
+    assert call['inputs'] == ["dtmc\n", "P=? [ F true ]"]
+    # all paths are absolute, the directory is removed after the run
+    assert all(os.path.isabs(arg) for arg in call['args'][:2])
+    assert os.listdir(str(temp_dir)) == []
+
+def test_concurrent_runs(fake_prism, tmp_path):
+    """@brief concurrent runs use different directories"""
+    prism = fake_prism.install(epl_prism.PRISM(no_output=True, temp_dir=str(tmp_path)))
+    fake_prism.set_outputs(results="Result\n0.5\n")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda i: prism.run_prism("dtmc\n", "P=? [ F true ]"), \
+            range(8)))
+    assert results == [["Result", "0.5"]] * 8
+    assert len(set(call['cwd'] for call in fake_prism.get_calls())) == 8
+
+def test_step_range(fake_prism, tmp_path):
+    """@brief the results of a step range are exported as a csv matrix"""
+    prism = fake_prism.install(epl_prism.PRISM(no_output=True, temp_dir=str(tmp_path)))
+    fake_prism.set_outputs(results="step,Result\n0,0.0\n10,0.5\n")
+    assert prism.run_prism("dtmc\n", "P=? [ F<=step true ]", step_range="0:10:10") == \
+        ["step,Result", "0,0.0", "10,0.5"]
+    args = fake_prism.get_calls()[0]['args']
+    assert args[args.index("-const") + 1] == "step=0:10:10"
+    assert args[args.index("-exportresults") + 1].endswith(":csv,matrix")
+
+def make_repetitions_model():
+    """@brief Work reads x and writes z, it is repeated 3 times"""
+    model = epl_model.Model(epl_logger.Logger())
+    model.add_element('Work', repetitions=3)
+    model.set_initial_element('Work')
+    model.add_data('x', values=['ok', 'error'], initial_value='ok')
+    model.add_data('y', values=[0, 1, 2], initial_value=0)
+    model.add_data('z', values=['ok', 'error'], initial_value='ok')
+    model.add_data_flow('x', 'Work')
+    model.add_data_flow('y', 'Work')
+    model.add_data_flow('Work', 'z')
+    return model
+
+@pytest.mark.parametrize("jobs", [1, 3])
+def test_repetitions_jobs(fake_prism, tmp_path, jobs):
+    """@brief one run per input combination, the commands are in the order of the
+    combinations for any number of jobs"""
+    prism = fake_prism.install(epl_prism.PRISM(no_output=True, temp_dir=str(tmp_path)))
+    # the string values are encoded as ok=3, error=4 after the int values 0..2
+    fake_prism.set_outputs(ss_tr="0.75\n0.25\n", states="(x,y,z)\n0:(3,0,3)\n1:(3,0,4)\n")
+    commands = prism.compute_repetitions(make_repetitions_model(), 'Work', jobs=jobs)
+    assert commands == ["(x=" + x + ") & (y=" + str(y) + ") -> 0.75:(z'=ok) + 0.25:(z'=error);" \
+        for x in ['ok', 'error'] for y in range(3)]
+    calls = fake_prism.get_calls()
+    assert len(calls) == 6
+    assert all(call['args'][call['args'].index("-tr") + 1] == "3" for call in calls)
+
+def get_runs(fake_prism):
+    """@brief calls of the fake PRISM without the version queries"""
+    return [call for call in fake_prism.get_calls() if "-version" not in call['args']]
+
+def test_cache(fake_prism, tmp_path):
+    """@brief a run with the same model, properties and options is read from the cache"""
+    cache = epl_cache.Cache(str(tmp_path / "cache"))
+    prism = fake_prism.install(epl_prism.PRISM(no_output=True, temp_dir=str(tmp_path), \
+        cache=cache))
+    fake_prism.set_outputs(results="Result\n0.25\n")
+    for _ in range(2):
+        assert prism.run_prism("dtmc\n", "P=? [ F true ]") == ["Result", "0.25"]
+    assert len(get_runs(fake_prism)) == 1
+    prism.prism_options = ["-maxiters", "10"]
+    prism.run_prism("dtmc\n", "P=? [ F true ]")
+    assert len(get_runs(fake_prism)) == 2
+    assert cache.statistics()['hits'] == 1
+
+def test_cache_errors(fake_prism, tmp_path):
+    """@brief results that are not numbers are not cached, PRISM runs again"""
+    cache = epl_cache.Cache(str(tmp_path / "cache"))
+    prism = fake_prism.install(epl_prism.PRISM(no_output=True, temp_dir=str(tmp_path), \
+        cache=cache))
+    fake_prism.set_outputs(results="Result\nError: deadlock\n", ss_tr="NaN\n", \
+        states="(x,z)\n0:(0,0)\n")
+    model = make_repetitions_model()
+    model.remove_data('y')
+    for _ in range(2):
+        assert prism.run_prism("dtmc\n", "P=? [ F true ]") == ["Result", "Error: deadlock"]
+        prism.run_prism("dtmc\n", "P=? [ F<=step true ]", step_range="0:10:10")
+        prism.compute_repetitions(model, 'Work')
+    assert len(get_runs(fake_prism)) == 8
+    fake_prism.set_outputs(results="step,Result\n0,0.0\n10,0.5\n")
+    for _ in range(2):
+        prism.run_prism("dtmc\n", "P=? [ F<=step true ]", step_range="0:10:10")
+    assert len(get_runs(fake_prism)) == 9
+
+def make_hierarchical_model(n_compounds=2):
+    """@brief Src writes x0, the compound element C<i> copies x<i> to x<i+1> through its sub
+    model, the sub models differ only in names"""
+    model = epl_model.Model(epl_logger.Logger())
+    model.add_element('Src')
+    model.set_initial_element('Src')
+    model.add_data('x0')
+    model.add_data_flow('Src', 'x0')
+    model.elements['Src']['ep_prism_commands'] = ["true -> 0.95:(x0'=ok) + 0.05:(x0'=error);"]
+    previous = 'Src'
+    for i in range(n_compounds):
+        el_name, prefix, d_in, d_out = 'C' + str(i), 'S' + str(i), 'x' + str(i), 'x' + str(i + 1)
+        model.add_element(el_name)
+        model.add_control_flow(previous, el_name)
+        model.add_data(d_out)
+        model.add_data_flow(d_in, el_name)
+        model.add_data_flow(el_name, d_out)
+        model.create_sub_model(el_name)
+        sub_model = model.elements[el_name]['sub_model']
+        sub_model.add_element(prefix + 'In')
+        sub_model.add_element(prefix + 'Out')
+        sub_model.add_control_flow(prefix + 'In', prefix + 'Out')
+        sub_model.set_initial_element(prefix + 'In')
+        sub_model.add_data(prefix + 'tmp')
+        sub_model.add_data_flow(d_in, prefix + 'In')
+        sub_model.add_data_flow(prefix + 'In', prefix + 'tmp')
+        sub_model.add_data_flow(prefix + 'tmp', prefix + 'Out')
+        sub_model.add_data_flow(prefix + 'Out', d_out)
+        sub_model.elements[prefix + 'In']['ep_prism_commands'] = \
+            [d_in + "=ok -> 0.9:(" + prefix + "tmp'=ok) + 0.1:(" + prefix + "tmp'=error);", \
+            d_in + "=error -> (" + prefix + "tmp'=error);"]
+        previous = el_name
+    model.add_control_flow(previous, 'Src')
+    model.add_failure('Fail', 'x' + str(n_compounds) + '=error')
+    return model
+
+def test_identical_sub_models(fake_prism, tmp_path):
+    """@brief the second sub model reuses the renamed commands of the first one"""
+    prism = fake_prism.install(epl_prism.PRISM(no_output=True, temp_dir=str(tmp_path)))
+    # ok=0, error=1, the steady state of the sub model with the input x0
+    fake_prism.set_outputs(results="Result\n2.0\n", ss_tr="0.25\n0.75\n", \
+        states="(cf,x0,S0tmp,x1)\n0:(2,0,0,0)\n1:(2,0,1,1)\n")
+    model = prism.compute_sub_models_and_repetitions(make_hierarchical_model())
+    assert model.elements['C0']['ep_prism_commands'] == \
+        ["(x0=ok) -> 0.25:(x1'=ok) + 0.75:(x1'=error);", \
+        "(x0=error) -> 0.25:(x1'=ok) + 0.75:(x1'=error);"]
+    assert model.elements['C1']['ep_prism_commands'] == \
+        ["(x1=ok) -> 0.25:(x2'=ok) + 0.75:(x2'=error);", \
+        "(x1=error) -> 0.25:(x2'=ok) + 0.75:(x2'=error);"]
+    assert model.elements['C1']['time'] == 2.0
+    # two steady state runs for the inputs of C0, the execution time is computed in-process
+    assert len(get_runs(fake_prism)) == 2
+
+def test_identical_sub_models_names_of_values(fake_prism, tmp_path):
+    """@brief only the interface data are renamed in the reused commands, values with the
+    names of other parts of the first sub model are kept, the default commands are not a part
+    of the structure"""
+    prism = fake_prism.install(epl_prism.PRISM(no_output=True, temp_dir=str(tmp_path)))
+    fake_prism.set_outputs(results="Result\n2.0\n", ss_tr="0.25\n0.75\n", \
+        states="(cf,x0,S0tmp,x1)\n0:(2,0,0,0)\n1:(2,0,1,1)\n")
+    model = make_hierarchical_model()
+    sub_model = model.elements['C0']['sub_model']
+    sub_model.remove_element('S0Out')
+    sub_model.add_element('error')
+    sub_model.add_control_flow('S0In', 'error')
+    sub_model.add_data_flow('S0tmp', 'error')
+    sub_model.add_data_flow('error', 'x1')
+    for el_name, in_name in [['C0', 'S0In'], ['C1', 'S1In']]:
+        model.elements[el_name]['sub_model'].elements[in_name]['ep_prism_commands'] = []
+    model = prism.compute_sub_models_and_repetitions(model)
+    assert model.elements['C1']['ep_prism_commands'] == \
+        ["(x1=ok) -> 0.25:(x2'=ok) + 0.75:(x2'=error);", \
+        "(x1=error) -> 0.25:(x2'=ok) + 0.75:(x2'=error);"]
+    assert len(get_runs(fake_prism)) == 2
+
+def test_flatten(fake_prism, tmp_path):
+    """@brief the flat copy has no sub models, the model is unchanged and its memorized
+    abstractions are reused until it is edited"""
+    prism = fake_prism.install(epl_prism.PRISM(no_output=True, temp_dir=str(tmp_path)))
+    fake_prism.set_outputs(results="Result\n2.0\n", ss_tr="0.25\n0.75\n", \
+        states="(cf,x0,S0tmp,x1)\n0:(2,0,0,0)\n1:(2,0,1,1)\n")
+    model = make_hierarchical_model(1)
+    flat_model = prism.flatten(model)
+    assert flat_model.elements['C0']['sub_model'] is None
+    assert flat_model.elements['C0']['time'] == 2.0
+    assert model.elements['C0']['sub_model'] is not None
+    assert model.elements['C0']['ep_prism_commands'] == []
+    runs = len(get_runs(fake_prism))
+    assert prism.flatten(model).elements['C0']['ep_prism_commands'] == \
+        flat_model.elements['C0']['ep_prism_commands']
+    assert len(get_runs(fake_prism)) == runs
+    model.elements['C0']['sub_model'].update_element_prism_commands('S0In', \
+        ep_prism_commands=["x0=ok -> 0.8:(S0tmp'=ok) + 0.2:(S0tmp'=error);", \
+        "x0=error -> (S0tmp'=error);"])
+    prism.flatten(model)
+    assert len(get_runs(fake_prism)) > runs
+
+def test_edit_invalidates_sub_model(fake_prism, tmp_path):
+    """@brief only the edited sub model is computed again"""
+    prism = fake_prism.install(epl_prism.PRISM(no_output=True, temp_dir=str(tmp_path)))
+    fake_prism.set_outputs(results="Result\n2.0\n", ss_tr="0.25\n0.75\n", \
+        states="(cf,x0,S0tmp,x1)\n0:(2,0,0,0)\n1:(2,0,1,1)\n")
+    model = make_hierarchical_model()
+    prism.flatten(model)
+    runs = len(get_runs(fake_prism))
+    prism.flatten(model)
+    assert len(get_runs(fake_prism)) == runs
+    model.elements['C1']['sub_model'].update_element_prism_commands('S1In', \
+        ep_prism_commands=["x1=ok -> 0.8:(S1tmp'=ok) + 0.2:(S1tmp'=error);", \
+        "x1=error -> (S1tmp'=error);"])
+    flat_model = prism.flatten(model)
+    # two steady state runs of C1 only
+    calls = get_runs(fake_prism)[runs:]
+    assert len(calls) == 2
+    assert all("S1tmp" in call['inputs'][0] for call in calls)
+    assert flat_model.elements['C0']['ep_prism_commands'] == \
+        model.abstractions[('C0', 'sub_model')]['ep_prism_commands']
+
+def test_direct_edit_invalidates_abstractions(fake_prism, tmp_path):
+    """@brief sub models and repetitions edited without touch are computed again"""
+    prism = fake_prism.install(epl_prism.PRISM(no_output=True, temp_dir=str(tmp_path)))
+    fake_prism.set_outputs(results="Result\n2.0\n", ss_tr="0.25\n0.75\n", \
+        states="(cf,x0,S0tmp,x1)\n0:(2,0,0,0)\n1:(2,0,1,1)\n")
+    model = make_hierarchical_model()
+    prism.flatten(model)
+    runs = len(get_runs(fake_prism))
+    model.elements['C1']['sub_model'].elements['S1In']['ep_prism_commands'] = \
+        ["x1=ok -> 0.8:(S1tmp'=ok) + 0.2:(S1tmp'=error);", "x1=error -> (S1tmp'=error);"]
+    prism.flatten(model)
+    calls = get_runs(fake_prism)[runs:]
+    assert len(calls) == 2
+    assert all("0.8:(S1tmp'=ok)" in call['inputs'][0] for call in calls)
+    # repetitions
+    prism = epl_prism.PRISM(no_output=True, temp_dir=str(tmp_path), engine="python")
+    model = make_repetitions_model()
+    model.elements['Work']['ep_prism_commands'] = ["x=ok -> 0.5:(z'=ok) + 0.5:(z'=error);", \
+        "x=error -> (z'=error);"]
+    prism.flatten(model)
+    model.elements['Work']['ep_prism_commands'][0] = "x=ok -> (z'=ok);"
+    assert prism.flatten(model).elements['Work']['ep_prism_commands'][0] == \
+        "(x=ok) & (y=0) -> 1.0:(z'=ok);"
+
+def test_split_combinations():
+    """@brief the states of a single run are split by their tag and scaled by the number
+    of combinations"""
+    state_lines = ["(x,epl_init_id,z)", "0:(0,0,0)", "1:(0,1,1)", "2:(1,2,0)", "3:(1,0,1)"]
+    results = epl_prism.PRISM._PRISM__split_combinations([0.1, 0.2, 0.25, 0.05], \
+        state_lines, 3)
+    assert results == [[[0.30000000000000004, 0.15000000000000002], \
+        ["(x,epl_init_id,z)", "0:(0,0,0)", "3:(1,0,1)"]], \
+        [[0.6000000000000001], ["(x,epl_init_id,z)", "1:(0,1,1)"]], \
+        [[0.75], ["(x,epl_init_id,z)", "2:(1,2,0)"]]]
+
+@pytest.mark.parametrize("single_run", [False, True])
+def test_single_run(fake_prism, tmp_path, single_run):
+    """@brief a single run with an initial state per combination gives the commands of the
+    runs per combination"""
+    prism = fake_prism.install(epl_prism.PRISM(no_output=True, temp_dir=str(tmp_path), \
+        single_run=single_run))
+    model = make_repetitions_model()
+    model.remove_data('y')
+    # ok=0, error=1
+    if single_run:
+        fake_prism.set_outputs(ss_tr="0.3\n0.2\n0.1\n0.4\n", \
+            states="(x,z,epl_init_id)\n0:(0,0,0)\n1:(0,1,0)\n2:(1,0,1)\n3:(1,1,1)\n")
+    else:
+        fake_prism.set_outputs(ss_tr="0.6\n0.4\n", states="(x,z)\n0:(0,0)\n1:(0,1)\n")
+    assert prism.compute_repetitions(model, 'Work') == \
+        ["(x=ok) -> 0.6:(z'=ok) + 0.4:(z'=error);", \
+        "(x=error) -> " + ("0.2:(z'=ok) + 0.8:(z'=error);" if single_run else \
+        "0.6:(z'=ok) + 0.4:(z'=error);")]
+    calls = fake_prism.get_calls()
+    assert len(calls) == (1 if single_run else 2)
+    if single_run:
+        prism_model = calls[0]['inputs'][0]
+        assert "\tx : [0 .. 1];\n" in prism_model
+        assert "\tepl_init_id : [0 .. 1];\n" in prism_model
+        assert "init\n\tepl_init_id=0 & x=ok & z=ok |\n\tepl_init_id=1 & x=error & z=ok\n" \
+            "endinit\n" in prism_model
+
+def test_pool(fake_prism, tmp_path):
+    """@brief with a pool, PRISM runs are jobs of its workers"""
+    with epl_prism_pool.PrismPool(size=2, timeout=10, stub=True) as pool:
+        prism = fake_prism.install(epl_prism.PRISM(no_output=True, temp_dir=str(tmp_path), \
+            pool=pool))
+        assert prism.run_prism("dtmc\n", "P=? [ F true ]") == ["Result", "0.5"]
+        model = make_repetitions_model()
+        model.remove_data('y')
+        assert prism.compute_repetitions(model, 'Work', jobs=2) == \
+            ["(x=" + x + ") -> 0.5:(z'=ok) + 0.5:(z'=error);" for x in ['ok', 'error']]
+    assert fake_prism.get_calls() == []
+
+def test_parse_results():
+    """@brief the results of all properties of a multi-property results file"""
+    assert epl_prism.PRISM.parse_results(["P=? [ F a ]:", "Result", "0.1", "", \
+        "P=? [ F b ]:", "Result", "0.2"]) == ["0.1", "0.2"]
+    assert epl_prism.PRISM.parse_results(["Result", "0.1"]) == ["0.1"]
+
+def test_compute_failures(fake_prism, tmp_path):
+    """@brief the metrics of every failure in the order of the properties,
+    missing results are reported as 0"""
+    prism = fake_prism.install(epl_prism.PRISM(no_output=True, temp_dir=str(tmp_path)))
+    model = make_hierarchical_model(0)
+    model.add_failure('Good', 'x0=ok')
+    fake_prism.set_outputs(results="P=? [ F Fail ]:\nResult\n0.1\n\n" + \
+        "R{\"time\"}=? [ F Fail ]:\nResult\n20.0\n\nP=? [ F Good ]:\nResult\n1.0\n")
+    assert prism.compute_failures(model) == \
+        {'Fail':{'P':0.1, 'MTTF':20.0}, 'Good':{'P':1.0, 'MTTF':0}}
+    [call] = fake_prism.get_calls()
+    assert call['inputs'][1].split("\n") == ["P=? [ F Fail ]", "R{\"time\"}=? [ F Fail ]", \
+        "P=? [ F Good ]", "R{\"time\"}=? [ F Good ]"]
+    prism.compute_failures(model, ['Good'], metrics=['downtime'], steps=10)
+    prism_model, properties = fake_prism.get_calls()[1]['inputs']
+    assert properties == "R{\"Good_downtime\"}=? [ C<=step ]"
+    assert "const int step=10;\n" in prism_model
+    assert "rewards \"Good_downtime\"\n" in prism_model
+
+@pytest.fixture
+def model():
+    """@brief an int data and two string data with the shared values ok and error"""
+    test_model = epl_model.Model(epl_logger.Logger())
+    test_model.add_element('Start')
+    test_model.set_initial_element('Start')
+    test_model.add_element('Work')
+    test_model.add_control_flow('Start', 'Work')
+    test_model.add_control_flow('Work', 'Start')
+    for d_name, values in [['load', list(range(10))], ['flag', ['ok', 'error']], \
+        ['mode', ['ok', 'error', 'degraded']]]:
+        test_model.add_data(d_name)
+        test_model.data[d_name]['values'] = values
+        test_model.data[d_name]['initial_value'] = values[0]
+    test_model.add_data_flow('Start', 'load')
+    test_model.add_data_flow('load', 'Work')
+    test_model.add_data_flow('Work', 'flag')
+    test_model.add_data_flow('Work', 'mode')
+    test_model.elements['Start']['ep_prism_commands'] = \
+        ["true -> 0.5:(load'=min(9, load+1)) + 0.5:(load'=load);"]
+    test_model.elements['Work']['ep_prism_commands'] = \
+        ["load>5 -> 0.5:(flag'=error)&(mode'=degraded) + 0.5:(flag'=ok)&(mode'=ok);", \
+        "load<=5 -> (flag'=ok)&(mode'=ok);"]
+    test_model.add_failure('Fail', 'flag=error')
+    return test_model
+
+def test_encode_string_values(model):
+    """@brief strings get unused codes, next to each other per data if minimal,
+    in reverse sorted order otherwise"""
+    assert epl_prism.PRISM.encode_string_values(model) == {10:'ok', 11:'error', 12:'degraded'}
+    assert epl_prism.PRISM.encode_string_values(model, False) == \
+        {10:'ok', 11:'error', 12:'degraded'}
+    model.data['load']['values'] = [0, 2]
+    assert epl_prism.PRISM.encode_string_values(model) == {1:'ok', 3:'error', 4:'degraded'}
+    assert epl_prism.PRISM.encode_string_values(model, False) == \
+        {1:'ok', 3:'error', 4:'degraded'}
+    model.data['flag']['values'] = ['ok', 'bad']
+    assert epl_prism.PRISM.encode_string_values(model) == \
+        {1:'ok', 3:'bad', 4:'error', 5:'degraded'}
+    assert epl_prism.PRISM.encode_string_values(model, False) == \
+        {1:'ok', 3:'error', 4:'degraded', 5:'bad'}
+
+def test_get_data_ranges(model):
+    """@brief minimal ranges of the codes of every data, one range of all codes otherwise"""
+    assert epl_prism.PRISM.get_data_ranges(model) == \
+        {'load':[0, 9], 'flag':[10, 11], 'mode':[10, 12]}
+    assert epl_prism.PRISM.get_data_ranges(model, False) == \
+        {'load':[0, 12], 'flag':[0, 12], 'mode':[0, 12]}
+
+def test_declarations(model):
+    """@brief the generated model declares the ranges and the codes of the encoding"""
+    prism_model = epl_prism.PRISM.generate_prism_model(model)
+    for line in ["load : [0 .. 9] init 0;", "flag : [10 .. 11] init ok;", \
+        "mode : [10 .. 12] init ok;", "const int degraded=12;"]:
+        assert line in prism_model
+    prism_model = epl_prism.PRISM.generate_prism_model(model, minimal_ranges=False)
+    assert "flag : [0 .. 12] init ok;" in prism_model
+    repetitions_model = epl_prism.PRISM.generate_prism_model_for_repetitions(model, 'Work')
+    assert "load : [0 .. 9] init 0;" in repetitions_model
+    assert "flag : [10 .. 11] init ok;" in repetitions_model
+
+def test_check_data_ranges(model):
+    """@brief both ranges give the same DTMC, the minimal ranges need fewer bits"""
+    assert epl_engine.Engine.check_data_ranges(model) == \
+        {'equal':True, 'states':28, 'bits':9, 'global_bits':14}
+    # an int value out of the minimal range of mode is not declared
+    model.elements['Work']['ep_prism_commands'][1] = "load<=5 -> (flag'=ok)&(mode'=0);"
+    assert not epl_engine.Engine.check_data_ranges(model)['equal']
+
+def test_check_data_ranges_encoding(model):
+    """@brief states are compared by their values if the codes of strings differ"""
+    model.data['flag']['values'] = ['ok', 'bad']
+    model.data['flag']['initial_value'] = 'ok'
+    model.elements['Work']['ep_prism_commands'] = \
+        ["load>5 -> 0.5:(flag'=bad)&(mode'=degraded) + 0.5:(flag'=ok)&(mode'=error);", \
+        "load<=5 -> (flag'=ok)&(mode'=ok);"]
+    model.failures['Fail'] = 'flag=bad'
+    assert epl_prism.PRISM.encode_string_values(model) != \
+        epl_prism.PRISM.encode_string_values(model, False)
+    assert epl_engine.Engine.check_data_ranges(model)['equal']
+
+def make_generation_model():
+    """@brief load is counted up by Start, Work writes flag by its default commands"""
+    test_model = epl_model.Model(epl_logger.Logger())
+    test_model.add_element('Start')
+    test_model.set_initial_element('Start')
+    test_model.add_element('Work')
+    test_model.add_control_flow('Start', 'Work')
+    test_model.add_control_flow('Work', 'Start')
+    test_model.add_data('load', values=[0, 1, 2], initial_value=0)
+    test_model.add_data('flag')
+    test_model.add_data_flow('Start', 'load')
+    test_model.add_data_flow('load', 'Work')
+    test_model.add_data_flow('Work', 'flag')
+    test_model.elements['Start']['ep_prism_commands'] = \
+        ["true -> 0.5:(load'=min(2, load+1)) + 0.5:(load'=load);"]
+    test_model.add_failure('Fail', 'flag=error')
+    return test_model
+
+# output of the generator before the models were streamed
+GENERATED_MODEL = "\n".join(["//Generated by ErrorPro", "dtmc", "//Element consts", \
+    "const int Start=0;", "const int Work=1;", "//Data values consts", "const int ok=3;", \
+    "const int error=4;", "//Control flow commands", "module control_flow", \
+    "\tcf:[0..2] init Start;", "\t//Element Start, cf transitions ['Work']", \
+    "\t[Start] cf=Start -> 1.0:(cf'=Work);", \
+    "\t//Element Work, df inputs ['load'], cf transitions ['Start']", \
+    "\t[Work] cf=Work -> 1.0:(cf'=Start);", "endmodule", "//Error propagation commands", \
+    "module error_propagation", "\tload : [0 .. 2] init 0;", "\tflag : [3 .. 4] init ok;", \
+    "\t//Element Start, df outputs ['load']", \
+    "\t[Start] true -> 0.5:(load'=min(2, load+1)) + 0.5:(load'=load);\t// <-- ", \
+    "\t//Element Work, df inputs ['load'], df outputs ['flag']", \
+    "\t[Work] (load=0) -> (flag'=ok);", "\t[Work] (load!=0) -> (flag'=error);", "endmodule", \
+    "//Time reward", "rewards \"time\"", "\tcf=Start:1;", "\tcf=Work:1;", "endrewards", ""])
+
+GENERATED_REPETITIONS_MODEL = "\n".join(["//Generated by ErrorPro", "dtmc", \
+    "//Data values consts", "const int ok=3;", "const int error=4;", \
+    "//Error propagation commands", "module error_propagation", "\tload : [0 .. 2] init 1;", \
+    "\tflag : [3 .. 4] init ok;", "\t[] (load=0) -> (flag'=ok);", \
+    "\t[] (load!=0) -> (flag'=error);", "endmodule", ""])
+
+def test_generated_models():
+    """@brief the generated models do not change"""
+    test_model = make_generation_model()
+    assert epl_prism.PRISM.generate_prism_model(test_model, time_reward=True) == \
+        GENERATED_MODEL
+    assert epl_prism.PRISM.generate_prism_model_for_repetitions(test_model, 'Work', \
+        init_values={'load':1}) == GENERATED_REPETITIONS_MODEL
+
+def test_write_prism_model(tmp_path):
+    """@brief the models written to a file are the generated models"""
+    test_model = make_generation_model()
+    for write, generate, args in [[epl_prism.PRISM.write_prism_model, \
+        epl_prism.PRISM.generate_prism_model, {'init_combinations':[{'load':0}, {'load':2}]}], \
+        [epl_prism.PRISM.write_prism_model, epl_prism.PRISM.generate_prism_model, \
+        {'ep_module':False, 'time_reward':True}], \
+        [functools.partial(epl_prism.PRISM.write_prism_model_for_repetitions, \
+        el_name='Work'), functools.partial(epl_prism.PRISM.generate_prism_model_for_repetitions, \
+        el_name='Work'), {'init_combinations':[{'load':0}, {'load':1}]}]]:
+        file_name = str(tmp_path / "model.pm")
+        with open(file_name, 'w') as model_file:
+            write(test_model, stream=model_file, **args)
+        with open(file_name) as model_file:
+            assert model_file.read() == generate(test_model, **args)
+
+def test_fragments():
+    """@brief the fragments of unchanged elements and data are reused, the generated model
+    is the same as without memorized fragments"""
+    test_model = make_generation_model()
+    epl_prism.PRISM.generate_prism_model(test_model, time_reward=True)
+    fragments = dict(test_model.fragments)
+    assert ('Work', 'ep') in fragments and ('load', 'declaration') in fragments
+    test_model.update_element_prism_commands('Work', \
+        ep_prism_commands=["load<2 -> (flag'=ok);", "load=2 -> (flag'=error);"])
+    prism_model = epl_prism.PRISM.generate_prism_model(test_model, time_reward=True)
+    assert test_model.fragments[('Work', 'ep')] != fragments[('Work', 'ep')]
+    assert test_model.fragments[('Start', 'ep')] is fragments[('Start', 'ep')]
+    assert "\t[Work] load<2 -> (flag'=ok);\t// <-- \n" in prism_model
+    test_model.fragments.clear()
+    assert epl_prism.PRISM.generate_prism_model(test_model, time_reward=True) == prism_model
+
+def test_fragments_of_direct_changes():
+    """@brief direct changes of the model dicts without touch are seen by the fragments"""
+    test_model = make_generation_model()
+    generate = functools.partial(epl_prism.PRISM.generate_prism_model, test_model, \
+        time_reward=True)
+    generate()
+    test_model.elements['Start']['ep_prism_commands'] = ["true -> (load'=1);"]
+    test_model.elements['Work']['cf_prism_commands'].append("cf=Work -> (cf'=Start);")
+    test_model.elements['Work']['time'] = 3.0
+    prism_model = generate()
+    assert "\t[Start] true -> (load'=1);\t// <-- \n" in prism_model
+    assert "\t[Work] cf=Work -> (cf'=Start);\t// <-- \n" in prism_model
+    assert "\tcf=Work:3.0;\n" in prism_model
+    # the default commands of Work depend on the values of load
+    test_model.data['load']['initial_value'] = 1
+    prism_model = generate()
+    assert "\t[Work] (load=1) -> (flag'=ok);\n" in prism_model
+    test_model.fragments.clear()
+    assert generate() == prism_model
+
+def test_abstractions_of_settings(fake_prism, tmp_path):
+    """@brief sub models are computed again by a PRISM object with other settings"""
+    model = make_hierarchical_model(1)
+    fake_prism.set_outputs(ss_tr="0.25\n0.75\n", \
+        states="(cf,x0,S0tmp,x1)\n0:(2,0,0,0)\n1:(2,0,1,1)\n")
+    prism = fake_prism.install(epl_prism.PRISM(no_output=True, temp_dir=str(tmp_path)))
+    prism.flatten(model)
+    fake_prism.set_outputs(ss_tr="0.125\n0.375\n0.5\n", \
+        states="(cf,x0,S0tmp,x1,epl_init_id)\n0:(2,0,0,0,0)\n1:(2,0,1,1,0)\n2:(2,1,1,1,1)\n")
+    prism = fake_prism.install(epl_prism.PRISM(no_output=True, temp_dir=str(tmp_path), \
+        single_run=True))
+    flat_model = prism.flatten(model)
+    # one run per input combination, then a single run
+    assert len(get_runs(fake_prism)) == 3
+    assert flat_model.elements['C0']['ep_prism_commands'] == \
+        model.abstractions[('C0', 'sub_model')]['ep_prism_commands']
@@ -0,0 +1,81 @@
+"""
+Error Propagation Library V6.
+Tests of the pool of PRISM workers with the stub backend.
+"""
+
+import io
+import json
+
+import pytest
+
+import epl_prism_pool
+
+@pytest.fixture
+def pool():
+    """@brief single stub worker with a short timeout"""
+    with epl_prism_pool.PrismPool(size=1, timeout=10, stub=True) as stub_pool:
+        yield stub_pool
+
+def test_check_round_trip(pool, tmp_path):
+    """@brief a check job writes the results file of PRISM -exportresults"""
+    properties = tmp_path / "properties.pctl"
+    properties.write_text("P=? [ F Failure ]\n")
+    results = tmp_path / "results.txt"
+    response = pool.run({'cmd':'check', 'model':str(tmp_path / "model.pm"), \
+        'properties':str(properties), 'results':str(results), 'options':[]})
+    assert response['ok']
+    assert results.read_text() == "Result\n0.5\n"
+
+def test_ss_tr_round_trip(pool, tmp_path):
+    """@brief a steady state job writes the states of the declared variables"""
+    model = tmp_path / "model.pm"
+    model.write_text("module error_propagation\n\tx : [0 .. 1] init 0;\n" + \
+        "\ty : [0 .. 1] init 0;\nendmodule\n")
+    ss_tr = tmp_path / "ss_tr.txt"
+    states = tmp_path / "states.txt"
+    pool.run({'cmd':'ss_tr', 'model':str(model), 'tr':None, 'ss_tr':str(ss_tr), \
+        'states':str(states), 'options':[]})
+    assert ss_tr.read_text() == "0.5\n0.5\n"
+    assert states.read_text() == "(x,y)\n0:(0,0)\n1:(1,1)\n"
+
+def test_timeout_restarts_worker(pool):
+    """@brief the worker of a job over its timeout is replaced, the pool keeps working"""
+    with pytest.raises(epl_prism_pool.PoolTimeout):
+        pool.run({'cmd':'sleep', 'seconds':5}, timeout=0.5)
+    assert pool.restarts == 1
+    assert pool.run({'cmd':'ping'})['ok']
+    assert pool.ping() == 1
+
+def test_crash_is_retried_once(pool):
+    """@brief a crashed job is repeated in a new worker, which crashes again"""
+    with pytest.raises(epl_prism_pool.PoolError):
+        pool.run({'cmd':'crash'})
+    assert pool.restarts == 1
+    # the crashed worker of the retry is replaced before the next job
+    assert pool.run({'cmd':'ping'})['ok']
+    assert pool.restarts == 2
+
+def test_error_keeps_worker(pool, tmp_path):
+    """@brief an error of the backend is reported without a restart"""
+    with pytest.raises(epl_prism_pool.PoolError):
+        pool.run({'cmd':'check', 'model':"", 'properties':str(tmp_path / "missing.pctl"), \
+            'results':str(tmp_path / "results.txt")})
+    assert pool.restarts == 0
+
+def test_serve():
+    """@brief one json response per request line, empty lines are skipped"""
+    stdin = io.StringIO(json.dumps({'cmd':'ping'}) + "\n\n" + "not json\n")
+    stdout = io.StringIO()
+    epl_prism_pool.serve(epl_prism_pool.StubBackend(), stdin, stdout)
+    responses = [json.loads(line) for line in stdout.getvalue().splitlines()]
+    assert responses[0] == {'ok':True}
+    assert not responses[1]['ok'] and 'error' in responses[1]
+    assert len(responses) == 2
+
+def test_write_results(tmp_path):
+    """@brief several properties are written with their names"""
+    results = str(tmp_path / "results.txt")
+    epl_prism_pool.write_results(results, ["P=? [ F a ]", "P=? [ F b ]"], ["0.1", "0.2"])
+    with open(results) as results_file:
+        assert results_file.read() == \
+            "P=? [ F a ]:\nResult\n0.1\n\nP=? [ F b ]:\nResult\n0.2\n"
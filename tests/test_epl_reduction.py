@@ -0,0 +1,120 @@
+"""
+Error Propagation Library V6.
+Tests of the cone of influence and of the reset of dead data.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+import epl_engine
+import epl_logger
+import epl_model
+import epl_parser
+import epl_reduction
+import epl_solver
+import epl_xml
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), \
+    "examples", "battery", "two_batteries.xml")
+
+@pytest.fixture(scope='module')
+def model():
+    """@brief two batteries, every element takes one time unit"""
+    battery_model = epl_model.Model(epl_logger.Logger())
+    assert epl_xml.XML.load(battery_model, EXAMPLE)
+    for el_value in battery_model.elements.values():
+        el_value['time'] = 1.0
+    return battery_model
+
+def get_P_and_MTTF(model, f_name):
+    """@brief [P=? [ F f ], R{"time"}=? [ F f ]] from the initial state, built in-process"""
+    return epl_engine.Engine.compute_reachability(model, f_name, epl_solver.Solver(), \
+        init_combinations=[{}]).lookup()
+
+def reset_dead_data(model, f_name):
+    """@brief the model with dead data reset, the data of the failure are live at the end"""
+    live = epl_parser.Parser.get_names(\
+        epl_parser.Parser.parse_prism_expression(model.failures[f_name]))
+    return epl_reduction.Reduction.reset_dead_data(model, live & set(model.data))
+
+@pytest.mark.parametrize("f_name", ["Failure", "Battery1_Low", "Generator1_Down"])
+def test_reduced_results(model, f_name):
+    """@brief P and MTTF of the cone of influence and with reset dead data are unchanged"""
+    expected = get_P_and_MTTF(model, f_name)
+    cone = epl_reduction.Reduction.reduce(model, [f_name])
+    assert np.allclose(get_P_and_MTTF(cone, f_name), expected, rtol=1e-9)
+    assert np.allclose(get_P_and_MTTF(reset_dead_data(cone, f_name), f_name), expected, \
+        rtol=1e-9)
+    steps = [0, 10, 100]
+    assert np.allclose(epl_engine.Engine.compute_time_series(cone, f_name, steps)['P'], \
+        epl_engine.Engine.compute_time_series(model, f_name, steps)['P'])
+
+def make_small_model():
+    """@brief Src writes x, Aux copies x to y, the failure reads only x"""
+    small_model = epl_model.Model(epl_logger.Logger())
+    small_model.add_element('Src')
+    small_model.set_initial_element('Src')
+    small_model.add_element('Aux')
+    small_model.add_control_flow('Src', 'Aux')
+    small_model.add_control_flow('Aux', 'Src')
+    small_model.add_data('x')
+    small_model.add_data('y')
+    small_model.add_data_flow('Src', 'x')
+    small_model.add_data_flow('x', 'Aux')
+    small_model.add_data_flow('Aux', 'y')
+    small_model.elements['Src']['ep_prism_commands'] = \
+        ["true -> 0.9:(x'=ok) + 0.1:(x'=error);"]
+    small_model.elements['Aux']['ep_prism_commands'] = \
+        ["x=ok -> (y'=ok);", "x=error -> (y'=error);"]
+    small_model.add_failure('Fail', 'x=error')
+    return small_model
+
+def test_reduce():
+    """@brief irrelevant data are removed from a copy, the model is unchanged"""
+    small_model = make_small_model()
+    cone = epl_reduction.Reduction.reduce(small_model, ['Fail'])
+    assert list(cone.data) == ['x']
+    assert cone.elements['Aux']['df_outputs'] == []
+    assert list(small_model.data) == ['x', 'y']
+    assert small_model.elements['Aux']['df_outputs'] == ['y']
+    assert np.allclose(get_P_and_MTTF(cone, 'Fail'), get_P_and_MTTF(small_model, 'Fail'))
+    # y is relevant for a failure that reads it
+    small_model.add_failure('Copy', 'y=error')
+    assert epl_reduction.Reduction.reduce(small_model, ['Fail', 'Copy']) is small_model
+
+def test_reduce_battery(model):
+    """@brief the power of the batteries and the load of the other battery are irrelevant
+    for the level of a battery, the model is unchanged"""
+    data = list(model.data)
+    cone = epl_reduction.Reduction.reduce(model, ['Battery1_Low'])
+    assert sorted(cone.data) == ['bLoad1', 'gPower1', 'gPower2', 'gState1', 'gState2']
+    assert list(cone.failures) == ['Battery1_Low']
+    assert 'bPower1' not in cone.elements['Battery1']['df_outputs']
+    assert list(model.data) == data and 'bPower1' in model.elements['Battery1']['df_outputs']
+    # all data can influence the failure
+    assert epl_reduction.Reduction.reduce(model, ['Failure']) is model
+
+def test_reset_dead_data():
+    """@brief data are reset after their last read, the failure probabilities are unchanged"""
+    small_model = make_small_model()
+    small_model.add_failure('Copy', 'y=error')
+    reset_model = reset_dead_data(small_model, 'Fail')
+    assert reset_model.elements['Aux']['ep_prism_commands'] == \
+        ["x=ok -> (y'=ok);", "x=error -> (y'=ok);"]
+    assert small_model.elements['Aux']['ep_prism_commands'] == \
+        ["x=ok -> (y'=ok);", "x=error -> (y'=error);"]
+    assert np.allclose(get_P_and_MTTF(reset_model, 'Fail'), get_P_and_MTTF(small_model, 'Fail'))
+    # y is live for a failure that reads it, x is dead after Aux
+    reset_model = reset_dead_data(small_model, 'Copy')
+    assert reset_model.elements['Aux']['ep_prism_commands'][1].startswith("x=error -> ")
+    assert "(y'=error)" in reset_model.elements['Aux']['ep_prism_commands'][1]
+    assert "(x'=ok)" in reset_model.elements['Aux']['ep_prism_commands'][1]
+
+def test_state_counts(model):
+    """@brief the reductions do not add states"""
+    counts = epl_reduction.Reduction.get_state_counts(model, ['Battery1_Low'])
+    assert counts['model'] > counts['cone'] >= counts['reset']
+    counts = epl_reduction.Reduction.get_state_counts(model, ['Failure'])
+    assert counts['model'] == counts['cone'] > counts['reset']
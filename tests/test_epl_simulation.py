@@ -0,0 +1,87 @@
+"""
+Error Propagation Library V6.
+Tests of the Monte Carlo simulation against the exact in-process results.
+"""
+
+import pytest
+
+import epl_engine
+import epl_logger
+import epl_model
+import epl_simulation
+import epl_solver
+
+@pytest.fixture(scope='module')
+def model():
+    """@brief Src fails with probability 0.1 on every visit, every element takes one time unit"""
+    test_model = epl_model.Model(epl_logger.Logger())
+    test_model.add_element('Src')
+    test_model.set_initial_element('Src')
+    test_model.add_element('Work')
+    test_model.add_control_flow('Src', 'Work')
+    test_model.add_control_flow('Work', 'Src')
+    test_model.add_data('x')
+    test_model.add_data_flow('Src', 'x')
+    test_model.add_data_flow('x', 'Work')
+    test_model.elements['Src']['ep_prism_commands'] = \
+        ["x=ok -> 0.9:(x'=ok) + 0.1:(x'=error);", "x=error -> (x'=error);"]
+    for el_value in test_model.elements.values():
+        el_value['time'] = 1.0
+    test_model.add_failure('Fail', 'x=error')
+    return test_model
+
+def test_independent_of_jobs(model):
+    """@brief with a seed the estimates do not depend on the number of processes"""
+    results = [epl_simulation.Simulator(width=0.02, batch_size=500, jobs=jobs, \
+        seed=7).estimate_P(model, 'Fail', [1, 5, 20]) for jobs in [1, 3]]
+    assert results[0] == results[1]
+
+def test_estimate_P(model):
+    """@brief the confidence intervals contain the exact probabilities"""
+    steps = [1, 5, 20]
+    exact = epl_engine.Engine.compute_time_series(model, 'Fail', steps)['P']
+    result = epl_simulation.Simulator(width=0.01, batch_size=2000, seed=1, \
+        confidence=0.999).estimate_P(model, 'Fail', steps)
+    for value, lower, upper in zip(exact, result['lower'], result['upper']):
+        assert lower <= value <= upper
+    assert max(result['half_width']) <= 0.01
+
+def test_estimate_P_single(model):
+    """@brief the failure is reached by all runs"""
+    result = epl_simulation.Simulator(width=0.02, batch_size=500, seed=1).estimate_P_single(\
+        model, 'Fail')
+    assert result['value'] == 1.0
+
+def test_estimate_MTTF(model):
+    """@brief the confidence interval of the MTTF contains the exact value"""
+    # Src fails after 10 visits on average, Work runs between the visits
+    exact = 19.0
+    result = epl_simulation.Simulator(width=0.02, batch_size=2000, seed=1, \
+        confidence=0.999).estimate_MTTF(model, 'Fail')
+    assert result['lower'] <= exact <= result['upper']
+
+def test_estimate_P_rare(model):
+    """@brief importance sampling of a bounded probability"""
+    exact = epl_engine.Engine.compute_time_series(model, 'Fail', [3])['P'][0]
+    result = epl_simulation.Simulator(batch_size=2000, seed=1, rare_threshold=0.2, \
+        relative_error=0.02, confidence=0.999).estimate_P_rare(model, 'Fail', step_bound=3)
+    assert result['lower'] <= exact <= result['upper']
+
+def test_estimate_MTTF_trapped():
+    """@brief runs that stay in a loop without the failure make the MTTF infinite"""
+    test_model = epl_model.Model(epl_logger.Logger())
+    for el_name in ['Src', 'Left', 'Right']:
+        test_model.add_element(el_name)
+    test_model.set_initial_element('Src')
+    for from_name, to_name in [['Src', 'Left'], ['Left', 'Right'], ['Right', 'Left']]:
+        test_model.add_control_flow(from_name, to_name)
+    test_model.add_data('x')
+    test_model.add_data_flow('Src', 'x')
+    test_model.elements['Src']['ep_prism_commands'] = ["true -> 0.5:(x'=ok) + 0.5:(x'=error);"]
+    test_model.add_failure('Fail', 'x=error')
+    exact = epl_engine.Engine.compute_reachability(test_model, 'Fail', epl_solver.Solver(), \
+        init_combinations=[{}]).lookup()
+    assert exact == [0.5, float('inf')]
+    result = epl_simulation.Simulator(batch_size=200, max_steps=20, seed=1).estimate_MTTF(\
+        test_model, 'Fail')
+    assert result['value'] == float('inf')
@@ -0,0 +1,103 @@
+"""
+Error Propagation Library V6.
+Tests of the solver of DTMC properties against direct sparse solutions.
+"""
+
+import numpy as np
+import pytest
+import scipy.sparse
+import scipy.sparse.linalg
+
+import epl_solver
+
+def make_chain(size=60, seed=0):
+    """@brief random DTMC of blocks of cycles, each block leads to the next ones,
+    the last state is absorbing"""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for state in range(size - 1):
+        block = state // 5
+        targets = [block * 5 + (state + 1) % 5, min(size - 1, (block + 1) * 5 + \
+            int(rng.integers(5))), int(rng.integers(state, size))]
+        probs = rng.random(len(targets))
+        rows.append([targets, probs / probs.sum()])
+    rows.append([[size - 1], np.ones(1)])
+    matrix = scipy.sparse.lil_matrix((size, size))
+    for state, [targets, probs] in enumerate(rows):
+        for target, prob in zip(targets, probs):
+            matrix[state, target] += prob
+    return matrix.tocsr()
+
+def solve_reachability(matrix, targets):
+    """@brief reference solution of P=? [ F targets ] by spsolve, all states reach the
+    absorbing state of make_chain"""
+    unknown = np.nonzero(~targets)[0]
+    system = scipy.sparse.identity(len(unknown), format='csc') - \
+        matrix[unknown][:, unknown].tocsc()
+    rhs = np.asarray(matrix[unknown][:, np.nonzero(targets)[0]].sum(axis=1)).reshape(-1)
+    result = targets.astype(float)
+    result[unknown] = scipy.sparse.linalg.spsolve(system, rhs)
+    return result
+
+@pytest.mark.parametrize("method", epl_solver.Solver.methods)
+def test_topological_reachability(method):
+    """@brief scc by scc solutions, direct and iterative, equal the solution of spsolve"""
+    matrix = make_chain()
+    targets = np.zeros(matrix.shape[0], dtype=bool)
+    targets[[17, matrix.shape[0] - 1]] = True
+    expected = solve_reachability(matrix, targets)
+    for direct_limit in [3, 10]:
+        solver = epl_solver.Solver(tolerance=1e-12, direct_limit=direct_limit, method=method)
+        assert np.allclose(solver.reachability(matrix, targets), expected, atol=1e-9)
+        assert sum(timing['states'] for timing in solver.timings) <= matrix.shape[0]
+        assert any(timing['method'] == 'acyclic' for timing in solver.timings)
+
+def test_expected_reward():
+    """@brief topological expected rewards equal the direct solution, infinite rewards
+    for states that reach the targets with a probability below 1"""
+    matrix = make_chain()
+    size = matrix.shape[0]
+    targets = np.zeros(size, dtype=bool)
+    targets[size - 1] = True
+    reward = np.linspace(1.0, 2.0, size)
+    expected = epl_solver.Solver(topological=False).expected_reward(matrix, targets, reward)
+    unknown = np.arange(size - 1)
+    reference = scipy.sparse.linalg.spsolve(scipy.sparse.identity(size - 1, format='csc') - \
+        matrix[unknown][:, unknown].tocsc(), reward[unknown])
+    assert np.allclose(expected[unknown], reference)
+    topological = epl_solver.Solver(direct_limit=4).expected_reward(matrix, targets, reward)
+    assert np.allclose(topological, expected)
+    # a second absorbing state, the states that can reach it have infinite rewards
+    matrix = matrix.tolil()
+    matrix[0, :] = 0
+    matrix[0, 0] = 1.0
+    result = epl_solver.Solver().expected_reward(matrix.tocsr(), targets, reward)
+    assert np.isinf(result[0]) and result[size - 1] == 0.0
+
+def test_steady_state():
+    """@brief the steady state of an absorbing chain is in the bottom sccs"""
+    matrix = scipy.sparse.csr_matrix(np.array([[0.5, 0.25, 0.25, 0.0], \
+        [0.0, 0.0, 0.5, 0.5], [0.0, 0.0, 1.0, 0.0], [0.0, 0.0, 0.0, 1.0]]))
+    labels, bsccs = epl_solver.Solver.get_bsccs(matrix)
+    assert sorted(bscc.tolist() for bscc in bsccs) == [[2], [3]]
+    assert len(set(labels.tolist())) == 4
+    initial = np.array([[1.0, 0.0, 0.0, 0.0], [0.0, 1.0, 0.0, 0.0]])
+    for solver in [epl_solver.Solver(), epl_solver.Solver(direct_limit=0), \
+        epl_solver.Solver(direct_limit=0, method='power')]:
+        assert np.allclose(solver.steady_state(matrix, initial), \
+            [[0.0, 0.0, 0.75, 0.25], [0.0, 0.0, 0.5, 0.5]])
+
+def test_stationary():
+    """@brief the stationary distribution of a periodic bottom scc is its long run average"""
+    matrix = scipy.sparse.csr_matrix(np.array([[0.0, 1.0, 0.0], [0.0, 0.0, 1.0], \
+        [0.0, 0.5, 0.5]]))
+    for solver in [epl_solver.Solver(), epl_solver.Solver(direct_limit=0)]:
+        assert np.allclose(solver.steady_state(matrix, [1.0, 0.0, 0.0]), \
+            [[0.0, 1.0 / 3, 2.0 / 3]])
+
+def test_transient():
+    """@brief transient probabilities are rows of the initial distributions times matrix^steps"""
+    matrix = make_chain(20)
+    initial = np.identity(20)[[0, 5]]
+    expected = initial @ np.linalg.matrix_power(matrix.toarray(), 7)
+    assert np.allclose(epl_solver.Solver.transient(matrix, initial, 7), expected)